@@ -13,7 +13,16 @@ from .models import (
     FieldValue,
     UploadedBusinessDocument,
     Policy,
+    DocumentExtraction,
+    ExtractedPage,
+    OcrPage,
+    PageFingerprintBand,
+    RenewalComparison,
+    RenewalComparisonJob,
+    DocumentSummary,
+    LLMCall,
 )
+from .services.llm_usage import LLMUsageLedger
 
 class AgencyUserInline(admin.TabularInline):
     model = AgencyUser
@@ -39,6 +48,9 @@ class AgencyAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('is_active',)
         }),
+        ('AI Settings', {
+            'fields': ('ai_provider', 'ai_model_tier', 'ai_small_model_max_tokens')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -149,6 +161,35 @@ class UploadedBusinessDocumentAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description', 'business__name')
     raw_id_fields = ('business',)
 
+class ExtractedPageInline(admin.TabularInline):
+    model = ExtractedPage
+    extra = 0
+    fields = ('page_number', 'is_ocr', 'text')
+    readonly_fields = ('page_number', 'is_ocr', 'text')
+    can_delete = False
+
+@admin.register(DocumentExtraction)
+class DocumentExtractionAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'extractor_version', 'page_count', 'created_at')
+    list_filter = ('extractor_version', 'created_at')
+    search_fields = ('content_hash',)
+    readonly_fields = ('content_hash', 'extractor_version', 'page_count', 'created_at', 'updated_at')
+    inlines = [ExtractedPageInline]
+
+@admin.register(OcrPage)
+class OcrPageAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'page_number', 'ocr_config', 'created_at')
+    list_filter = ('ocr_config', 'created_at')
+    search_fields = ('content_hash',)
+    readonly_fields = ('content_hash', 'page_number', 'ocr_config', 'text', 'created_at', 'updated_at')
+
+@admin.register(PageFingerprintBand)
+class PageFingerprintBandAdmin(admin.ModelAdmin):
+    list_display = ('band_key', 'file_count')
+    search_fields = ('band_key',)
+    ordering = ('-file_count',)
+    readonly_fields = ('band_key', 'file_count')
+
 class AgencyFilter(SimpleListFilter):
     title = 'Agency'
     parameter_name = 'agency'
@@ -232,4 +273,98 @@ class PolicyAdmin(admin.ModelAdmin):
     business_name.admin_order_field = 'business__name'
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('business') 
\ No newline at end of file
+        return super().get_queryset(request).select_related('business') 
+
+@admin.register(RenewalComparison)
+class RenewalComparisonAdmin(admin.ModelAdmin):
+    list_display = (
+        'policy',
+        'provider',
+        'model',
+        'prompt_version',
+        'input_tokens',
+        'output_tokens',
+        'cache_read_tokens',
+        'duration_ms',
+        'created_at',
+    )
+    list_filter = ('provider', 'model', 'prompt_version', 'created_at')
+    search_fields = ('policy__policy_number', 'policy__business__name', 'input_hash')
+    raw_id_fields = ('policy', 'created_by')
+    readonly_fields = (
+        'document_hashes',
+        'input_hash',
+        'input_tokens',
+        'output_tokens',
+        'cache_read_tokens',
+        'cache_write_tokens',
+        'duration_ms',
+        'routing',
+        'created_at',
+        'updated_at',
+    )
+
+@admin.register(RenewalComparisonJob)
+class RenewalComparisonJobAdmin(admin.ModelAdmin):
+    list_display = ('policy', 'provider', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'provider', 'created_at')
+    raw_id_fields = ('policy', 'comparison', 'created_by')
+    readonly_fields = ('created_at', 'updated_at', 'started_at', 'finished_at')
+
+@admin.register(DocumentSummary)
+class DocumentSummaryAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'provider', 'model', 'prompt_version', 'input_tokens', 'output_tokens', 'created_at')
+    list_filter = ('provider', 'model', 'prompt_version')
+    search_fields = ('content_hash',)
+    readonly_fields = ('created_at', 'updated_at')
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    """Read-only ledger of provider calls; the list shows the filtered calls aggregated by agency and policy."""
+    change_list_template = 'admin/core/llmcall/change_list.html'
+    list_display = (
+        'created_at',
+        'provider',
+        'model',
+        'purpose',
+        'outcome',
+        'agency',
+        'policy',
+        'input_tokens',
+        'output_tokens',
+        'cache_read_tokens',
+        'queue_ms',
+        'duration_ms',
+    )
+    list_filter = ('provider', 'model', 'purpose', 'outcome', 'created_at', 'agency')
+    search_fields = ('agency__name', 'policy__policy_number', 'policy__business__name')
+    date_hierarchy = 'created_at'
+    raw_id_fields = ('agency', 'policy')
+
+    # Number of groups shown in each aggregate table
+    REPORT_ROWS = 10
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('agency', 'policy')
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is not None:
+            calls = changelist.get_queryset(request)
+            response.context_data['usage_reports'] = [
+                (title, LLMUsageLedger.summarize(calls, group_by=group_by)[:self.REPORT_ROWS])
+                for title, group_by in (
+                    ('By agency', 'agency'),
+                    ('Most expensive policies', 'policy'),
+                    ('By model', 'provider'),
+                    ('By purpose', 'purpose'),
+                )
+            ]
+        return response
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from PyPDF2 import PageObject, PdfWriter
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+from core.services.text_extraction import extract_pdf_pages, shutdown_extraction_pool
+
+SAMPLE_LINES = [
+    'COMMERCIAL GENERAL LIABILITY COVERAGE PART DECLARATIONS',
+    'Each Occurrence Limit $2,000,000 General Aggregate Limit $4,000,000',
+    'Damage To Premises Rented To You $1,000,000 Any One Premises',
+    'Medical Expense Limit $10,000 Any One Person',
+    'Business Personal Property Limit $137,500 Deductible $1,000',
+    'Employment Practices Liability Retroactive Date 03/15/2016',
+]
+
+class Command(BaseCommand):
+    help = 'Benchmarks parallel PDF text extraction on a synthetic multi-hundred-page corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=3, help='Number of synthetic PDFs')
+        parser.add_argument('--pages', type=int, default=300, help='Pages per synthetic PDF')
+        parser.add_argument(
+            '--workers',
+            default=None,
+            help='Comma-separated worker counts to compare (default: 1, 2, 4, ... up to the CPU count)'
+        )
+
+    def handle(self, *args, **options):
+        worker_counts = self._get_worker_counts(options['workers'])
+
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            paths = []
+            for index in range(options['documents']):
+                path = os.path.join(corpus_dir, f'policy_packet_{index + 1}.pdf')
+                self._write_synthetic_pdf(path, options['pages'])
+                paths.append(path)
+            total_pages = options['documents'] * options['pages']
+            self.stdout.write(f"Corpus: {options['documents']} PDFs, {total_pages} pages")
+
+            baseline = None
+            for workers in worker_counts:
+                # Start each run with a fresh pool sized for this worker count
+                shutdown_extraction_pool()
+                with override_settings(TEXT_EXTRACTION_WORKERS=workers):
+                    if workers > 1:
+                        # Warm the pool so process start-up is not part of the measurement
+                        extract_pdf_pages(paths[0], workers=workers)
+                    start = time.perf_counter()
+                    for path in paths:
+                        extract_pdf_pages(path, workers=workers)
+                    elapsed = time.perf_counter() - start
+
+                baseline = baseline or elapsed
+                self.stdout.write(
+                    f"workers={workers:<3} {elapsed:8.2f}s  "
+                    f"{total_pages / elapsed:8.1f} pages/s  speedup x{baseline / elapsed:.2f}"
+                )
+            shutdown_extraction_pool()
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
+
+    def _get_worker_counts(self, value):
+        if value:
+            return [int(count) for count in value.split(',')]
+        counts = [1]
+        cpu_count = os.cpu_count() or 1
+        while counts[-1] * 2 <= cpu_count:
+            counts.append(counts[-1] * 2)
+        if counts[-1] != cpu_count:
+            counts.append(cpu_count)
+        return counts
+
+    def _write_synthetic_pdf(self, path, page_count):
+        """Write a PDF whose pages contain declarations-style text."""
+        writer = PdfWriter()
+        font = writer._add_object(DictionaryObject({
+            NameObject('/Type'): NameObject('/Font'),
+            NameObject('/Subtype'): NameObject('/Type1'),
+            NameObject('/BaseFont'): NameObject('/Helvetica'),
+        }))
+
+        for page_number in range(1, page_count + 1):
+            page = PageObject.create_blank_page(width=612, height=792)
+            page[NameObject('/Resources')] = DictionaryObject({
+                NameObject('/Font'): DictionaryObject({NameObject('/F1'): font})
+            })
+
+            commands = ['BT', '/F1 10 Tf', '14 TL', '50 750 Td']
+            for line_number in range(48):
+                line = SAMPLE_LINES[(page_number + line_number) % len(SAMPLE_LINES)]
+                commands.append(f'(Page {page_number} line {line_number + 1}: {line}) Tj T*')
+            commands.append('ET')
+
+            contents = DecodedStreamObject()
+            contents.set_data('\n'.join(commands).encode('latin-1'))
+            page[NameObject('/Contents')] = writer._add_object(contents)
+            writer.add_page(page)
+
+        with open(path, 'wb') as f:
+            writer.write(f)
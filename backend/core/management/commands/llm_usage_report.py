@@ -0,0 +1,34 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.services.llm_usage import GROUPINGS, LLMUsageLedger
+
+class Command(BaseCommand):
+    help = 'Reports the calls, tokens, estimated cost and latency of LLM provider calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Report on calls of the last N days')
+        parser.add_argument('--by', choices=sorted(GROUPINGS), default='agency', help='Group calls by')
+        parser.add_argument('--limit', type=int, default=20, help='Show the N most expensive groups')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        report = LLMUsageLedger.summarize(since=since, group_by=options['by'])
+        if not report:
+            self.stdout.write(f"No LLM calls in the last {options['days']} days")
+            return
+
+        total_cost = sum(group['cost'] for group in report)
+        self.stdout.write(
+            f"{sum(group['calls'] for group in report)} calls in the last {options['days']} days, "
+            f"~${total_cost:.2f}"
+        )
+        for group in report[:options['limit']]:
+            self.stdout.write(f"{group['label']}: ~${group['cost']:.2f}")
+            self.stdout.write(
+                f"  {group['calls']} calls, {group['failures']} failed; "
+                f"tokens in {group['input_tokens']}, out {group['output_tokens']}, "
+                f"cache read {group['cache_read_tokens']}, cache write {group['cache_write_tokens']}"
+            )
+            if group['median_ms'] is not None:
+                self.stdout.write(f"  duration median {group['median_ms'] / 1000:.1f}s, p95 {group['p95_ms'] / 1000:.1f}s")
@@ -0,0 +1,56 @@
+from datetime import timedelta
+from statistics import median
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import LLMCall
+from core.services.llm_usage import CACHE_READ_PRICE, CACHE_WRITE_PRICE
+
+class Command(BaseCommand):
+    help = 'Reports prompt cache hits and the token and latency savings of renewal comparison calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Report on comparison calls of the last N days')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        # Only the comparison calls share the cached instructions; summary and repair calls would dilute the ratios
+        calls = LLMCall.objects.filter(
+            created_at__gte=since,
+            purpose=LLMCall.COMPARISON,
+            outcome=LLMCall.SUCCEEDED
+        ).exclude(input_tokens=None)
+        if not calls.exists():
+            self.stdout.write(f"No renewal comparison calls with token usage in the last {options['days']} days")
+            return
+
+        for provider in sorted(set(calls.values_list('provider', flat=True))):
+            rows = list(calls.filter(provider=provider).values(
+                'input_tokens', 'cache_read_tokens', 'cache_write_tokens', 'duration_ms'
+            ))
+            hits = [row for row in rows if row['cache_read_tokens']]
+            misses = [row for row in rows if not row['cache_read_tokens']]
+            input_tokens = sum(row['input_tokens'] for row in rows)
+            read_tokens = sum(row['cache_read_tokens'] or 0 for row in rows)
+            write_tokens = sum(row['cache_write_tokens'] or 0 for row in rows)
+
+            # Anthropic reports cached tokens separately from input tokens, OpenAI within them
+            prompt_tokens = input_tokens + (read_tokens + write_tokens if provider == 'anthropic' else 0)
+            saved_tokens = (
+                read_tokens * (1 - CACHE_READ_PRICE.get(provider, 1.0))
+                - write_tokens * (CACHE_WRITE_PRICE.get(provider, 1.0) - 1)
+            )
+
+            self.stdout.write(f"{provider}: {len(rows)} comparison calls, {len(hits)} cache hits")
+            self.stdout.write(f"  prompt tokens {prompt_tokens}, read from cache {read_tokens}, written to cache {write_tokens}")
+            self.stdout.write(
+                f"  saved ~{saved_tokens:.0f} input token equivalents "
+                f"({saved_tokens / prompt_tokens:.0%} of prompt cost)" if prompt_tokens else "  no prompt tokens recorded"
+            )
+            self.stdout.write(
+                f"  median duration: cache hit {self._median_duration(hits)}, miss {self._median_duration(misses)}"
+            )
+
+    @staticmethod
+    def _median_duration(rows):
+        durations = [row['duration_ms'] for row in rows if row['duration_ms'] is not None]
+        return f"{median(durations) / 1000:.1f}s" if durations else 'n/a'
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.services.boilerplate import BoilerplateIndex
+from core.services.text_extraction import EXTRACTOR_VERSION
+
+class Command(BaseCommand):
+    help = 'Recomputes page fingerprints and the corpus-wide boilerplate page index'
+
+    def handle(self, *args, **options):
+        files = BoilerplateIndex.rebuild(EXTRACTOR_VERSION)
+        self.stdout.write(self.style.SUCCESS(f'Indexed pages of {files} files'))
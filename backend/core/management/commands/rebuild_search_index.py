@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from core.models import UploadedBusinessDocument
+from core.services.document_search import DocumentSearchIndex
+from core.services.text_extraction import TextExtractionError
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index over uploaded documents'
+
+    def handle(self, *args, **options):
+        DocumentSearchIndex.clear()
+
+        documents = 0
+        pages = 0
+        for document in UploadedBusinessDocument.objects.iterator():
+            try:
+                pages += DocumentSearchIndex.index_document(document)
+                documents += 1
+            except TextExtractionError as e:
+                self.stdout.write(self.style.WARNING(f'Skipped {document.name}: {str(e)}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {pages} pages from {documents} documents'))
@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.services.bulk_renewals import BulkRenewalRunner, select_expiring_policies
+
+class Command(BaseCommand):
+    help = 'Generates renewal comparisons for policies expiring in a date window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=60, help='Policies expiring within N days from today')
+        parser.add_argument('--from', dest='expiring_from', help='First expiration date (YYYY-MM-DD); overrides --days')
+        parser.add_argument('--to', dest='expiring_to', help='Last expiration date (YYYY-MM-DD); overrides --days')
+        parser.add_argument('--agency', type=int, help='Only policies of this agency id')
+        parser.add_argument(
+            '--provider',
+            choices=['anthropic', 'openai'],
+            help="AI provider (default: each policy's agency provider)"
+        )
+        parser.add_argument('--workers', type=int, help='Concurrent comparisons (default: BULK_RENEWAL_WORKERS)')
+        parser.add_argument('--refresh', action='store_true', help='Regenerate comparisons even if documents are unchanged')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            expiring_from = date.fromisoformat(options['expiring_from']) if options['expiring_from'] else today
+            expiring_to = (
+                date.fromisoformat(options['expiring_to']) if options['expiring_to']
+                else today + timedelta(days=options['days'])
+            )
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        policies = select_expiring_policies(expiring_from, expiring_to, options['agency'])
+        self.stdout.write(f"{policies.count()} policies expiring {expiring_from} to {expiring_to}")
+
+        runner = BulkRenewalRunner(
+            provider=options['provider'],
+            workers=options['workers'],
+            refresh=options['refresh']
+        )
+        report = runner.run(policies)
+
+        self.stdout.write(
+            f"Generated {len(report.generated)}, unchanged {len(report.unchanged)}, "
+            f"stale without a provider {len(report.stale)}, "
+            f"skipped without documents {len(report.skipped)}, failed {len(report.failures)}"
+        )
+        self.stdout.write(f"{report.elapsed:.1f}s, {report.throughput:.1f} policies/min")
+        for failure in report.failures:
+            self.stderr.write(f"Policy {failure.policy_id}: {failure.error}")
+        if report.stale:
+            self.stderr.write(
+                "No AI provider was available for policies "
+                f"{', '.join(str(policy_id) for policy_id in report.stale)}; their last comparison may be out of date"
+            )
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentExtraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_hash', models.CharField(help_text='SHA-256 hash of the extracted file content', max_length=64)),
+                ('extractor_version', models.CharField(help_text='Version of the text extractor that produced the pages', max_length=20)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Document Extraction',
+                'verbose_name_plural': 'Document Extractions',
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'unique_together': {('content_hash', 'extractor_version')},
+            },
+        ),
+        migrations.AddField(
+            model_name='uploadedbusinessdocument',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 hash of the file content, set when its text is extracted', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ExtractedPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.PositiveIntegerField(help_text='1-based page number')),
+                ('text', models.TextField(blank=True)),
+                ('extraction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='core.documentextraction')),
+            ],
+            options={
+                'verbose_name': 'Extracted Page',
+                'verbose_name_plural': 'Extracted Pages',
+                'ordering': ['extraction', 'page_number'],
+                'unique_together': {('extraction', 'page_number')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+def mark_existing_extractions_complete(apps, schema_editor):
+    # Extractions created before progress tracking were always stored whole
+    DocumentExtraction = apps.get_model('core', 'DocumentExtraction')
+    DocumentExtraction.objects.update(is_complete=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_document_extraction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentextraction',
+            name='is_complete',
+            field=models.BooleanField(default=False, help_text='Whether all pages have been extracted and stored'),
+        ),
+        migrations.AddField(
+            model_name='documentextraction',
+            name='is_truncated',
+            field=models.BooleanField(default=False, help_text='Whether extraction stopped at the page or size limit'),
+        ),
+        migrations.RunPython(mark_existing_extractions_complete, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_extraction_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedpage',
+            name='table_text',
+            field=models.TextField(blank=True, help_text='Page text with detected tables rendered as TSV or Markdown; empty if the page has no tables'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+def create_search_index(apps, schema_editor):
+    # The full-text index is an SQLite FTS5 virtual table; other backends
+    # fall back to plain substring search over the extracted pages
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS core_document_search_index USING fts5("
+        "text, document_id UNINDEXED, page_number UNINDEXED, tokenize='porter unicode61')"
+    )
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS core_document_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_extracted_page_table_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
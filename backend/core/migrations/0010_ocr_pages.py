@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_document_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractedpage',
+            name='is_ocr',
+            field=models.BooleanField(default=False, help_text='Whether the text was recognized by OCR because the page has no text layer'),
+        ),
+        migrations.CreateModel(
+            name='OcrPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_hash', models.CharField(help_text='SHA-256 hash of the file content', max_length=64)),
+                ('page_number', models.PositiveIntegerField(help_text='1-based page number')),
+                ('ocr_config', models.CharField(help_text='OCR engine version, language and resolution that produced the text', max_length=50)),
+                ('text', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'OCR Page',
+                'verbose_name_plural': 'OCR Pages',
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'unique_together': {('content_hash', 'page_number', 'ocr_config')},
+            },
+        ),
+    ]
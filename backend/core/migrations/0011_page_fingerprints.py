@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ocr_pages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageFingerprintBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band_key', models.CharField(max_length=16, unique=True)),
+                ('file_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Page Fingerprint Band',
+                'verbose_name_plural': 'Page Fingerprint Bands',
+            },
+        ),
+        migrations.AddField(
+            model_name='extractedpage',
+            name='fingerprint',
+            field=models.TextField(blank=True, help_text='MinHash LSH band keys of the page text, used to recognize boilerplate pages'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0011_page_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenewalComparison',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.CharField(help_text='AI provider that generated the comparison', max_length=20)),
+                ('model', models.CharField(help_text='Model that generated the comparison', max_length=100)),
+                ('prompt_version', models.CharField(help_text='Version of the renewal comparison prompts', max_length=20)),
+                ('document_hashes', models.JSONField(default=list, help_text='Sorted SHA-256 hashes of the policy documents compared')),
+                ('input_hash', models.CharField(help_text='SHA-256 hash of the document hashes, provider, model, prompt version and prompt settings', max_length=64)),
+                ('input_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('output_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('email', models.TextField(blank=True)),
+                ('attachment', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renewal_comparisons', to=settings.AUTH_USER_MODEL)),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renewal_comparisons', to='core.policy')),
+            ],
+            options={
+                'verbose_name': 'Renewal Comparison',
+                'verbose_name_plural': 'Renewal Comparisons',
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['policy', 'input_hash'], name='core_renewa_policy__a14772_idx'), models.Index(fields=['policy', 'created_at'], name='core_renewa_policy__68b16f_idx')],
+            },
+        ),
+    ]
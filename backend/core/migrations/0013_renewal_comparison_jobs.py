@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0012_renewal_comparisons'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenewalComparisonJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('provider', models.CharField(help_text='AI provider requested for the comparison', max_length=20)),
+                ('refresh', models.BooleanField(default=False, help_text='Whether a new comparison was requested even if a stored one matches')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('comparison', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='jobs', to='core.renewalcomparison')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='renewal_comparison_jobs', to=settings.AUTH_USER_MODEL)),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renewal_comparison_jobs', to='core.policy')),
+            ],
+            options={
+                'verbose_name': 'Renewal Comparison Job',
+                'verbose_name_plural': 'Renewal Comparison Jobs',
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['policy', 'status'], name='core_renewa_policy__12e3f8_idx')],
+            },
+        ),
+    ]
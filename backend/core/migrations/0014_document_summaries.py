@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_renewal_comparison_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_hash', models.CharField(help_text='SHA-256 hash of the summarized file content', max_length=64)),
+                ('provider', models.CharField(help_text='AI provider that wrote the summary', max_length=20)),
+                ('model', models.CharField(help_text='Model that wrote the summary', max_length=100)),
+                ('prompt_version', models.CharField(help_text='Version of the summary prompts', max_length=20)),
+                ('summary', models.TextField()),
+                ('input_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('output_tokens', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Document Summary',
+                'verbose_name_plural': 'Document Summaries',
+                'ordering': ['-created_at'],
+                'abstract': False,
+                'unique_together': {('content_hash', 'provider', 'model', 'prompt_version')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_document_summaries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renewalcomparison',
+            name='cache_read_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Prompt tokens read from the provider prompt cache', null=True),
+        ),
+        migrations.AddField(
+            model_name='renewalcomparison',
+            name='cache_write_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Prompt tokens written to the provider prompt cache', null=True),
+        ),
+        migrations.AddField(
+            model_name='renewalcomparison',
+            name='duration_ms',
+            field=models.PositiveIntegerField(blank=True, help_text='Duration of the final comparison call in milliseconds', null=True),
+        ),
+    ]
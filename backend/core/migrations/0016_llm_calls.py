@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_prompt_cache_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=20)),
+                ('model', models.CharField(max_length=100)),
+                ('purpose', models.CharField(choices=[('comparison', 'Comparison'), ('summary', 'Document summary'), ('repair', 'Response repair')], max_length=20)),
+                ('outcome', models.CharField(choices=[('succeeded', 'Succeeded'), ('failed', 'Failed'), ('unavailable', 'Provider unavailable'), ('rate_limited', 'Rate limit wait timed out')], max_length=20)),
+                ('input_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('output_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('cache_read_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('cache_write_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('queue_ms', models.PositiveIntegerField(blank=True, help_text='Time spent waiting for the provider rate limits in milliseconds', null=True)),
+                ('duration_ms', models.PositiveIntegerField(blank=True, help_text='Duration of the provider request in milliseconds', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('agency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='core.agency')),
+                ('policy', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to='core.policy')),
+            ],
+            options={
+                'verbose_name': 'LLM Call',
+                'verbose_name_plural': 'LLM Calls',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='core_llmcal_created_1754e9_idx'), models.Index(fields=['agency', 'created_at'], name='core_llmcal_agency__d871db_idx'), models.Index(fields=['policy', 'created_at'], name='core_llmcal_policy__2253e9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_llm_calls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agency',
+            name='ai_model_tier',
+            field=models.CharField(choices=[('auto', 'Chosen per comparison'), ('small', 'Always the small, fast model'), ('large', 'Always the large model')], default='auto', help_text='Model size used for renewal comparisons', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='agency',
+            name='ai_provider',
+            field=models.CharField(choices=[('anthropic', 'Anthropic'), ('openai', 'OpenAI')], default='anthropic', help_text='AI provider used when a request does not name one', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='agency',
+            name='ai_small_model_max_tokens',
+            field=models.PositiveIntegerField(blank=True, help_text='Largest estimated document input sent to the small model; defaults to LLM_SMALL_MODEL_MAX_TOKENS', null=True),
+        ),
+        migrations.AddField(
+            model_name='renewalcomparison',
+            name='routing',
+            field=models.JSONField(blank=True, default=dict, help_text='Why the model was chosen: its tier, the estimated input tokens and document count, and the limits applied'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_model_routing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='renewalcomparisonjob',
+            name='stale',
+            field=models.BooleanField(default=False, help_text='Whether no provider was available and the last stored comparison was returned instead'),
+        ),
+    ]
@@ -4,6 +4,9 @@ from .document import Document, BusinessDocument, UploadedBusinessDocument, uplo
 from .field import Field, FieldValue
 from .agency import Agency, AgencyUser
 from .policy import Policy
+from .extraction import DocumentExtraction, ExtractedPage, OcrPage, PageFingerprintBand
+from .comparison import RenewalComparison, RenewalComparisonJob, DocumentSummary
+from .usage import LLMCall
 from .utils import validate_and_format_phone
 
 __all__ = [
@@ -19,4 +22,12 @@ __all__ = [
     'Agency',
     'AgencyUser',
     'Policy',
+    'DocumentExtraction',
+    'ExtractedPage',
+    'OcrPage',
+    'PageFingerprintBand',
+    'RenewalComparison',
+    'RenewalComparisonJob',
+    'DocumentSummary',
+    'LLMCall',
 ] 
\ No newline at end of file
@@ -4,6 +4,21 @@ from django.core.exceptions import ValidationError
 from .utils import validate_and_format_phone
 
 class Agency(models.Model):
+    AI_PROVIDER_CHOICES = [
+        ('anthropic', 'Anthropic'),
+        ('openai', 'OpenAI'),
+    ]
+
+    AI_MODEL_AUTO = 'auto'
+    AI_MODEL_SMALL = 'small'
+    AI_MODEL_LARGE = 'large'
+
+    AI_MODEL_TIER_CHOICES = [
+        (AI_MODEL_AUTO, 'Chosen per comparison'),
+        (AI_MODEL_SMALL, 'Always the small, fast model'),
+        (AI_MODEL_LARGE, 'Always the large model'),
+    ]
+
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     address = models.CharField(max_length=255, blank=True)
@@ -12,6 +27,23 @@ class Agency(models.Model):
     website = models.URLField(blank=True)
     is_active = models.BooleanField(default=True)
     users = models.ManyToManyField(User, through='AgencyUser', related_name='agencies')
+    ai_provider = models.CharField(
+        max_length=20,
+        choices=AI_PROVIDER_CHOICES,
+        default='anthropic',
+        help_text='AI provider used when a request does not name one'
+    )
+    ai_model_tier = models.CharField(
+        max_length=20,
+        choices=AI_MODEL_TIER_CHOICES,
+        default=AI_MODEL_AUTO,
+        help_text='Model size used for renewal comparisons'
+    )
+    ai_small_model_max_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Largest estimated document input sent to the small model; defaults to LLM_SMALL_MODEL_MAX_TOKENS'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -0,0 +1,156 @@
+from django.db import models
+from django.contrib.auth.models import User
+from .base import TimeStampedModel
+
+class RenewalComparison(TimeStampedModel):
+    """
+    A generated renewal comparison, stored with everything that determined it
+    so the same inputs are answered from the database instead of the LLM.
+    """
+    policy = models.ForeignKey(
+        'Policy',
+        on_delete=models.CASCADE,
+        related_name='renewal_comparisons'
+    )
+    provider = models.CharField(max_length=20, help_text='AI provider that generated the comparison')
+    model = models.CharField(max_length=100, help_text='Model that generated the comparison')
+    prompt_version = models.CharField(max_length=20, help_text='Version of the renewal comparison prompts')
+    document_hashes = models.JSONField(
+        default=list,
+        help_text='Sorted SHA-256 hashes of the policy documents compared'
+    )
+    input_hash = models.CharField(
+        max_length=64,
+        help_text='SHA-256 hash of the document hashes, provider, model, prompt version and prompt settings'
+    )
+    input_tokens = models.PositiveIntegerField(null=True, blank=True)
+    output_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cache_read_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Prompt tokens read from the provider prompt cache'
+    )
+    cache_write_tokens = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Prompt tokens written to the provider prompt cache'
+    )
+    duration_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Duration of the final comparison call in milliseconds'
+    )
+    routing = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Why the model was chosen: its tier, the estimated input tokens and document count, and the limits applied'
+    )
+    email = models.TextField(blank=True)
+    attachment = models.TextField(blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='renewal_comparisons'
+    )
+
+    class Meta(TimeStampedModel.Meta):
+        verbose_name = 'Renewal Comparison'
+        verbose_name_plural = 'Renewal Comparisons'
+        indexes = [
+            models.Index(fields=['policy', 'input_hash']),
+            models.Index(fields=['policy', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.policy} - {self.provider} {self.model} ({self.created_at:%Y-%m-%d %H:%M})"
+
+class RenewalComparisonJob(TimeStampedModel):
+    """
+    A renewal comparison requested through the API and generated in the
+    background, polled by the client until it succeeds or fails.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    policy = models.ForeignKey(
+        'Policy',
+        on_delete=models.CASCADE,
+        related_name='renewal_comparison_jobs'
+    )
+    provider = models.CharField(max_length=20, help_text='AI provider requested for the comparison')
+    refresh = models.BooleanField(
+        default=False,
+        help_text='Whether a new comparison was requested even if a stored one matches'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    comparison = models.ForeignKey(
+        RenewalComparison,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    stale = models.BooleanField(
+        default=False,
+        help_text='Whether no provider was available and the last stored comparison was returned instead'
+    )
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='renewal_comparison_jobs'
+    )
+
+    class Meta(TimeStampedModel.Meta):
+        verbose_name = 'Renewal Comparison Job'
+        verbose_name_plural = 'Renewal Comparison Jobs'
+        indexes = [
+            models.Index(fields=['policy', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.policy} - {self.provider} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self):
+        """Returns whether the job has succeeded or failed."""
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+class DocumentSummary(TimeStampedModel):
+    """
+    Coverage summary of one file written by an LLM, used in place of the file
+    text when a renewal packet is too large for a single comparison prompt.
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        help_text='SHA-256 hash of the summarized file content'
+    )
+    provider = models.CharField(max_length=20, help_text='AI provider that wrote the summary')
+    model = models.CharField(max_length=100, help_text='Model that wrote the summary')
+    prompt_version = models.CharField(max_length=20, help_text='Version of the summary prompts')
+    summary = models.TextField()
+    input_tokens = models.PositiveIntegerField(null=True, blank=True)
+    output_tokens = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta(TimeStampedModel.Meta):
+        verbose_name = 'Document Summary'
+        verbose_name_plural = 'Document Summaries'
+        unique_together = ['content_hash', 'provider', 'model', 'prompt_version']
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} - {self.provider} {self.model}"
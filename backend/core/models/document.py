@@ -98,6 +98,12 @@ class UploadedBusinessDocument(TimeStampedModel):
         upload_to=uploaded_business_document_path,
         help_text='The uploaded document file'
     )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text='SHA-256 hash of the file content, set when its text is extracted'
+    )
 
     class Meta(TimeStampedModel.Meta):
         verbose_name = 'Uploaded Business Document'
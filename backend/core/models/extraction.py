@@ -0,0 +1,103 @@
+from django.db import models
+from .base import TimeStampedModel
+
+class DocumentExtraction(TimeStampedModel):
+    """
+    Extracted text for one version of a file, identified by the hash of its
+    content and the version of the extractor that produced it.
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        help_text='SHA-256 hash of the extracted file content'
+    )
+    extractor_version = models.CharField(
+        max_length=20,
+        help_text='Version of the text extractor that produced the pages'
+    )
+    page_count = models.PositiveIntegerField(default=0)
+    is_complete = models.BooleanField(
+        default=False,
+        help_text='Whether all pages have been extracted and stored'
+    )
+    is_truncated = models.BooleanField(
+        default=False,
+        help_text='Whether extraction stopped at the page or size limit'
+    )
+
+    class Meta(TimeStampedModel.Meta):
+        verbose_name = 'Document Extraction'
+        verbose_name_plural = 'Document Extractions'
+        unique_together = ['content_hash', 'extractor_version']
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} (v{self.extractor_version}, {self.page_count} pages)"
+
+class ExtractedPage(models.Model):
+    extraction = models.ForeignKey(
+        DocumentExtraction,
+        related_name='pages',
+        on_delete=models.CASCADE
+    )
+    page_number = models.PositiveIntegerField(help_text='1-based page number')
+    text = models.TextField(blank=True)
+    table_text = models.TextField(
+        blank=True,
+        help_text='Page text with detected tables rendered as TSV or Markdown; empty if the page has no tables'
+    )
+    is_ocr = models.BooleanField(
+        default=False,
+        help_text='Whether the text was recognized by OCR because the page has no text layer'
+    )
+    fingerprint = models.TextField(
+        blank=True,
+        help_text='MinHash LSH band keys of the page text, used to recognize boilerplate pages'
+    )
+
+    class Meta:
+        verbose_name = 'Extracted Page'
+        verbose_name_plural = 'Extracted Pages'
+        unique_together = ['extraction', 'page_number']
+        ordering = ['extraction', 'page_number']
+
+    def __str__(self):
+        return f"{self.extraction} - page {self.page_number}"
+
+class OcrPage(TimeStampedModel):
+    """
+    OCR text of one page of a file, kept separately from the extracted pages
+    so that a scanned page is only OCR'd once, even when the text extractor
+    changes and documents are re-extracted.
+    """
+    content_hash = models.CharField(
+        max_length=64,
+        help_text='SHA-256 hash of the file content'
+    )
+    page_number = models.PositiveIntegerField(help_text='1-based page number')
+    ocr_config = models.CharField(
+        max_length=50,
+        help_text='OCR engine version, language and resolution that produced the text'
+    )
+    text = models.TextField(blank=True)
+
+    class Meta(TimeStampedModel.Meta):
+        verbose_name = 'OCR Page'
+        verbose_name_plural = 'OCR Pages'
+        unique_together = ['content_hash', 'page_number', 'ocr_config']
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} - page {self.page_number} ({self.ocr_config})"
+
+class PageFingerprintBand(models.Model):
+    """
+    Number of distinct files in which a page with a given MinHash band was
+    seen. Bands shared by many files identify standard forms and notices.
+    """
+    band_key = models.CharField(max_length=16, unique=True)
+    file_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Page Fingerprint Band'
+        verbose_name_plural = 'Page Fingerprint Bands'
+
+    def __str__(self):
+        return f"{self.band_key} ({self.file_count} files)"
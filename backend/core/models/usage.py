@@ -0,0 +1,75 @@
+from django.db import models
+
+class LLMCall(models.Model):
+    """
+    One call to an LLM provider, recorded when it finishes and never updated.
+    Aggregated by agency, policy, provider or purpose in the LLM usage report.
+    """
+    COMPARISON = 'comparison'
+    SUMMARY = 'summary'
+    REPAIR = 'repair'
+
+    PURPOSE_CHOICES = [
+        (COMPARISON, 'Comparison'),
+        (SUMMARY, 'Document summary'),
+        (REPAIR, 'Response repair'),
+    ]
+
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    UNAVAILABLE = 'unavailable'
+    RATE_LIMITED = 'rate_limited'
+
+    OUTCOME_CHOICES = [
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (UNAVAILABLE, 'Provider unavailable'),
+        (RATE_LIMITED, 'Rate limit wait timed out'),
+    ]
+
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    agency = models.ForeignKey(
+        'Agency',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='llm_calls'
+    )
+    policy = models.ForeignKey(
+        'Policy',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='llm_calls'
+    )
+    input_tokens = models.PositiveIntegerField(null=True, blank=True)
+    output_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cache_read_tokens = models.PositiveIntegerField(null=True, blank=True)
+    cache_write_tokens = models.PositiveIntegerField(null=True, blank=True)
+    queue_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Time spent waiting for the provider rate limits in milliseconds'
+    )
+    duration_ms = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Duration of the provider request in milliseconds'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'LLM Call'
+        verbose_name_plural = 'LLM Calls'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['agency', 'created_at']),
+            models.Index(fields=['policy', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.model} {self.purpose} ({self.get_outcome_display()})"
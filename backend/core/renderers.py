@@ -0,0 +1,20 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+def format_event(event, data):
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets views accept `Accept: text/event-stream` requests, as sent by
+    EventSource. Streaming views return a StreamingHttpResponse of events
+    themselves; responses rendered here are errors raised before streaming
+    started, sent as a single "error" event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return format_event('error', data)
@@ -8,6 +8,7 @@ from .document import (
 from .field import FieldSerializer, FieldValueSerializer
 from .uploaded_document import UploadedBusinessDocumentSerializer
 from .policy import PolicySerializer
+from .renewal_comparison import RenewalComparisonSerializer, RenewalComparisonJobSerializer
 
 __all__ = [
     'CustomerSerializer',
@@ -20,4 +21,6 @@ __all__ = [
     'FieldSerializer',
     'FieldValueSerializer',
     'PolicySerializer',
+    'RenewalComparisonSerializer',
+    'RenewalComparisonJobSerializer',
 ] 
\ No newline at end of file
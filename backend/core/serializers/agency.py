@@ -15,6 +15,9 @@ class AgencySerializer(serializers.ModelSerializer):
             'phone_number',
             'website',
             'is_active',
+            'ai_provider',
+            'ai_model_tier',
+            'ai_small_model_max_tokens',
             'role',
             'is_primary',
             'created_at',
@@ -0,0 +1,47 @@
+from rest_framework import serializers
+from ..models import RenewalComparison, RenewalComparisonJob
+
+class RenewalComparisonSerializer(serializers.ModelSerializer):
+    ai_provider = serializers.CharField(source='provider', read_only=True)
+
+    class Meta:
+        model = RenewalComparison
+        fields = [
+            'id',
+            'policy',
+            'ai_provider',
+            'model',
+            'prompt_version',
+            'document_hashes',
+            'input_tokens',
+            'output_tokens',
+            'cache_read_tokens',
+            'cache_write_tokens',
+            'duration_ms',
+            'routing',
+            'email',
+            'attachment',
+            'created_by',
+            'created_at',
+        ]
+        read_only_fields = fields
+
+class RenewalComparisonJobSerializer(serializers.ModelSerializer):
+    ai_provider = serializers.CharField(source='provider', read_only=True)
+    comparison = RenewalComparisonSerializer(read_only=True)
+
+    class Meta:
+        model = RenewalComparisonJob
+        fields = [
+            'id',
+            'policy',
+            'ai_provider',
+            'status',
+            'comparison',
+            'stale',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,111 @@
+import re
+from typing import BinaryIO, Dict, Tuple, Union
+import PyPDF2
+from django.conf import settings
+
+# Maps AcroForm field names of the fillable ACORD 125 to Field.field_ids created
+# by the setup_acord125 command. Checkbox fields map to a (field_id, value)
+# pair, where the value is stored when the box is checked.
+ACORD_125_FIELD_MAPPING: Dict[str, Union[str, Tuple[str, str]]] = {
+    'Form_CompletionDate_A': 'date',
+    'Policy_EffectiveDate_A': 'proposed_effective_date',
+    'Producer_FullName_A': 'agency_name',
+    'Producer_MailingAddress_LineOne_A': 'agency_address',
+    'Producer_MailingAddress_CityName_A': 'agency_city',
+    'Producer_MailingAddress_StateOrProvinceCode_A': 'agency_state',
+    'Producer_MailingAddress_PostalCode_A': 'agency_zip',
+    'Producer_ContactPerson_FullName_A': 'agency_contact_name',
+    'Producer_ContactPerson_PhoneNumber_A': 'agency_phone',
+    'Producer_FaxNumber_A': 'agency_fax',
+    'Producer_ContactPerson_EmailAddress_A': 'agency_email',
+    'Insurer_ProducerIdentifier_A': 'agency_code',
+    'Producer_CustomerIdentifier_A': 'agency_customer_id',
+    'Insurer_SubProducerIdentifier_A': 'agency_sub_code',
+    'Insurer_FullName_A': 'carrier_name',
+    'Insurer_NAICCode_A': 'naic_code',
+    'Policy_PolicyNumberIdentifier_A': 'policy_number',
+    'Insurer_UnderwriterOfficeName_A': 'underwriter_office',
+    'Insurer_ProductDescription_A': 'company_policy',
+    'Policy_Payment_DirectBillIndicator_A': ('billing_plan_direct', 'True'),
+    'Policy_Payment_EstimatedTotalAmount_A': 'policy_premium',
+    'Policy_Payment_MinimumPremiumAmount_A': 'minimum_premium',
+    'Policy_Payment_DepositAmount_A': 'deposit',
+    'NamedInsured_FullName_A': 'applicant_name',
+    'NamedInsured_MailingAddress_LineOne_A': 'mailing_address',
+    'CommercialStructure_PhysicalAddress_LineOne_A': 'premises_address',
+    'NamedInsured_Primary_WebsiteAddress_A': 'website_address',
+    'NamedInsured_LegalEntity_CorporationIndicator_A': ('business_type', 'Corporation'),
+    'NamedInsured_LegalEntity_IndividualIndicator_A': ('business_type', 'Individual'),
+    'NamedInsured_LegalEntity_PartnershipIndicator_A': ('business_type', 'Partnership'),
+    'NamedInsured_SICCode_A': 'sic_code',
+    'CommercialPolicy_OperationsDescription_A': 'business_description',
+    'NamedInsured_Contact_FullName_A': 'contact_name',
+    'NamedInsured_Contact_PrimaryPhoneNumber_A': 'contact_phone',
+    'NamedInsured_Contact_PrimaryEmailAddress_A': 'contact_email',
+}
+
+# Values PDF viewers use for a checked checkbox
+CHECKED_VALUES = {'/yes', '/on', '/1', '/true', 'yes', 'on', '1', 'true', 'x'}
+
+def get_field_mapping() -> Dict[str, Union[str, Tuple[str, str]]]:
+    """
+    Return the AcroForm mapping table.
+
+    Entries in the ACORD_FORM_FIELD_MAPPING setting extend or override the
+    default ACORD 125 mapping; mapping a name to None disables it.
+    """
+    mapping = dict(ACORD_125_FIELD_MAPPING)
+    mapping.update(getattr(settings, 'ACORD_FORM_FIELD_MAPPING', {}))
+    return {name: target for name, target in mapping.items() if target}
+
+class AcroFormReader:
+    """
+    Reads the filled-in values of a fillable PDF form.
+
+    Only the form dictionary is parsed, so no page content is decoded and no
+    OCR or LLM is involved.
+    """
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+
+    def read_form_values(self) -> Dict[str, str]:
+        """Return the non-empty form values keyed by their fully qualified field name."""
+        self.file.seek(0)
+        try:
+            fields = PyPDF2.PdfReader(self.file).get_fields() or {}
+        except Exception as e:
+            # A malformed PDF has no usable form values, but is still a valid upload
+            print(f"Error reading PDF form fields: {str(e) or type(e).__name__}")
+            return {}
+
+        values = {}
+        for name, field in fields.items():
+            value = field.get('/V')
+            if value is None:
+                continue
+            value = str(value).strip()
+            if value and value != '/Off':
+                values[name] = value
+        return values
+
+    def read_field_values(self) -> Dict[str, str]:
+        """Return form values mapped to Field.field_ids through the mapping table."""
+        mapping = get_field_mapping()
+        field_values = {}
+        for name, value in self.read_form_values().items():
+            # Nested fields are qualified with their parents, e.g. "F[0].P1[0].Name[0]"
+            short_name = re.sub(r'\[\d+\]$', '', name.rsplit('.', 1)[-1])
+            target = mapping.get(name) or mapping.get(short_name)
+            if not target:
+                continue
+
+            if isinstance(target, tuple):
+                field_id, checked_value = target
+                if value.lower() not in CHECKED_VALUES:
+                    continue
+                value = checked_value
+            else:
+                field_id = target
+            field_values[field_id] = value
+        return field_values
@@ -0,0 +1,129 @@
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Sequence, Set
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, When
+from ..models import DocumentExtraction, ExtractedPage, PageFingerprintBand
+from .page_fingerprint import BAND_ROWS, fingerprint
+
+# Number of band keys per query, kept under SQLite's variable limit
+BAND_QUERY_SIZE = 500
+
+# Pages with fewer complete MinHash bands are too short to judge
+MIN_PAGE_BANDS = 4
+
+# Pages stating dollar amounts carry policy specifics and are never dropped
+MONEY_PATTERN = re.compile(r'\$\s?\d')
+
+def _batches(items: Sequence, size: int = BAND_QUERY_SIZE) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class BoilerplateIndex:
+    """
+    Corpus-wide index of pages that repeat across uploaded files.
+
+    Every extracted page is fingerprinted with MinHash and the index counts
+    the distinct files each LSH band was seen in. A page is boilerplate when
+    enough of its bands were seen in at least BOILERPLATE_MIN_FILES files for
+    it to be BOILERPLATE_SIMILARITY similar to a page repeated that often.
+    Standard carrier forms, notices and endorsements are found this way and
+    left out of LLM prompts without maintaining a list of forms.
+
+    Files are counted by content hash: re-extracting a file with a newer
+    extractor version does not count it again. Band counts are only ever
+    incremented; rebuild_boilerplate_index recomputes them, e.g. after
+    extractions were deleted.
+    """
+
+    @staticmethod
+    def fingerprint_pages(pages: List[ExtractedPage], file_bands: Optional[Set[str]] = None) -> Set[str]:
+        """
+        Fingerprint pages about to be stored and add their bands to
+        `file_bands`, the bands of the file seen so far, which is returned.
+        A form repeated within one file is only counted once.
+        """
+        file_bands = set() if file_bands is None else file_bands
+        for page in pages:
+            page.fingerprint = fingerprint(page.text)
+            file_bands.update(page.fingerprint.split())
+        return file_bands
+
+    @staticmethod
+    def add_file(extraction: DocumentExtraction, file_bands: Set[str]) -> None:
+        """
+        Count the bands of a completely extracted file, unless an extraction
+        of the same content by another extractor version was counted already.
+        Call it in the transaction completing the extraction.
+        """
+        counted = DocumentExtraction.objects.filter(
+            content_hash=extraction.content_hash,
+            is_complete=True
+        ).exclude(pk=extraction.pk).exists()
+        if not counted:
+            BoilerplateIndex._increment(sorted(file_bands))
+
+    @staticmethod
+    def find_boilerplate(pages: Sequence[ExtractedPage]) -> Set[int]:
+        """Return the page numbers of the given pages that are known boilerplate."""
+        min_files = getattr(settings, 'BOILERPLATE_MIN_FILES', 5)
+        # A band matches a page of Jaccard similarity s with probability s ** BAND_ROWS
+        min_share = getattr(settings, 'BOILERPLATE_SIMILARITY', 0.8) ** BAND_ROWS
+
+        candidates = [page for page in pages if page.fingerprint and not MONEY_PATTERN.search(page.text)]
+        bands = sorted({band for page in candidates for band in page.fingerprint.split()})
+        frequent = set()
+        for batch in _batches(bands):
+            frequent.update(PageFingerprintBand.objects.filter(
+                band_key__in=batch,
+                file_count__gte=min_files
+            ).values_list('band_key', flat=True))
+
+        boilerplate = set()
+        for page in candidates:
+            page_bands = page.fingerprint.split()
+            matching = sum(1 for band in page_bands if band in frequent)
+            if len(page_bands) >= MIN_PAGE_BANDS and matching >= min_share * len(page_bands):
+                boilerplate.add(page.page_number)
+        return boilerplate
+
+    @staticmethod
+    def rebuild(current_version: str) -> int:
+        """
+        Recompute the fingerprints of all extracted pages and the band counts
+        from scratch. A file extracted by several extractor versions is
+        counted once, with the pages of `current_version` if it has them.
+        Returns the number of files indexed.
+        """
+        counts = Counter()
+        counted_hashes = set()
+        extractions = DocumentExtraction.objects.filter(is_complete=True).order_by(
+            Case(When(extractor_version=current_version, then=0), default=1),
+            '-created_at'
+        )
+        for extraction in extractions.iterator():
+            pages = list(extraction.pages.only('id', 'text', 'fingerprint'))
+            for page in pages:
+                page.fingerprint = fingerprint(page.text)
+            ExtractedPage.objects.bulk_update(pages, ['fingerprint'], batch_size=BAND_QUERY_SIZE)
+            if extraction.content_hash not in counted_hashes:
+                counted_hashes.add(extraction.content_hash)
+                counts.update({band for page in pages for band in page.fingerprint.split()})
+
+        with transaction.atomic():
+            PageFingerprintBand.objects.all().delete()
+            PageFingerprintBand.objects.bulk_create(
+                [PageFingerprintBand(band_key=band, file_count=count) for band, count in counts.items()],
+                batch_size=BAND_QUERY_SIZE
+            )
+        return len(counted_hashes)
+
+    @staticmethod
+    def _increment(bands: List[str]) -> None:
+        for batch in _batches(bands):
+            PageFingerprintBand.objects.bulk_create(
+                [PageFingerprintBand(band_key=band) for band in batch],
+                ignore_conflicts=True
+            )
+            PageFingerprintBand.objects.filter(band_key__in=batch).update(file_count=F('file_count') + 1)
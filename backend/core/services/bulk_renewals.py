@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import List, NamedTuple, Optional
+from django.conf import settings
+from django.db import connections
+from ..models import Policy
+from .model_router import ModelRouter, get_policy_agency
+from .renewal_comparator import RenewalComparator, RenewalComparisonError
+
+class BulkRenewalFailure(NamedTuple):
+    policy_id: int
+    error: str
+
+class BulkRenewalReport(NamedTuple):
+    total: int
+    generated: List[int]
+    unchanged: List[int]
+    # Policies served their last comparison because no provider was available
+    stale: List[int]
+    skipped: List[int]
+    failures: List[BulkRenewalFailure]
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        """Policies processed per minute."""
+        return self.total / self.elapsed * 60 if self.elapsed else 0.0
+
+def select_expiring_policies(expiring_from: date, expiring_to: date, agency_id: Optional[int] = None):
+    """Return the policies expiring between two dates (inclusive), optionally of one agency."""
+    policies = Policy.objects.filter(
+        expiration_date__gte=expiring_from,
+        expiration_date__lte=expiring_to
+    ).select_related('business__customer__agency').order_by('expiration_date', 'id')
+    if agency_id is not None:
+        policies = policies.filter(business__customer__agency_id=agency_id)
+    return policies
+
+class BulkRenewalRunner:
+    """
+    Generates renewal comparisons for many policies with a bounded number of
+    concurrent provider calls.
+
+    Policies whose stored comparison still matches their documents are
+    reported as unchanged without calling the provider, policies without
+    documents are skipped, and policies served their last comparison while no
+    provider was available are reported as stale, to be run again. Without a provider, each policy is compared with
+    its agency's provider.
+    """
+
+    def __init__(self, provider: Optional[str] = None, workers: Optional[int] = None, refresh: bool = False):
+        self.provider = provider
+        self.workers = workers or getattr(settings, 'BULK_RENEWAL_WORKERS', 4)
+        self.refresh = refresh
+
+    def run(self, policies) -> BulkRenewalReport:
+        policy_ids = list(policies.values_list('id', flat=True))
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bulk-renewal') as executor:
+            outcomes = list(executor.map(self._compare, policy_ids))
+
+        generated, unchanged, stale, skipped, failures = [], [], [], [], []
+        for policy_id, (outcome, error) in zip(policy_ids, outcomes):
+            if outcome == 'generated':
+                generated.append(policy_id)
+            elif outcome == 'unchanged':
+                unchanged.append(policy_id)
+            elif outcome == 'stale':
+                stale.append(policy_id)
+            elif outcome == 'skipped':
+                skipped.append(policy_id)
+            else:
+                failures.append(BulkRenewalFailure(policy_id, error))
+
+        return BulkRenewalReport(
+            total=len(policy_ids),
+            generated=generated,
+            unchanged=unchanged,
+            stale=stale,
+            skipped=skipped,
+            failures=failures,
+            elapsed=time.monotonic() - started
+        )
+
+    def _compare(self, policy_id: int):
+        """Compare one policy in a worker thread; return (outcome, error)."""
+        try:
+            policy = Policy.objects.select_related('business__customer__agency').get(pk=policy_id)
+            if not policy.documents.exists():
+                return 'skipped', ''
+            provider = self.provider or ModelRouter.get_default_provider(get_policy_agency(policy))
+            comparator = RenewalComparator(policy, provider=provider)
+            result = comparator.get_comparison(refresh=self.refresh)
+            if result.stale:
+                return 'stale', ''
+            return ('generated' if result.created else 'unchanged'), ''
+        except RenewalComparisonError as e:
+            return 'failed', str(e)
+        except Exception as e:
+            print(f"Error comparing policy {policy_id}: {str(e)}")
+            return 'failed', str(e)
+        finally:
+            # Worker threads end with the run; don't leave their connections open
+            connections.close_all()
@@ -0,0 +1,178 @@
+"""
+Local BM25 retrieval of the coverage-relevant parts of documents.
+
+Renewal comparisons only need the parts of a policy packet that state
+limits, deductibles, premiums, retroactive dates and policy periods. Pages
+are split into chunks of whole lines, every chunk is scored with BM25
+against a fixed set of coverage queries, and the best chunks for each query
+are taken in turn until the document's share of the prompt budget is used.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Sequence
+
+# Target size of a chunk in characters; chunks end on line boundaries
+CHUNK_CHARS = 800
+
+# Characters reserved per selected chunk for the page and gap markers
+MARKER_CHARS = 24
+
+# Dollar amounts and dates are the facts a comparison is built on, so they
+# are indexed as tokens of their own that the coverage queries can ask for
+MONEY_TOKEN = '<money>'
+DATE_TOKEN = '<date>'
+
+COVERAGE_QUERIES: Dict[str, str] = {
+    'limits': f'limit limits aggregate occurrence each claim liability insurance {MONEY_TOKEN}',
+    'deductibles': f'deductible deductibles retention waiting period {MONEY_TOKEN}',
+    'premiums': f'premium premiums total cost charges fees surcharges taxes {MONEY_TOKEN}',
+    'retroactive_dates': f'retroactive date prior acts claims made {DATE_TOKEN}',
+    'policy_periods': f'policy period effective expiration date renewal term {DATE_TOKEN}',
+    'parties': 'named insured insurer carrier policy number',
+}
+
+TOKEN_PATTERN = re.compile(r'\$\s?\d[\d,]*(?:\.\d+)?|\d{1,2}/\d{1,2}/\d{2,4}|[a-z0-9]+')
+
+class Chunk(NamedTuple):
+    page_number: int
+    text: str
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens, with money amounts and dates as special tokens."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token.startswith('$'):
+            tokens.append(MONEY_TOKEN)
+        elif '/' in token:
+            tokens.append(DATE_TOKEN)
+        else:
+            tokens.append(token)
+    return tokens
+
+def chunk_pages(pages: Sequence[str], chunk_chars: int = CHUNK_CHARS) -> List[Chunk]:
+    """
+    Split pages into chunks of roughly `chunk_chars` characters.
+
+    Chunks never span pages and end on line boundaries so table rows stay
+    whole; only lines longer than a chunk are cut.
+    """
+    chunks = []
+    for page_number, page in enumerate(pages, start=1):
+        current = ''
+        for line in page.splitlines(keepends=True):
+            while len(line) > chunk_chars:
+                if current:
+                    chunks.append(Chunk(page_number, current))
+                    current = ''
+                chunks.append(Chunk(page_number, line[:chunk_chars]))
+                line = line[chunk_chars:]
+            if current and len(current) + len(line) > chunk_chars:
+                chunks.append(Chunk(page_number, current))
+                current = ''
+            current += line
+        if current.strip():
+            chunks.append(Chunk(page_number, current))
+    return chunks
+
+class BM25:
+    """Okapi BM25 scoring over a small in-memory collection of token lists."""
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = [Counter(tokens) for tokens in documents]
+        self.lengths = [len(tokens) for tokens in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+        document_frequencies = Counter(term for frequencies in self.term_frequencies for term in frequencies)
+        count = len(documents)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+    def score(self, query: Sequence[str], index: int) -> float:
+        """Return the BM25 score of document `index` for a tokenized query."""
+        frequencies = self.term_frequencies[index]
+        length_norm = 1 - self.b + self.b * self.lengths[index] / (self.average_length or 1)
+        score = 0.0
+        for term in query:
+            frequency = frequencies.get(term)
+            if frequency:
+                score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+        return score
+
+def select_chunks(chunks: Sequence[Chunk], budget: int, queries: Dict[str, str] = COVERAGE_QUERIES) -> List[Chunk]:
+    """
+    Return the chunks most relevant to the coverage queries, in document order,
+    whose combined size (including markers) fits within `budget` characters.
+
+    Queries take turns choosing their next best chunk so that every kind of
+    coverage fact is represented before any one of them fills the budget.
+    """
+    bm25 = BM25([tokenize(chunk.text) for chunk in chunks])
+    rankings = []
+    for query in queries.values():
+        query_tokens = tokenize(query)
+        scores = [(bm25.score(query_tokens, index), index) for index in range(len(chunks))]
+        rankings.append([index for score, index in sorted(scores, key=lambda s: (-s[0], s[1])) if score > 0])
+
+    selected = set()
+    used = 0
+    while any(rankings):
+        for ranking in rankings:
+            while ranking:
+                index = ranking.pop(0)
+                if index in selected:
+                    continue
+                cost = len(chunks[index].text) + MARKER_CHARS
+                if used + cost <= budget:
+                    selected.add(index)
+                    used += cost
+                    break
+    return [chunks[index] for index in sorted(selected)]
+
+def render_chunks(chunks: Sequence[Chunk]) -> str:
+    """Join selected chunks, marking the page each run of chunks comes from."""
+    parts = []
+    previous_page = None
+    for chunk in chunks:
+        if chunk.page_number != previous_page:
+            parts.append(f"[Page {chunk.page_number}]\n")
+            previous_page = chunk.page_number
+        parts.append(chunk.text)
+        if not chunk.text.endswith('\n'):
+            parts.append('\n')
+    return ''.join(parts)
+
+def select_document_contents(documents: Sequence[Dict], max_chars: int) -> List[Dict]:
+    """
+    Fit the pages of several documents into a prompt budget of `max_chars`.
+
+    `documents` are dicts with a `name` and a list of `pages`. Documents that
+    fit within their share of the budget are sent whole; the share left
+    unused by small documents goes to the larger ones, whose content is cut
+    down to their most relevant chunks. Returns dicts with the `name`, the
+    `content` to send and the `original_chars` of the document.
+    """
+    full_texts = [''.join(f"{page}\n\n" for page in doc['pages']) for doc in documents]
+    contents = [None] * len(documents)
+    remaining = max_chars
+    # Smallest documents first, so their unused share is passed on
+    order = sorted(range(len(documents)), key=lambda i: len(full_texts[i]))
+    for position, i in enumerate(order):
+        share = remaining // (len(order) - position)
+        if len(full_texts[i]) <= share:
+            contents[i] = full_texts[i]
+        else:
+            contents[i] = render_chunks(select_chunks(chunk_pages(documents[i]['pages']), share))
+        remaining -= len(contents[i])
+
+    return [
+        {
+            'name': doc['name'],
+            'content': content,
+            'original_chars': len(full_text),
+        }
+        for doc, content, full_text in zip(documents, contents, full_texts)
+    ]
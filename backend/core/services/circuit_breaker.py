@@ -0,0 +1,129 @@
+"""
+Health tracking of the LLM providers with a circuit breaker per provider.
+
+The state is shared by the worker processes of a host through a state file
+(see file_state). After LLM_CIRCUIT_FAILURE_THRESHOLD consecutive failed
+calls the circuit opens and calls to the provider fail at once, without
+waiting for a timeout, for LLM_CIRCUIT_RESET_TIMEOUT seconds. Then a single
+trial call is let through. Its success closes the circuit; its failure opens
+it for another period.
+
+Failures are errors that say nothing about the request itself: connection
+errors and timeouts, 408, 409 and 429 responses, and 5xx responses, each
+attempt of a retried call counting once. Other errors, such as a 400 response,
+leave the health unchanged.
+"""
+import time
+from contextlib import contextmanager
+from typing import Optional
+import anthropic
+import openai
+from django.conf import settings
+from .file_state import get_state_path, read_state_file, update_state_file
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Smoothing factor of the average call duration
+LATENCY_SMOOTHING = 0.2
+
+class CircuitOpenError(Exception):
+    pass
+
+def is_provider_failure(error: Exception) -> bool:
+    """Return whether an error of a provider call counts against the provider's health."""
+    if isinstance(error, (anthropic.APIConnectionError, openai.APIConnectionError)):
+        # Includes timeouts
+        return True
+    status_code = getattr(error, 'status_code', None)
+    return status_code is not None and (status_code in (408, 409, 429) or status_code >= 500)
+
+class CircuitBreaker:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.failure_threshold = getattr(settings, 'LLM_CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.reset_timeout = getattr(settings, 'LLM_CIRCUIT_RESET_TIMEOUT', 60.0)
+        self.path = get_state_path(f'llm-circuit-{provider}.json')
+
+    def is_available(self) -> bool:
+        """Return whether a call would be let through now, without claiming the trial call."""
+        state = read_state_file(self.path)
+        return state.get('state', CLOSED) == CLOSED or (
+            state.get('state') == OPEN and time.time() >= state.get('open_until', 0)
+        )
+
+    def get_health(self) -> dict:
+        """Return the circuit state, consecutive failures and average call duration."""
+        state = read_state_file(self.path)
+        return {
+            'provider': self.provider,
+            'state': state.get('state', CLOSED),
+            'failures': state.get('failures', 0),
+            'average_duration': state.get('average_duration'),
+        }
+
+    @contextmanager
+    def call(self):
+        """
+        Guard a call to the provider, recording its outcome.
+
+        Raises CircuitOpenError instead of running the block while the circuit is open.
+        """
+        if not update_state_file(self.path, self._allow):
+            raise CircuitOpenError(f"{self.provider} is unavailable after repeated failures")
+
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_provider_failure(e):
+                update_state_file(self.path, self._record_failure)
+            elif getattr(e, 'status_code', None) is not None:
+                # The provider answered; the request itself was at fault
+                update_state_file(self.path, lambda state: self._record_success(state, None))
+            else:
+                # The call failed before reaching the provider
+                update_state_file(self.path, self._release_trial)
+            raise
+        update_state_file(self.path, lambda state: self._record_success(state, time.monotonic() - started))
+
+    def _allow(self, state):
+        now = time.time()
+        circuit = state.get('state', CLOSED)
+        if circuit == CLOSED:
+            return True
+        if circuit == OPEN and now >= state.get('open_until', 0):
+            # Let one trial call through; others keep failing fast until it returns
+            state['state'] = HALF_OPEN
+            state['open_until'] = now + self.reset_timeout
+            return True
+        if circuit == HALF_OPEN and now >= state.get('open_until', 0):
+            # The trial call never reported back
+            state['open_until'] = now + self.reset_timeout
+            return True
+        return False
+
+    def _record_failure(self, state):
+        state['failures'] = state.get('failures', 0) + 1
+        if state.get('state') == HALF_OPEN or state['failures'] >= self.failure_threshold:
+            if state.get('state') != OPEN:
+                print(f"Opening the {self.provider} circuit after {state['failures']} failures")
+            state['state'] = OPEN
+            state['open_until'] = time.time() + self.reset_timeout
+
+    @staticmethod
+    def _release_trial(state):
+        if state.get('state') == HALF_OPEN:
+            state['state'] = OPEN
+            state['open_until'] = time.time()
+
+    @staticmethod
+    def _record_success(state, duration: Optional[float]):
+        state['state'] = CLOSED
+        state['failures'] = 0
+        if duration is not None:
+            average = state.get('average_duration')
+            state['average_duration'] = duration if average is None else (
+                average + LATENCY_SMOOTHING * (duration - average)
+            )
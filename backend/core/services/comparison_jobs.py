@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional, Set, Tuple
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from ..models import Policy, RenewalComparison, RenewalComparisonJob
+from .renewal_comparator import RenewalComparator, RenewalComparisonError
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# Jobs queued or running in this process, kept alive by the heartbeat thread
+_live_jobs: Set[int] = set()
+_heartbeat_pid = None
+
+def get_job_pool() -> ThreadPoolExecutor:
+    """
+    Return the process-wide pool running renewal comparison jobs, creating it
+    on first use and again in forked children.
+
+    Jobs spend nearly all their time waiting on the LLM provider, so threads
+    are enough; text extraction still runs in the extraction process pool.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RENEWAL_JOB_WORKERS', 4),
+                thread_name_prefix='renewal-comparison'
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def get_heartbeat_interval() -> float:
+    """Return the seconds between touches of the jobs a process holds, well within RENEWAL_JOB_TIMEOUT."""
+    return min(30, getattr(settings, 'RENEWAL_JOB_TIMEOUT', 120) / 4)
+
+def _start_heartbeat() -> None:
+    """Start the thread touching this process's live jobs, once per process."""
+    global _heartbeat_pid
+    with _pool_lock:
+        if _heartbeat_pid == os.getpid():
+            return
+        _live_jobs.clear()
+        _heartbeat_pid = os.getpid()
+    threading.Thread(target=_heartbeat, name='renewal-comparison-heartbeat', daemon=True).start()
+
+def _heartbeat() -> None:
+    while True:
+        time.sleep(get_heartbeat_interval())
+        with _pool_lock:
+            job_ids = list(_live_jobs)
+        if not job_ids:
+            continue
+        try:
+            RenewalComparisonJob.objects.filter(
+                pk__in=job_ids,
+                status__in=[RenewalComparisonJob.PENDING, RenewalComparisonJob.RUNNING]
+            ).update(updated_at=timezone.now())
+        except Exception as e:
+            print(f"Error touching renewal comparison jobs: {str(e)}")
+        finally:
+            close_old_connections()
+
+class RenewalComparisonJobs:
+    """
+    Runs renewal comparisons outside of the request that asked for them.
+
+    Jobs are stored in the database so that any server process can report
+    their status, and run in a thread pool of the process that created them.
+    That process touches its queued and running jobs every few seconds; a job
+    not touched for RENEWAL_JOB_TIMEOUT seconds, e.g. because its process was
+    restarted, is reported as failed.
+    """
+
+    @staticmethod
+    def submit(policy: Policy, provider: str, refresh: bool = False, created_by=None) -> Tuple[Optional[RenewalComparison], Optional[RenewalComparisonJob]]:
+        """
+        Return the stored comparison for the current inputs, or the job that
+        generates it: an unfinished job for the same policy, provider and
+        refresh flag is reused, otherwise a new one is queued.
+
+        Returns a (comparison, job) tuple with exactly one of them set.
+        Raises RenewalComparisonError if the documents cannot be read.
+        """
+        if not refresh:
+            comparator = RenewalComparator(policy, provider=provider)
+            _, input_hash = comparator.get_input_hashes()
+            comparison = policy.renewal_comparisons.filter(input_hash=input_hash).first()
+            if comparison is not None:
+                return comparison, None
+
+        with transaction.atomic():
+            # Lock the policy so concurrent requests queue one job between them
+            Policy.objects.select_for_update().filter(pk=policy.pk).first()
+            job = policy.renewal_comparison_jobs.filter(
+                provider=provider,
+                refresh=refresh,
+                status__in=[RenewalComparisonJob.PENDING, RenewalComparisonJob.RUNNING],
+                updated_at__gte=RenewalComparisonJobs._stale_before()
+            ).first()
+            if job is not None:
+                return None, job
+            job = RenewalComparisonJob.objects.create(
+                policy=policy,
+                provider=provider,
+                refresh=refresh,
+                created_by=created_by
+            )
+            transaction.on_commit(lambda: RenewalComparisonJobs._queue(job.pk))
+        return None, job
+
+    @staticmethod
+    def get(job_id: int, policy: Policy) -> RenewalComparisonJob:
+        """Return a job of a policy, failing it first if it was abandoned."""
+        job = policy.renewal_comparison_jobs.select_related('comparison').get(pk=job_id)
+        if not job.is_finished and job.updated_at < RenewalComparisonJobs._stale_before():
+            RenewalComparisonJobs._finish(job, error="The comparison job was interrupted. Please try again.")
+        return job
+
+    @staticmethod
+    def _queue(job_id: int) -> None:
+        _start_heartbeat()
+        with _pool_lock:
+            _live_jobs.add(job_id)
+        get_job_pool().submit(RenewalComparisonJobs.run, job_id)
+
+    @staticmethod
+    def run(job_id: int) -> None:
+        """Generate the comparison of a job; called in a worker thread."""
+        close_old_connections()
+        try:
+            updated = RenewalComparisonJob.objects.filter(
+                pk=job_id,
+                status=RenewalComparisonJob.PENDING
+            ).update(status=RenewalComparisonJob.RUNNING, started_at=timezone.now(), updated_at=timezone.now())
+            if not updated:
+                return
+            job = RenewalComparisonJob.objects.select_related('policy').get(pk=job_id)
+
+            try:
+                comparator = RenewalComparator(job.policy, provider=job.provider)
+                result = comparator.get_comparison(refresh=job.refresh, created_by=job.created_by)
+            except RenewalComparisonError as e:
+                RenewalComparisonJobs._finish(job, error=str(e))
+            except Exception as e:
+                print(f"Error in renewal comparison job {job_id}: {str(e)}")
+                RenewalComparisonJobs._finish(job, error=f"Failed to generate comparison: {str(e)}")
+            else:
+                RenewalComparisonJobs._finish(job, comparison=result.comparison, stale=result.stale)
+        finally:
+            with _pool_lock:
+                _live_jobs.discard(job_id)
+            close_old_connections()
+
+    @staticmethod
+    def _finish(job: RenewalComparisonJob, comparison: Optional[RenewalComparison] = None, error: str = '',
+                stale: bool = False) -> None:
+        """Record the outcome of a job, unless it was already finished, e.g. failed as abandoned."""
+        finished_at = timezone.now()
+        updated = RenewalComparisonJob.objects.filter(
+            pk=job.pk,
+            status__in=[RenewalComparisonJob.PENDING, RenewalComparisonJob.RUNNING]
+        ).update(
+            status=RenewalComparisonJob.FAILED if error else RenewalComparisonJob.SUCCEEDED,
+            comparison=comparison,
+            stale=stale,
+            error=error,
+            finished_at=finished_at,
+            updated_at=finished_at
+        )
+        if updated:
+            job.status = RenewalComparisonJob.FAILED if error else RenewalComparisonJob.SUCCEEDED
+            job.comparison = comparison
+            job.stale = stale
+            job.error = error
+            job.finished_at = job.updated_at = finished_at
+        else:
+            job.refresh_from_db()
+
+    @staticmethod
+    def _stale_before():
+        return timezone.now() - timedelta(seconds=getattr(settings, 'RENEWAL_JOB_TIMEOUT', 120))
@@ -3,7 +3,9 @@ import requests
 from typing import List, Dict
 from dotenv import load_dotenv
 from core.models import BusinessDocument, FieldValue, validate_and_format_phone
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from .fake_vapi import FakeVapiSession
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +16,13 @@ class ContactCustomerService:
     ASSISTANT_ID = "57e4e571-0070-482d-a01c-fb8d1792f1fe"
     PHONE_NUMBER_ID = "6c54d848-e6cb-4fd8-b726-738b6d6902d2"
 
+    @staticmethod
+    def _get_vapi_session():
+        """Return the HTTP client of the Vapi API selected by VAPI_BACKEND ('live' or 'fake')."""
+        if getattr(settings, 'VAPI_BACKEND', 'live') == 'fake':
+            return FakeVapiSession
+        return requests
+
     @staticmethod
     def _get_missing_required_fields(business_document: BusinessDocument) -> List[Dict]:
         """Get required fields that don't have values for this business."""
@@ -138,7 +147,7 @@ class ContactCustomerService:
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(
+            response = ContactCustomerService._get_vapi_session().post(
                 ContactCustomerService.VAPI_API_URL,
                 json=payload,
                 headers=headers
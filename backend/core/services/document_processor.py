@@ -4,6 +4,10 @@ from typing import BinaryIO, Any, Union
 from ..models import Business, Document, Field, FieldValue, UploadedBusinessDocument
 from django.core.files import File
 from datetime import datetime
+from .acroform_reader import AcroFormReader
+from .extractors import PDF, detect_mime_type
+from .document_search import DocumentSearchIndex
+from .text_extraction import TextExtractionError
 
 class DocumentProcessor:
     def __init__(self, file: BinaryIO):
@@ -37,73 +41,60 @@ class UploadedDocumentProcessor:
         self.uploaded_doc = uploaded_doc
 
     def process(self):
-        """Process the uploaded document and extract field values."""
-        # Example field mappings from the document
-        field_values = {
-            'certificate_date': '07/22/2024',
-            'name': 'The Laundry Genius Inc',
-            'address': '7807 Evergreen Way, Everett, WA 98203-6427',
-            'policy_number': 'BIP-4W906929-24-42',
-            'carrier_name': 'Fidelity and Guaranty Insurance Company',
-            'agency_name': 'Brooks Waterburn Corp',
-            'agency_address': '1105 Broadhollow Rd',
-            'agency_city': 'Farmingdale',
-            'agency_state': 'NY',
-            'agency_zip': '11735-4818',
-            'proposed_effective_date': '09/01/2024',
-            'policy_expiration_date': '09/01/2025',
-            'billing_plan_direct': 'True',
-            'policy_premium': '$3,932.00',
-            'business_type': 'Corporation',
-            'business_description': 'Laundromat Business'
-        }
+        """Process the uploaded document: extract field values, then index its text."""
+        mime_type = detect_mime_type(self.uploaded_doc.file.path)
 
-        # Store field values
-        self._store_field_values(field_values, self.uploaded_doc)
+        if mime_type == PDF:
+            # Fillable ACORD forms carry their values in AcroForm fields
+            field_values = AcroFormReader(self.file).read_field_values()
 
-    def _store_field_values(self, field_values: dict, uploaded_doc: UploadedBusinessDocument):
-        """Store the extracted field values in the database."""
-        field_mapping = {
-            'certificate_date': 'date',
-            'name': 'applicant_name',
-            'address': 'premises_address',
-            'policy_number': 'policy_number',
-            'carrier_name': 'carrier_name',
-            'agency_name': 'agency_name',
-            'agency_address': 'agency_address',
-            'agency_city': 'agency_city',
-            'agency_state': 'agency_state',
-            'agency_zip': 'agency_zip',
-            'proposed_effective_date': 'proposed_effective_date',
-            'policy_expiration_date': 'policy_expiration_date',
-            'billing_plan_direct': 'billing_plan_direct',
-            'policy_premium': 'policy_premium',
-            'business_type': 'business_type',
-            'business_description': 'business_description'
-        }
+            # Store field values
+            self._store_field_values(field_values, self.uploaded_doc)
+
+        # Extract the text with the extractor for the file's type and make it searchable
+        try:
+            DocumentSearchIndex.index_document(self.uploaded_doc)
+        except TextExtractionError as e:
+            print(f"Error indexing document {self.uploaded_doc.name}: {str(e)}")
 
+    def _store_field_values(self, field_values: dict, uploaded_doc: UploadedBusinessDocument):
+        """Store the extracted field values, keyed by Field.field_id, in the database."""
         # Get all fields for efficiency
         fields = {
             field.field_id: field 
-            for field in Field.objects.filter(field_id__in=field_mapping.values())
+            for field in Field.objects.filter(field_id__in=field_values.keys())
         }
 
-        # Create or update field values
-        for key, value in field_values.items():
-            field_id = field_mapping.get(key)
-            if field_id and field_id in fields:
-                field = fields[field_id]
-                if value is not None:
-                    # Create or update field value
-                    FieldValue.objects.update_or_create(
-                        field=field,
-                        business=self.business,
-                        defaults={
-                            'value': value,
-                            'source': 'document',
-                            'source_id': uploaded_doc.id
-                        }
-                    )
+        new_values = [
+            FieldValue(
+                field=fields[field_id],
+                business=self.business,
+                value=self._normalize_value(fields[field_id], value),
+                source=FieldValue.DOCUMENT,
+                source_id=uploaded_doc.id
+            )
+            for field_id, value in field_values.items()
+            if field_id in fields and value is not None
+        ]
+
+        # Create or update all field values in a single query
+        FieldValue.objects.bulk_create(
+            new_values,
+            update_conflicts=True,
+            unique_fields=['field', 'business'],
+            update_fields=['value', 'source', 'source_id', 'updated_at']
+        )
+
+    @staticmethod
+    def _normalize_value(field: Field, value: str) -> str:
+        """Convert form dates to the YYYY-MM-DD format expected for date fields."""
+        if field.field_type == Field.DATE:
+            for date_format in ('%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d'):
+                try:
+                    return datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+                except ValueError:
+                    continue
+        return value
 
     def _update_business_data(self, data: dict) -> None:
         """
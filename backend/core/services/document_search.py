@@ -0,0 +1,176 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List
+from django.db import connection, transaction
+from ..models import ExtractedPage, UploadedBusinessDocument
+from .text_extraction import DocumentTextCache, EXTRACTOR_VERSION, PAGE_BATCH_SIZE
+
+SEARCH_INDEX_TABLE = 'core_document_search_index'
+
+# Number of words of context around the matches in a snippet
+SNIPPET_WORDS = 16
+
+QUERY_TOKEN_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+def build_match_query(query: str) -> str:
+    """
+    Translate a user query into an FTS5 MATCH expression.
+
+    Quoted text is searched as a phrase and every other word must appear
+    somewhere on the page. Each term is quoted so that FTS5 operators and
+    punctuation in the query can never cause a syntax error.
+    """
+    terms = []
+    for phrase, word in QUERY_TOKEN_PATTERN.findall(query):
+        words = re.findall(r'\w+', phrase or word)
+        if words:
+            terms.append('"{}"'.format(' '.join(words)))
+    return ' '.join(terms)
+
+def is_search_index_available() -> bool:
+    """Return whether the database supports the FTS5 search index."""
+    return connection.vendor == 'sqlite'
+
+class DocumentSearchIndex:
+    """
+    Full-text index over the extracted pages of uploaded documents.
+
+    Each page of a document is one row of an SQLite FTS5 table, so searches
+    are ranked with BM25 and return highlighted snippets. Documents are
+    indexed when they are uploaded and removed when they are deleted; the
+    rebuild_search_index command re-indexes everything.
+    """
+
+    @staticmethod
+    def index_document(uploaded_doc: UploadedBusinessDocument) -> int:
+        """
+        Index the extracted text of a document, replacing any previous entries.
+
+        Returns the number of pages indexed. Raises TextExtractionError if the
+        document text cannot be extracted.
+        """
+        pages = DocumentTextCache.iter_prompt_pages(uploaded_doc)
+        if not is_search_index_available():
+            # Consume the pages so the text is extracted and cached for searching
+            return sum(1 for _ in pages)
+
+        indexed = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE document_id = %s", [uploaded_doc.pk])
+            batch = []
+            for page_number, text in enumerate(pages, start=1):
+                batch.append((text, uploaded_doc.pk, page_number))
+                if len(batch) >= PAGE_BATCH_SIZE:
+                    indexed += DocumentSearchIndex._insert(cursor, batch)
+                    batch = []
+            indexed += DocumentSearchIndex._insert(cursor, batch)
+        return indexed
+
+    @staticmethod
+    def remove_document(document_id: int) -> None:
+        """Remove a document from the index."""
+        if not is_search_index_available():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_INDEX_TABLE} WHERE document_id = %s", [document_id])
+
+    @staticmethod
+    def clear() -> None:
+        """Remove every document from the index."""
+        if not is_search_index_available():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_INDEX_TABLE}")
+
+    @staticmethod
+    def search(query: str, agency_ids: Iterable[int], limit: int = 20) -> List[Dict]:
+        """
+        Return the pages of documents belonging to the given agencies that
+        match a query, best matches first.
+
+        Each hit has the document and business it belongs to, the page
+        number, a snippet with the matches wrapped in <mark> tags and a rank
+        where lower is better.
+        """
+        match = build_match_query(query)
+        agency_ids = list(agency_ids)
+        if not match or not agency_ids:
+            return []
+        if not is_search_index_available():
+            return DocumentSearchIndex._search_pages(query, agency_ids, limit)
+
+        agency_placeholders = ', '.join(['%s'] * len(agency_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT d.id, d.name, b.id, b.name, i.page_number,
+                       snippet({SEARCH_INDEX_TABLE}, 0, '<mark>', '</mark>', '…', %s),
+                       bm25({SEARCH_INDEX_TABLE}) AS rank
+                FROM {SEARCH_INDEX_TABLE} i
+                JOIN core_uploadedbusinessdocument d ON d.id = i.document_id
+                JOIN core_business b ON b.id = d.business_id
+                JOIN core_customer c ON c.id = b.customer_id
+                WHERE {SEARCH_INDEX_TABLE} MATCH %s AND c.agency_id IN ({agency_placeholders})
+                ORDER BY rank
+                LIMIT %s
+                """,
+                [SNIPPET_WORDS, match, *agency_ids, limit]
+            )
+            rows = cursor.fetchall()
+
+        return [
+            {
+                'document_id': document_id,
+                'document_name': document_name,
+                'business_id': business_id,
+                'business_name': business_name,
+                'page_number': page_number,
+                'snippet': snippet,
+                'rank': rank,
+            }
+            for document_id, document_name, business_id, business_name, page_number, snippet, rank in rows
+        ]
+
+    @staticmethod
+    def _insert(cursor, rows: List[tuple]) -> int:
+        if rows:
+            cursor.executemany(
+                f"INSERT INTO {SEARCH_INDEX_TABLE} (text, document_id, page_number) VALUES (%s, %s, %s)",
+                rows
+            )
+        return len(rows)
+
+    @staticmethod
+    def _search_pages(query: str, agency_ids: List[int], limit: int) -> List[Dict]:
+        """Unranked substring search over the extracted pages, for databases without FTS5."""
+        words = re.findall(r'\w+', query)
+        # Identical files share their extracted pages but are separate documents, each with its own hits
+        documents = defaultdict(list)
+        for doc in UploadedBusinessDocument.objects.select_related('business').filter(
+            business__customer__agency_id__in=agency_ids
+        ).exclude(content_hash='').order_by('id'):
+            documents[doc.content_hash].append(doc)
+        pages = ExtractedPage.objects.select_related('extraction').filter(
+            extraction__content_hash__in=documents.keys(),
+            extraction__extractor_version=EXTRACTOR_VERSION,
+            extraction__is_complete=True
+        ).order_by('extraction_id', 'page_number')
+        for word in words:
+            pages = pages.filter(text__icontains=word)
+
+        hits = []
+        for page in pages.iterator():
+            position = page.text.lower().find(words[0].lower())
+            for doc in documents[page.extraction.content_hash]:
+                hits.append({
+                    'document_id': doc.id,
+                    'document_name': doc.name,
+                    'business_id': doc.business_id,
+                    'business_name': doc.business.name,
+                    'page_number': page.page_number,
+                    'snippet': page.text[max(0, position - 100):position + 100],
+                    'rank': None,
+                })
+                if len(hits) >= limit:
+                    return hits
+        return hits
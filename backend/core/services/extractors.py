@@ -0,0 +1,453 @@
+"""
+Text extractors for the non-PDF formats agencies upload.
+
+Each extractor turns one file into PageText entries: a page per DOCX page
+break, a page per block of spreadsheet or CSV rows, and a page for an email
+body. Tables are rendered with table_extractor.format_table so they look
+the same as tables reconstructed from PDFs. Only the standard library is
+used, and like pdf_text this module must not import Django.
+
+The XML parts of DOCX and XLSX files are parsed as a stream, one paragraph,
+table or row at a time, so a large document is never held in memory whole.
+Table extractors stop once they have produced `max_bytes` bytes of text,
+and only the first `max_bytes` bytes of an email are parsed.
+"""
+import csv
+import html
+import mimetypes
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from email import policy
+from email.parser import BytesFeedParser
+from html.parser import HTMLParser
+from typing import Callable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+from .pdf_text import PageText
+from .table_extractor import TSV, format_table
+
+PDF = 'application/pdf'
+DOCX = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV = 'text/csv'
+EML = 'message/rfc822'
+TEXT = 'text/plain'
+PNG = 'image/png'
+JPEG = 'image/jpeg'
+TIFF = 'image/tiff'
+GIF = 'image/gif'
+BMP = 'image/bmp'
+ZIP = 'application/zip'
+UNKNOWN = 'application/octet-stream'
+
+IMAGE_TYPES = {PNG, JPEG, TIFF, GIF, BMP}
+
+# Spreadsheet and CSV rows rendered per page
+ROWS_PER_PAGE = 200
+
+# Bytes read from the start of a file to detect its type
+SNIFF_BYTES = 8192
+
+# Bytes of an email fed to the parser at a time
+EMAIL_CHUNK_BYTES = 64 * 1024
+
+EMAIL_HEADER_PATTERN = re.compile(
+    rb'^(Received|Return-Path|From|To|Subject|Date|Message-ID|MIME-Version|Delivered-To|X-[\w-]+):',
+    re.IGNORECASE | re.MULTILINE
+)
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+def detect_mime_type(file_path: str) -> str:
+    """
+    Detect the MIME type of a file from its content, falling back to its
+    extension only to tell CSV from other text.
+    """
+    with open(file_path, 'rb') as f:
+        header = f.read(SNIFF_BYTES)
+
+    if header.startswith(b'%PDF'):
+        return PDF
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return PNG
+    if header.startswith(b'\xff\xd8\xff'):
+        return JPEG
+    if header[:4] in (b'II*\x00', b'MM\x00*'):
+        return TIFF
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return GIF
+    if header.startswith(b'BM') and len(header) > 14:
+        return BMP
+    if header.startswith(b'PK\x03\x04'):
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return UNKNOWN
+        if 'word/document.xml' in names:
+            return DOCX
+        if 'xl/workbook.xml' in names:
+            return XLSX
+        return ZIP
+    if b'\x00' in header:
+        return UNKNOWN
+
+    try:
+        header.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # The sniffed block may end in the middle of a multi-byte character
+        if e.start < len(header) - 4:
+            try:
+                header.decode('cp1252')
+            except UnicodeDecodeError:
+                return UNKNOWN
+
+    guessed_type = mimetypes.guess_type(file_path)[0]
+    if guessed_type == CSV or file_path.lower().endswith('.csv'):
+        return CSV
+    if guessed_type == EML or len(EMAIL_HEADER_PATTERN.findall(header[:2048])) >= 3:
+        return EML
+    return TEXT
+
+class _TextBudget:
+    """The bytes of text an extractor may still produce; None means unlimited."""
+
+    def __init__(self, max_bytes: Optional[int]):
+        self.remaining = max_bytes
+
+    @property
+    def is_spent(self) -> bool:
+        return self.remaining is not None and self.remaining <= 0
+
+    def take(self, text: str) -> str:
+        """Charge text to the budget, returning the part of it that fits."""
+        if self.remaining is None:
+            return text
+        encoded = text.encode('utf-8')
+        if len(encoded) > self.remaining:
+            text = encoded[:max(0, self.remaining)].decode('utf-8', errors='ignore')
+        self.remaining -= len(encoded)
+        return text
+
+def _iter_children(xml_file, parent_tag: str, child_tags: Tuple[str, ...]) -> Iterator[ElementTree.Element]:
+    """
+    Parse an XML stream, yielding each complete child of a `parent_tag`
+    element whose tag is in `child_tags`. Yielded elements are dropped from
+    the tree afterwards, so memory use does not grow with the document.
+    """
+    parents = []
+    for event, element in ElementTree.iterparse(xml_file, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == parent_tag:
+                parents.append(element)
+            continue
+        if element.tag == parent_tag:
+            parents.pop()
+        elif parents and element.tag in child_tags and element in parents[-1]:
+            yield element
+            parents[-1].remove(element)
+
+def iter_docx_pages(
+    file_path: str,
+    table_format: Optional[str] = None,
+    max_bytes: Optional[int] = None
+) -> Iterator[PageText]:
+    """Yield the text of a DOCX document, split at its page breaks."""
+    budget = _TextBudget(max_bytes)
+    blocks = []
+    with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as xml_file:
+        for element in _iter_children(xml_file, f'{WORD_NS}body', (f'{WORD_NS}p', f'{WORD_NS}tbl')):
+            if element.tag == f'{WORD_NS}p':
+                for index, text in enumerate(_docx_paragraph_pages(element)):
+                    if index > 0:
+                        yield from _docx_page(blocks)
+                        blocks = []
+                    blocks.append(budget.take(text))
+            else:
+                grid = [
+                    [_docx_cell_text(cell) for cell in row.findall(f'{WORD_NS}tc')]
+                    for row in element.findall(f'{WORD_NS}tr')
+                ]
+                if any(any(row) for row in grid):
+                    blocks.append(budget.take(format_table(_pad_rows(grid), table_format or TSV)))
+            if budget.is_spent:
+                break
+    yield from _docx_page(blocks)
+
+def _docx_paragraph_pages(paragraph) -> List[str]:
+    """Return the text of a paragraph, split into one entry per page it spans."""
+    pages = ['']
+    for element in paragraph.iter():
+        if element.tag == f'{WORD_NS}t' and element.text:
+            pages[-1] += element.text
+        elif element.tag == f'{WORD_NS}tab':
+            pages[-1] += '\t'
+        elif element.tag == f'{WORD_NS}br':
+            if element.get(f'{WORD_NS}type') == 'page':
+                pages.append('')
+            else:
+                pages[-1] += '\n'
+        elif element.tag == f'{WORD_NS}lastRenderedPageBreak' and pages[-1]:
+            pages.append('')
+    return pages
+
+def _docx_cell_text(cell) -> str:
+    return ' '.join(' '.join(''.join(_docx_paragraph_pages(p)) for p in cell.iter(f'{WORD_NS}p')).split())
+
+def _docx_page(blocks: List[str]) -> Iterator[PageText]:
+    text = '\n'.join(blocks).strip('\n')
+    if text.strip():
+        yield PageText(text)
+
+def _pad_rows(grid: List[List[str]]) -> List[List[str]]:
+    width = max(len(row) for row in grid)
+    return [row + [''] * (width - len(row)) for row in grid]
+
+def iter_xlsx_pages(
+    file_path: str,
+    table_format: Optional[str] = None,
+    max_bytes: Optional[int] = None
+) -> Iterator[PageText]:
+    """Yield the cells of each worksheet of an XLSX workbook as tables of ROWS_PER_PAGE rows."""
+    budget = _TextBudget(max_bytes)
+    with zipfile.ZipFile(file_path) as archive:
+        names = set(archive.namelist())
+        shared_strings = _xlsx_shared_strings(archive, max_bytes) if 'xl/sharedStrings.xml' in names else []
+        date_styles = _xlsx_date_styles(archive) if 'xl/styles.xml' in names else set()
+        for sheet_name, sheet_path in _xlsx_sheets(archive):
+            if sheet_path not in names:
+                continue
+            rows = []
+            with archive.open(sheet_path) as xml_file:
+                for row in _iter_children(xml_file, f'{SHEET_NS}sheetData', (f'{SHEET_NS}row',)):
+                    values = _xlsx_row_values(row, shared_strings, date_styles)
+                    if values:
+                        rows.append([budget.take(value) for value in values])
+                    if len(rows) >= ROWS_PER_PAGE or (rows and budget.is_spent):
+                        yield _xlsx_page(sheet_name, rows, table_format)
+                        rows = []
+                    if budget.is_spent:
+                        return
+            if rows:
+                yield _xlsx_page(sheet_name, rows, table_format)
+
+def _xlsx_page(sheet_name: str, rows: List[List[str]], table_format: Optional[str]) -> PageText:
+    # Drop columns that are empty in every row of the page
+    width = max(len(row) for row in rows)
+    used = [column for column in range(width) if any(column < len(row) and row[column] for row in rows)]
+    rows = [[row[column] if column < len(row) else '' for column in used] for row in rows]
+    return PageText(f"Sheet: {sheet_name}\n{format_table(rows, table_format or TSV)}")
+
+def _xlsx_shared_strings(archive: zipfile.ZipFile, max_bytes: Optional[int] = None) -> List[str]:
+    """Return the workbook's shared strings; those past `max_bytes` of text are left out."""
+    budget = _TextBudget(max_bytes)
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as xml_file:
+        for item in _iter_children(xml_file, f'{SHEET_NS}sst', (f'{SHEET_NS}si',)):
+            strings.append(budget.take(''.join(t.text or '' for t in item.iter(f'{SHEET_NS}t'))))
+            if budget.is_spent:
+                break
+    return strings
+
+def _parse_part(archive: zipfile.ZipFile, name: str) -> ElementTree.Element:
+    with archive.open(name) as xml_file:
+        return ElementTree.parse(xml_file).getroot()
+
+def _xlsx_sheets(archive: zipfile.ZipFile) -> List[tuple]:
+    """Return (sheet name, path in the archive) for each worksheet in workbook order."""
+    workbook = _parse_part(archive, 'xl/workbook.xml')
+    relationships = _parse_part(archive, 'xl/_rels/workbook.xml.rels')
+    targets = {
+        rel.get('Id'): rel.get('Target')
+        for rel in relationships.iter(f'{PACKAGE_RELATIONSHIP_NS}Relationship')
+    }
+    sheets = []
+    for sheet in workbook.iter(f'{SHEET_NS}sheet'):
+        target = targets.get(sheet.get(f'{RELATIONSHIP_NS}id'), '')
+        path = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+        sheets.append((sheet.get('name'), os.path.normpath(path).replace(os.sep, '/')))
+    return sheets
+
+# Built-in number formats that display a date
+XLSX_DATE_FORMAT_IDS = set(range(14, 23)) | {45, 46, 47}
+
+def _xlsx_date_styles(archive: zipfile.ZipFile) -> set:
+    """Return the indexes of cell styles that format numbers as dates."""
+    root = _parse_part(archive, 'xl/styles.xml')
+    date_formats = set(XLSX_DATE_FORMAT_IDS)
+    for number_format in root.iter(f'{SHEET_NS}numFmt'):
+        code = re.sub(r'"[^"]*"|\[[^\]]*\]', '', number_format.get('formatCode', '').lower())
+        if re.search(r'[dy]', code):
+            date_formats.add(int(number_format.get('numFmtId')))
+    cell_formats = root.find(f'{SHEET_NS}cellXfs')
+    if cell_formats is None:
+        return set()
+    return {
+        index for index, style in enumerate(cell_formats.findall(f'{SHEET_NS}xf'))
+        if int(style.get('numFmtId', 0)) in date_formats
+    }
+
+def _xlsx_row_values(row, shared_strings: List[str], date_styles: set) -> List[str]:
+    """Return the cell values of a row by column, or an empty list for an empty row."""
+    cells = {}
+    for index, cell in enumerate(row.findall(f'{SHEET_NS}c')):
+        column = _xlsx_column(cell.get('r')) if cell.get('r') else index
+        value = _xlsx_cell_value(cell, shared_strings, date_styles)
+        if value:
+            cells[column] = value
+    if not cells:
+        return []
+    values = [''] * (max(cells) + 1)
+    for column, value in cells.items():
+        values[column] = value
+    return values
+
+def _xlsx_column(reference: str) -> int:
+    column = 0
+    for char in re.match(r'[A-Z]+', reference.upper()).group():
+        column = column * 26 + ord(char) - ord('A') + 1
+    return column - 1
+
+def _xlsx_cell_value(cell, shared_strings: List[str], date_styles: set) -> str:
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{SHEET_NS}t')).strip()
+    value = cell.findtext(f'{SHEET_NS}v')
+    if value is None:
+        return ''
+    if cell_type == 's':
+        index = int(value)
+        return shared_strings[index].strip() if index < len(shared_strings) else ''
+    if cell_type == 'b':
+        return 'TRUE' if value == '1' else 'FALSE'
+    if cell_type in ('str', 'e'):
+        return value.strip()
+    if int(cell.get('s', 0)) in date_styles:
+        try:
+            # Excel serial dates count days from 1899-12-30
+            return (datetime(1899, 12, 30) + timedelta(days=float(value))).strftime('%m/%d/%Y')
+        except (ValueError, OverflowError):
+            return value
+    return value[:-2] if value.endswith('.0') else value
+
+def iter_csv_pages(
+    file_path: str,
+    table_format: Optional[str] = None,
+    max_bytes: Optional[int] = None
+) -> Iterator[PageText]:
+    """Yield the rows of a CSV file as tables of ROWS_PER_PAGE rows."""
+    budget = _TextBudget(max_bytes)
+    with open(file_path, 'r', newline='', errors='replace') as f:
+        sample = f.read(SNIFF_BYTES)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample)
+        except csv.Error:
+            dialect = csv.excel
+        rows = []
+        for row in csv.reader(f, dialect):
+            if any(cell.strip() for cell in row):
+                rows.append([budget.take(cell.strip()) for cell in row])
+            if len(rows) >= ROWS_PER_PAGE or (rows and budget.is_spent):
+                yield PageText(format_table(_pad_rows(rows), table_format or TSV))
+                rows = []
+            if budget.is_spent:
+                return
+        if rows:
+            yield PageText(format_table(_pad_rows(rows), table_format or TSV))
+
+class _HTMLTextParser(HTMLParser):
+    BLOCK_TAGS = {'p', 'div', 'br', 'tr', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table'}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('script', 'style'):
+            self.skip += 1
+        elif tag in self.BLOCK_TAGS:
+            self.parts.append('\n')
+        elif tag == 'td':
+            self.parts.append('\t')
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style') and self.skip:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+def html_to_text(markup: str) -> str:
+    """Return the visible text of an HTML document, one line per block element."""
+    parser = _HTMLTextParser()
+    parser.feed(markup)
+    lines = (' '.join(line.split()) for line in html.unescape(''.join(parser.parts)).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+def iter_eml_pages(
+    file_path: str,
+    extract_attachment: Callable[[str], Iterator[PageText]],
+    max_bytes: Optional[int] = None
+) -> Iterator[PageText]:
+    """
+    Yield an email's headers and body as the first page, followed by the
+    pages of each attachment, which are extracted with `extract_attachment`
+    from a temporary copy.
+
+    The parser is fed the file in chunks up to `max_bytes`; the attachments
+    of a larger email are left out rather than extracted from a cut-off copy.
+    """
+    parser = BytesFeedParser(policy=policy.default)
+    truncated = False
+    with open(file_path, 'rb') as f:
+        read = 0
+        for chunk in iter(lambda: f.read(EMAIL_CHUNK_BYTES), b''):
+            if max_bytes is not None and read + len(chunk) > max_bytes:
+                parser.feed(chunk[:max_bytes - read])
+                truncated = True
+                break
+            parser.feed(chunk)
+            read += len(chunk)
+    message = parser.close()
+
+    headers = [
+        f"{name}: {message[name]}"
+        for name in ('From', 'To', 'Cc', 'Date', 'Subject')
+        if message[name]
+    ]
+    body = message.get_body(preferencelist=('plain', 'html'))
+    body_text = ''
+    if body is not None:
+        body_text = body.get_content()
+        if body.get_content_type() == 'text/html':
+            body_text = html_to_text(body_text)
+    yield PageText('\n'.join(headers) + '\n\n' + body_text.strip())
+
+    if truncated:
+        print(f"Leaving out the attachments of {os.path.basename(file_path)}: the email exceeds {max_bytes} bytes")
+        return
+
+    for attachment in message.iter_attachments():
+        filename = os.path.basename(attachment.get_filename() or 'attachment')
+        payload = attachment.get_payload(decode=True)
+        if not payload:
+            continue
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            attachment_path = os.path.join(tmp_dir, filename)
+            with open(attachment_path, 'wb') as f:
+                f.write(payload)
+            for index, page in enumerate(extract_attachment(attachment_path)):
+                if index == 0:
+                    page = page._replace(
+                        text=f"[Attachment: {filename}]\n{page.text}",
+                        table_text=f"[Attachment: {filename}]\n{page.table_text}" if page.table_text else None
+                    )
+                yield page
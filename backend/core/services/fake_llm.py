@@ -0,0 +1,257 @@
+"""
+Local stand-ins for the Anthropic and OpenAI clients.
+
+Selected with LLM_BACKEND = 'fake', they answer the calls RenewalComparator
+makes without network access or API keys:
+
+- The response is derived from a hash of the prompt, so the same prompt
+  always gets the same answer. A response recorded as
+  LLM_FAKE_RECORDINGS_DIR/<provider>-<prompt hash>.json is replayed instead.
+- Token usage is estimated from the prompt, or fixed with
+  LLM_FAKE_INPUT_TOKENS and LLM_FAKE_OUTPUT_TOKENS. Anthropic system blocks
+  marked with cache_control are reported as cache writes on first use and
+  cache reads afterwards, like the provider's prompt cache.
+- LLM_FAKE_LATENCY seconds are spent per call to imitate a provider round
+  trip, plus LLM_FAKE_SECONDS_PER_OUTPUT_TOKEN per output token.
+- A fraction LLM_FAKE_ERROR_RATE of calls fail with the SDK's own error for
+  HTTP status LLM_FAKE_ERROR_STATUS, so callers handle them as they would a
+  live failure. Failures are drawn from a generator seeded with
+  LLM_FAKE_SEED, so a run is reproducible for the same order of calls.
+
+A recording is a JSON object with the response "text" and, optionally, a
+"usage" object with input_tokens and output_tokens.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+import anthropic
+import httpx
+import openai
+from django.conf import settings
+from .token_estimator import estimate_tokens
+
+# Characters per streamed chunk
+STREAM_CHUNK_CHARS = 16
+
+_ERRORS = {
+    'anthropic': {
+        400: anthropic.BadRequestError,
+        401: anthropic.AuthenticationError,
+        429: anthropic.RateLimitError,
+    },
+    'openai': {
+        400: openai.BadRequestError,
+        401: openai.AuthenticationError,
+        429: openai.RateLimitError,
+    },
+}
+
+def _system_text(system) -> str:
+    if isinstance(system, str):
+        return system
+    return ''.join(block['text'] if isinstance(block, dict) else block for block in (system or []))
+
+def prompt_hash(system, messages) -> str:
+    """Return the hash identifying a prompt in fake responses and recordings."""
+    prompt = _system_text(system) + ''.join(message['content'] for message in messages)
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+def fake_completion(provider: str, system, messages, structured: bool = False) -> str:
+    """Return the deterministic response text for a prompt."""
+    prompt = _system_text(system) + ''.join(message['content'] for message in messages)
+    digest = prompt_hash(system, messages)[:12]
+
+    if not structured and '"email"' not in prompt:
+        # Summaries and other free text requests
+        return f"Fake {provider} summary {digest}"
+    return json.dumps({
+        "email": f"Fake {provider} renewal email {digest}",
+        "attachment": f"# Renewal Options Comparison\n\nFake {provider} comparison {digest}\n",
+    })
+
+def load_recording(provider: str, system, messages) -> Optional[dict]:
+    """Return the recorded response of a prompt, or None if there is none."""
+    recordings_dir = getattr(settings, 'LLM_FAKE_RECORDINGS_DIR', '')
+    if not recordings_dir:
+        return None
+    path = os.path.join(recordings_dir, f"{provider}-{prompt_hash(system, messages)}.json")
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+class _FakeProvider:
+    """Response, usage, latency and failures shared by the fake clients of a provider."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.random = random.Random(getattr(settings, 'LLM_FAKE_SEED', 0))
+        self.cached_prefixes = set()
+        self.lock = threading.Lock()
+
+    def respond(self, system, messages, structured=False):
+        """Return (text, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens)."""
+        self._maybe_fail()
+        recording = load_recording(self.provider, system, messages) or {}
+        text = recording.get('text') or fake_completion(self.provider, system, messages, structured)
+        usage = recording.get('usage', {})
+
+        input_tokens = (
+            usage.get('input_tokens')
+            or getattr(settings, 'LLM_FAKE_INPUT_TOKENS', 0)
+            or estimate_tokens(_system_text(system) + ''.join(m['content'] for m in messages), self.provider)
+        )
+        output_tokens = (
+            usage.get('output_tokens')
+            or getattr(settings, 'LLM_FAKE_OUTPUT_TOKENS', 0)
+            or estimate_tokens(text, self.provider)
+        )
+        cache_read_tokens, cache_write_tokens = self._cache_usage(system)
+
+        latency = getattr(settings, 'LLM_FAKE_LATENCY', 0.0)
+        latency += output_tokens * getattr(settings, 'LLM_FAKE_SECONDS_PER_OUTPUT_TOKEN', 0.0)
+        if latency:
+            time.sleep(latency)
+        input_tokens = max(input_tokens - cache_read_tokens - cache_write_tokens, 0)
+        return text, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens
+
+    def _cache_usage(self, system):
+        if isinstance(system, str) or not system:
+            return 0, 0
+        cached = [block['text'] for block in system if isinstance(block, dict) and block.get('cache_control')]
+        if not cached:
+            return 0, 0
+        prefix = ''.join(cached)
+        tokens = estimate_tokens(prefix, self.provider)
+        with self.lock:
+            if prefix in self.cached_prefixes:
+                return tokens, 0
+            self.cached_prefixes.add(prefix)
+        return 0, tokens
+
+    def _maybe_fail(self):
+        error_rate = getattr(settings, 'LLM_FAKE_ERROR_RATE', 0.0)
+        if not error_rate:
+            return
+        with self.lock:
+            fail = self.random.random() < error_rate
+        if not fail:
+            return
+        status_code = getattr(settings, 'LLM_FAKE_ERROR_STATUS', 529)
+        sdk = anthropic if self.provider == 'anthropic' else openai
+        error_class = _ERRORS[self.provider].get(status_code)
+        if error_class is None:
+            error_class = sdk.InternalServerError if status_code >= 500 else sdk.APIStatusError
+        response = httpx.Response(
+            status_code,
+            request=httpx.Request('POST', f"https://fake-{self.provider}.invalid/"),
+            json={"error": {"type": "fake_error", "message": f"Fake {self.provider} error"}}
+        )
+        raise error_class(f"Error code: {status_code} - fake {self.provider} error", response=response, body=None)
+
+class _FakeAnthropicStream:
+    def __init__(self, text: str, message, structured: bool = False):
+        self.text = text
+        self.message = message
+        self.structured = structured
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        for start in range(0, len(self.text), STREAM_CHUNK_CHARS):
+            yield self.text[start:start + STREAM_CHUNK_CHARS]
+
+    def __iter__(self):
+        for chunk in self.text_stream:
+            if self.structured:
+                yield SimpleNamespace(type='input_json', partial_json=chunk)
+            else:
+                yield SimpleNamespace(type='text', text=chunk)
+
+    def get_final_message(self):
+        return self.message
+
+class _FakeAnthropicMessages:
+    def __init__(self, provider: _FakeProvider):
+        self.provider = provider
+
+    def create(self, model, max_tokens, system=None, messages=(), tools=None, **kwargs):
+        structured = bool(tools)
+        text, input_tokens, output_tokens, cache_read, cache_write = self.provider.respond(system, messages, structured)
+        if structured:
+            content = [SimpleNamespace(type='tool_use', name=tools[0]['name'], input=json.loads(text), text=text)]
+        else:
+            content = [SimpleNamespace(type='text', text=text)]
+        return SimpleNamespace(
+            content=content,
+            usage=SimpleNamespace(
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                cache_read_input_tokens=cache_read,
+                cache_creation_input_tokens=cache_write
+            )
+        )
+
+    def stream(self, **kwargs):
+        message = self.create(**kwargs)
+        return _FakeAnthropicStream(message.content[0].text, message, message.content[0].type == 'tool_use')
+
+class FakeAnthropicClient:
+    def __init__(self):
+        self.messages = _FakeAnthropicMessages(_FakeProvider('anthropic'))
+
+    def close(self):
+        pass
+
+class _FakeOpenAIStream:
+    def __init__(self, text: str, usage):
+        self.text = text
+        self.usage = usage
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        for start in range(0, len(self.text), STREAM_CHUNK_CHARS):
+            delta = SimpleNamespace(content=self.text[start:start + STREAM_CHUNK_CHARS])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=self.usage)
+
+class _FakeOpenAICompletions:
+    def __init__(self, provider: _FakeProvider):
+        self.provider = provider
+
+    def create(self, model, messages=(), stream=False, response_format=None, **kwargs):
+        text, input_tokens, output_tokens, _, _ = self.provider.respond(None, messages, response_format is not None)
+        usage = SimpleNamespace(
+            prompt_tokens=input_tokens,
+            completion_tokens=output_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=0)
+        )
+        if stream:
+            return _FakeOpenAIStream(text, usage)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=usage
+        )
+
+class FakeOpenAIClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_FakeOpenAICompletions(_FakeProvider('openai')))
+
+    def close(self):
+        pass
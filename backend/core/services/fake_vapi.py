@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Vapi call API.
+
+Selected with VAPI_BACKEND = 'fake', ContactCustomerService places its calls
+here instead of https://api.vapi.ai. A call is queued at once, like a live
+one, and VAPI_FAKE_CALL_DURATION seconds later an end-of-call report is
+posted to VAPI_FAKE_WEBHOOK_URL, normally this server's /api/vapi/webhook/.
+The report answers every field of the call's structured data schema with a
+value of the requested type, so the webhook stores field values just as it
+would after a real call.
+
+A fraction VAPI_FAKE_ERROR_RATE of calls is rejected with a 500 response;
+failures are drawn from a generator seeded with VAPI_FAKE_SEED.
+"""
+import json
+import random
+import threading
+import uuid
+from datetime import date
+from typing import Any, Dict
+import requests
+from django.conf import settings
+
+_random = None
+_random_lock = threading.Lock()
+
+class FakeVapiResponse:
+    """The parts of requests.Response that ContactCustomerService reads."""
+
+    def __init__(self, status_code: int, data: Dict[str, Any]):
+        self.status_code = status_code
+        self.data = data
+        self.text = json.dumps(data)
+
+    def json(self) -> Dict[str, Any]:
+        return self.data
+
+def _should_fail() -> bool:
+    global _random
+    error_rate = getattr(settings, 'VAPI_FAKE_ERROR_RATE', 0.0)
+    if not error_rate:
+        return False
+    with _random_lock:
+        if _random is None:
+            _random = random.Random(getattr(settings, 'VAPI_FAKE_SEED', 0))
+        return _random.random() < error_rate
+
+def fake_answer(field_id: str, definition: Dict[str, Any]):
+    """Return the answer the fake customer gives for a structured data field."""
+    if definition.get('enum'):
+        return definition['enum'][0]
+    if definition.get('type') == 'number':
+        return 1
+    if definition.get('type') == 'boolean':
+        return True
+    if 'date' in f"{field_id} {definition.get('description') or ''}".lower():
+        return date.today().isoformat()
+    return f"Fake {field_id}"
+
+def build_end_of_call_report(call: Dict[str, Any], payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the end-of-call webhook event of a fake call."""
+    schema = (
+        payload.get('assistantOverrides', {})
+        .get('analysisPlan', {})
+        .get('structuredDataPlan', {})
+        .get('schema', {})
+    )
+    structured_data = {
+        field_id: fake_answer(field_id, definition)
+        for field_id, definition in schema.get('properties', {}).items()
+    }
+    return {
+        'message': {
+            'type': 'end-of-call-report',
+            'endedReason': 'customer-ended-call',
+            'call': call,
+            'durationSeconds': getattr(settings, 'VAPI_FAKE_CALL_DURATION', 1.0),
+            'analysis': {'structuredData': structured_data},
+        }
+    }
+
+def _send_end_of_call_report(call: Dict[str, Any], payload: Dict[str, Any]) -> None:
+    url = getattr(settings, 'VAPI_FAKE_WEBHOOK_URL', 'http://localhost:8000/api/vapi/webhook/')
+    try:
+        requests.post(url, json=build_end_of_call_report(call, payload), timeout=30)
+    except requests.RequestException as e:
+        print(f"Error sending fake Vapi webhook: {str(e)}")
+
+class FakeVapiSession:
+    """Accepts the POST requests ContactCustomerService sends to the Vapi call API."""
+
+    @staticmethod
+    def post(url: str, json: Dict[str, Any] = None, headers: Dict[str, str] = None, **kwargs) -> FakeVapiResponse:
+        if _should_fail():
+            return FakeVapiResponse(500, {'statusCode': 500, 'message': 'Fake Vapi error'})
+
+        call = {
+            'id': str(uuid.uuid4()),
+            'status': 'queued',
+            'assistantId': json.get('assistantId'),
+            'phoneNumberId': json.get('phoneNumberId'),
+            'customer': json.get('customer', {}),
+        }
+        timer = threading.Timer(
+            getattr(settings, 'VAPI_FAKE_CALL_DURATION', 1.0),
+            _send_end_of_call_report,
+            args=(dict(call, status='ended'), json)
+        )
+        timer.daemon = True
+        timer.start()
+        return FakeVapiResponse(201, call)
@@ -0,0 +1,52 @@
+"""
+Small JSON state files shared by the worker processes of a host.
+
+The LLM rate limiters and circuit breakers keep their state, and single
+flights their lock files, under LLM_STATE_DIR (default: the system temp
+directory). update_state_file reads,
+changes and writes a file while holding an exclusive fcntl lock, so
+concurrent processes and threads see each other's updates in order.
+"""
+import fcntl
+import json
+import os
+import tempfile
+from typing import Any, Callable
+from django.conf import settings
+
+def get_state_path(name: str) -> str:
+    """Return the path of a state file, creating LLM_STATE_DIR if needed."""
+    directory = getattr(settings, 'LLM_STATE_DIR', '') or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+def update_state_file(path: str, change: Callable[[dict], Any]) -> Any:
+    """Apply change(state) to the state stored at `path` under the file lock and return its result."""
+    with open(path, 'a+', encoding='utf-8') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or '{}')
+            except json.JSONDecodeError:
+                state = {}
+            result = change(state)
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+            return result
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def read_state_file(path: str) -> dict:
+    """Return the state stored at `path` without changing it."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                return json.loads(f.read() or '{}')
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
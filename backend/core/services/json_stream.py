@@ -0,0 +1,158 @@
+"""
+Incremental parsing of the JSON object returned by streaming LLM responses.
+
+The model answers with {"email": "...", "attachment": "..."} one small
+chunk at a time. JsonStringFieldStreamer reads the chunks as they arrive
+and returns the decoded text added to each top-level string field, so the
+email and attachment can be shown while they are still being written.
+Escape sequences split across chunks are held back until complete.
+
+This module does not import Django.
+"""
+from typing import List, Tuple
+
+ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+# Parser states
+_OUTSIDE = 'outside'
+_KEY = 'key'
+_AFTER_KEY = 'after_key'
+_VALUE = 'value'
+_STRING_VALUE = 'string_value'
+_OTHER_VALUE = 'other_value'
+
+class JsonStringFieldStreamer:
+    """
+    Stream the string values of the top-level keys of a JSON object.
+
+    Text before the opening brace (e.g. a Markdown code fence) is skipped.
+    Values that are not strings are ignored; use json.loads on the full text
+    for the final result.
+    """
+
+    def __init__(self):
+        self.state = _OUTSIDE
+        self.depth = 0
+        self.key = []
+        self.field = None
+        self.pending = ''
+        self.in_nested_string = False
+        self.nested_escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """Consume a chunk of the response; return (field, text) pairs of newly decoded text."""
+        deltas = []
+        text = self.pending + chunk
+        self.pending = ''
+        i = 0
+        while i < len(text):
+            char = text[i]
+            if self.state == _OUTSIDE:
+                if char == '{':
+                    self.depth = 1
+                    self.state = _KEY
+                i += 1
+            elif self.state == _KEY:
+                if char == '"' and not self.key:
+                    self.key.append('')
+                elif char == '"':
+                    self.field = ''.join(self.key[1:])
+                    self.key = []
+                    self.state = _AFTER_KEY
+                elif self.key:
+                    self.key.append(char)
+                elif char == '}':
+                    self.state = _OUTSIDE
+                    self.depth = 0
+                i += 1
+            elif self.state == _AFTER_KEY:
+                if char == ':':
+                    self.state = _VALUE
+                i += 1
+            elif self.state == _VALUE:
+                if char == '"':
+                    self.state = _STRING_VALUE
+                elif not char.isspace():
+                    self.state = _OTHER_VALUE
+                    continue
+                i += 1
+            elif self.state == _STRING_VALUE:
+                decoded, consumed, closed = self._decode_string(text, i)
+                if decoded:
+                    deltas.append((self.field, decoded))
+                i += consumed
+                if closed:
+                    self.state = _KEY
+                elif i < len(text):
+                    # An incomplete escape sequence; wait for the next chunk
+                    self.pending = text[i:]
+                    break
+            elif self.state == _OTHER_VALUE:
+                i += self._skip_value(text[i])
+        return _merge(deltas)
+
+    def _decode_string(self, text: str, start: int) -> Tuple[str, int, bool]:
+        """Decode string content from `start`; return (text, characters consumed, whether it closed)."""
+        parts = []
+        i = start
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                return ''.join(parts), i - start + 1, True
+            if char != '\\':
+                parts.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(text):
+                break
+            code = text[i + 1]
+            if code == 'u':
+                if i + 6 > len(text):
+                    break
+                value = int(text[i + 2:i + 6], 16)
+                if 0xD800 <= value < 0xDC00:
+                    # High surrogate; the low surrogate follows as another \\uXXXX escape
+                    if i + 12 > len(text):
+                        break
+                    low = int(text[i + 8:i + 12], 16)
+                    parts.append(chr(0x10000 + ((value - 0xD800) << 10) + (low - 0xDC00)))
+                    i += 12
+                    continue
+                parts.append(chr(value))
+                i += 6
+            else:
+                parts.append(ESCAPES.get(code, code))
+                i += 2
+        return ''.join(parts), i - start, False
+
+    def _skip_value(self, char: str) -> int:
+        """Skip one character of a non-string value, tracking nesting and strings inside it."""
+        if self.in_nested_string:
+            if self.nested_escape:
+                self.nested_escape = False
+            elif char == '\\':
+                self.nested_escape = True
+            elif char == '"':
+                self.in_nested_string = False
+        elif char == '"':
+            self.in_nested_string = True
+        elif char in '[{':
+            self.depth += 1
+        elif char in ']}':
+            self.depth -= 1
+            if self.depth == 0:
+                self.state = _OUTSIDE
+            elif self.depth == 1:
+                self.state = _KEY
+        elif char == ',' and self.depth == 1:
+            self.state = _KEY
+        return 1
+
+def _merge(deltas: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    merged = []
+    for field, text in deltas:
+        if merged and merged[-1][0] == field:
+            merged[-1] = (field, merged[-1][1] + text)
+        else:
+            merged.append((field, text))
+    return merged
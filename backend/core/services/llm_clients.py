@@ -0,0 +1,94 @@
+import os
+import threading
+import httpx
+import openai
+from anthropic import Anthropic
+from django.conf import settings
+from .fake_llm import FakeAnthropicClient, FakeOpenAIClient
+
+# The SDKs must not retry on their own: a retried 429 would bypass the shared rate
+# limits and a retried outage the circuit breaker. RenewalComparator retries instead.
+SDK_MAX_RETRIES = 0
+
+_clients = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+def get_llm_timeout() -> httpx.Timeout:
+    """Return the connect and read timeouts of LLM API requests."""
+    return httpx.Timeout(
+        getattr(settings, 'LLM_READ_TIMEOUT', 120.0),
+        connect=getattr(settings, 'LLM_CONNECT_TIMEOUT', 5.0)
+    )
+
+def _create_http_client() -> httpx.Client:
+    return httpx.Client(
+        timeout=get_llm_timeout(),
+        limits=httpx.Limits(
+            max_connections=getattr(settings, 'LLM_MAX_CONNECTIONS', 20),
+            max_keepalive_connections=getattr(settings, 'LLM_MAX_KEEPALIVE_CONNECTIONS', 10),
+            keepalive_expiry=getattr(settings, 'LLM_KEEPALIVE_EXPIRY', 60.0)
+        )
+    )
+
+def _create_anthropic_client() -> Anthropic:
+    return Anthropic(
+        api_key=os.environ.get("ANTHROPIC_API_KEY"),
+        http_client=_create_http_client(),
+        timeout=get_llm_timeout(),
+        max_retries=SDK_MAX_RETRIES
+    )
+
+def _create_openai_client() -> openai.OpenAI:
+    return openai.OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        http_client=_create_http_client(),
+        timeout=get_llm_timeout(),
+        max_retries=SDK_MAX_RETRIES
+    )
+
+_FACTORIES = {
+    'live': {
+        'anthropic': _create_anthropic_client,
+        'openai': _create_openai_client,
+    },
+    # Local stand-ins for tests and load tests; no network access or API keys needed
+    'fake': {
+        'anthropic': FakeAnthropicClient,
+        'openai': FakeOpenAIClient,
+    },
+}
+
+def get_llm_client(provider: str):
+    """
+    Return the process-wide client of an LLM provider, creating it on first use.
+
+    Clients keep their HTTPS connections alive between requests and are
+    shared by all threads of a process. Connections must not be shared with
+    forked children, so a forked process creates its own clients. The SDKs
+    make a single attempt per call, so a call blocks for at most
+    LLM_CONNECT_TIMEOUT + LLM_READ_TIMEOUT seconds.
+
+    LLM_BACKEND selects the 'live' provider APIs or the local 'fake' clients.
+    """
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # Clients inherited from the parent process are dropped without closing their sockets
+            _clients.clear()
+            _clients_pid = os.getpid()
+        backend = getattr(settings, 'LLM_BACKEND', 'live')
+        client = _clients.get((backend, provider))
+        if client is None:
+            client = _clients[(backend, provider)] = _FACTORIES[backend][provider]()
+        return client
+
+def close_llm_clients() -> None:
+    """Close the clients of this process; the next request creates new ones."""
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid == os.getpid():
+            for client in _clients.values():
+                client.close()
+        _clients.clear()
+        _clients_pid = None
@@ -0,0 +1,160 @@
+"""
+Ledger of LLM provider calls and its aggregation by agency, policy, provider
+or purpose, with estimated costs.
+
+Costs are estimated from list prices in USD per million tokens, matched by
+model name prefix; models of the local fake backend are priced as the model
+they stand in for, so load tests project real costs.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+from django.db import DatabaseError
+from core.models import LLMCall
+
+# USD per million input and output tokens
+MODEL_PRICES = {
+    'claude-3-7-sonnet': (3.0, 15.0),
+    'claude-3-5-sonnet': (3.0, 15.0),
+    'claude-3-5-haiku': (0.8, 4.0),
+    'o3-mini': (1.1, 4.4),
+    'gpt-4o-mini': (0.15, 0.6),
+    'gpt-4o': (2.5, 10.0),
+}
+
+# Price of cached prompt tokens relative to uncached input tokens
+CACHE_READ_PRICE = {
+    'anthropic': 0.1,
+    'openai': 0.5,
+}
+CACHE_WRITE_PRICE = {
+    'anthropic': 1.25,
+    'openai': 1.0,
+}
+
+# Report groupings: the values selected and the label shown for them
+GROUPINGS = {
+    'agency': (('agency_id', 'agency__name'), lambda row: row['agency__name'] or 'No agency'),
+    'policy': (
+        ('policy_id', 'policy__policy_number', 'policy__business__name'),
+        lambda row: (
+            f"Policy {row['policy__policy_number'] or row['policy_id']} - {row['policy__business__name']}"
+            if row['policy_id'] else 'No policy'
+        )
+    ),
+    'provider': (('provider', 'model'), lambda row: f"{row['provider']} {row['model']}"),
+    'purpose': (('purpose',), lambda row: row['purpose']),
+}
+
+def get_model_price(model: str) -> Optional[tuple]:
+    """Return the (input, output) price per million tokens of a model, or None if unknown."""
+    name = model[len('fake-'):] if model.startswith('fake-') else model
+    for prefix in sorted(MODEL_PRICES, key=len, reverse=True):
+        if name.startswith(prefix):
+            return MODEL_PRICES[prefix]
+    return None
+
+def estimate_cost(provider: str, model: str, input_tokens=None, output_tokens=None,
+                  cache_read_tokens=None, cache_write_tokens=None) -> float:
+    """Return the estimated cost of a call in USD; 0 for models without a known price."""
+    price = get_model_price(model)
+    if price is None:
+        return 0.0
+    input_price, output_price = price
+    cache_read_tokens = cache_read_tokens or 0
+    cache_write_tokens = cache_write_tokens or 0
+    uncached_tokens = input_tokens or 0
+    if provider == 'openai':
+        # OpenAI counts cached tokens within the prompt tokens
+        uncached_tokens -= cache_read_tokens
+    prompt_cost = (
+        uncached_tokens
+        + cache_read_tokens * CACHE_READ_PRICE.get(provider, 1.0)
+        + cache_write_tokens * CACHE_WRITE_PRICE.get(provider, 1.0)
+    ) * input_price
+    return (prompt_cost + (output_tokens or 0) * output_price) / 1_000_000
+
+def _percentile(values: List[int], fraction: float) -> Optional[int]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+class LLMUsageLedger:
+    @staticmethod
+    def record(provider: str, model: str, purpose: str, outcome: str, usage: Optional[Dict] = None,
+               agency_id: Optional[int] = None, policy_id: Optional[int] = None,
+               queue_ms: Optional[int] = None, duration_ms: Optional[int] = None) -> None:
+        """Append a provider call to the ledger; a failed write is reported but never raised."""
+        usage = usage or {}
+        try:
+            LLMCall.objects.create(
+                provider=provider,
+                model=model,
+                purpose=purpose,
+                outcome=outcome,
+                agency_id=agency_id,
+                policy_id=policy_id,
+                input_tokens=usage.get('input_tokens'),
+                output_tokens=usage.get('output_tokens'),
+                cache_read_tokens=usage.get('cache_read_tokens'),
+                cache_write_tokens=usage.get('cache_write_tokens'),
+                queue_ms=queue_ms,
+                duration_ms=duration_ms
+            )
+        except DatabaseError as e:
+            print(f"Error recording LLM call: {str(e)}")
+
+    @staticmethod
+    def summarize(calls=None, since: Optional[datetime] = None, group_by: str = 'agency') -> List[Dict]:
+        """
+        Aggregate ledger entries by agency, policy, provider or purpose.
+
+        Returns one dict per group, most expensive first, with the number of
+        calls and failures, token totals, the estimated cost and the median and
+        95th percentile request durations in milliseconds.
+        """
+        if calls is None:
+            calls = LLMCall.objects.all()
+        if since is not None:
+            calls = calls.filter(created_at__gte=since)
+        keys, label = GROUPINGS[group_by]
+
+        groups = {}
+        fields = set(keys) | {
+            'provider', 'model', 'outcome', 'input_tokens', 'output_tokens',
+            'cache_read_tokens', 'cache_write_tokens', 'duration_ms'
+        }
+        for row in calls.order_by().values(*fields).iterator():
+            key = tuple(row[k] for k in keys)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'label': label(row),
+                    'calls': 0,
+                    'failures': 0,
+                    'input_tokens': 0,
+                    'output_tokens': 0,
+                    'cache_read_tokens': 0,
+                    'cache_write_tokens': 0,
+                    'cost': 0.0,
+                    'durations': [],
+                }
+            group['calls'] += 1
+            if row['outcome'] != LLMCall.SUCCEEDED:
+                group['failures'] += 1
+            for field in ('input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens'):
+                group[field] += row[field] or 0
+            group['cost'] += estimate_cost(
+                row['provider'], row['model'], row['input_tokens'], row['output_tokens'],
+                row['cache_read_tokens'], row['cache_write_tokens']
+            )
+            if row['duration_ms'] is not None:
+                group['durations'].append(row['duration_ms'])
+
+        report = []
+        for group in groups.values():
+            durations = group.pop('durations')
+            group['median_ms'] = _percentile(durations, 0.5)
+            group['p95_ms'] = _percentile(durations, 0.95)
+            report.append(group)
+        return sorted(report, key=lambda group: group['cost'], reverse=True)
@@ -0,0 +1,103 @@
+"""
+Choice of the provider and model of a renewal comparison.
+
+Every provider offers a small, fast model and a large one. A policy with a
+few short documents, such as a single quote against the expiring policy, is
+compared with the small model; many documents or a large estimated input go
+to the large model. Agencies choose their default provider and can pin the
+model size or raise the small model's token limit.
+
+The decision is returned with the figures it was made from and stored on the
+comparison, so thresholds can be tuned against the usage ledger later.
+"""
+from typing import Dict, List, Optional
+from django.conf import settings
+from core.models import Agency
+from .llm_usage import estimate_cost
+from .token_estimator import estimate_pages_tokens
+
+SMALL = Agency.AI_MODEL_SMALL
+LARGE = Agency.AI_MODEL_LARGE
+
+MODEL_TIERS = {
+    'anthropic': {
+        SMALL: 'claude-3-5-haiku-latest',
+        LARGE: 'claude-3-7-sonnet-latest',
+    },
+    'openai': {
+        SMALL: 'gpt-4o-mini-2024-07-18',
+        LARGE: 'o3-mini-2025-01-31',
+    },
+}
+
+DEFAULT_PROVIDER = 'anthropic'
+
+# Output tokens of a typical comparison, used to estimate its cost
+EXPECTED_OUTPUT_TOKENS = 2500
+
+def get_policy_agency(policy) -> Agency:
+    return policy.business.customer.agency
+
+class ModelRouter:
+    @staticmethod
+    def get_models(provider: str) -> Dict[str, str]:
+        """Return the provider's models by tier; the local fake backend's are kept apart from real ones."""
+        models = MODEL_TIERS[provider]
+        if getattr(settings, 'LLM_BACKEND', 'live') == 'fake':
+            return {tier: f"fake-{model}" for tier, model in models.items()}
+        return dict(models)
+
+    @staticmethod
+    def get_default_provider(agency: Optional[Agency]) -> str:
+        """Return the provider of an agency's comparisons when a request does not name one."""
+        return agency.ai_provider if agency is not None else DEFAULT_PROVIDER
+
+    @staticmethod
+    def get_settings(agency: Optional[Agency]) -> Dict:
+        """Return the routing settings applying to an agency's comparisons."""
+        return {
+            "enabled": getattr(settings, 'LLM_ROUTING_ENABLED', True),
+            "tier": agency.ai_model_tier if agency is not None else Agency.AI_MODEL_AUTO,
+            "small_max_tokens": (
+                agency.ai_small_model_max_tokens if agency is not None and agency.ai_small_model_max_tokens
+                else getattr(settings, 'LLM_SMALL_MODEL_MAX_TOKENS', 12000)
+            ),
+            "small_max_documents": getattr(settings, 'LLM_SMALL_MODEL_MAX_DOCUMENTS', 2),
+        }
+
+    @staticmethod
+    def route(provider: str, documents: List[Dict], routing_settings: Dict) -> Dict:
+        """
+        Choose the model comparing the documents (dicts with their "pages").
+
+        Returns the decision: the tier and model, the reason, the estimated
+        input tokens and document count it was based on, the limits applied,
+        and the estimated cost with the chosen and with the large model.
+        """
+        tokens = sum(estimate_pages_tokens(doc["pages"], provider) for doc in documents)
+        max_tokens = routing_settings["small_max_tokens"]
+        max_documents = routing_settings["small_max_documents"]
+
+        if not routing_settings["enabled"]:
+            tier, reason = LARGE, "routing disabled"
+        elif routing_settings["tier"] != Agency.AI_MODEL_AUTO:
+            tier, reason = routing_settings["tier"], "agency setting"
+        elif len(documents) > max_documents:
+            tier, reason = LARGE, f"more than {max_documents} documents"
+        elif tokens > max_tokens:
+            tier, reason = LARGE, f"more than {max_tokens} estimated tokens"
+        else:
+            tier, reason = SMALL, "small input"
+
+        models = ModelRouter.get_models(provider)
+        return {
+            "tier": tier,
+            "model": models[tier],
+            "reason": reason,
+            "estimated_tokens": tokens,
+            "documents": len(documents),
+            "small_max_tokens": max_tokens,
+            "small_max_documents": max_documents,
+            "estimated_cost": round(estimate_cost(provider, models[tier], tokens, EXPECTED_OUTPUT_TOKENS), 6),
+            "large_model_cost": round(estimate_cost(provider, models[LARGE], tokens, EXPECTED_OUTPUT_TOKENS), 6),
+        }
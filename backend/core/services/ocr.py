@@ -0,0 +1,58 @@
+"""
+OCR helpers that run inside extraction worker processes.
+
+Pages are rasterized with pdftoppm (poppler-utils) and recognized with the
+Tesseract command line tool, so no Python imaging libraries are needed.
+Like pdf_text, this module must not import Django.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import NamedTuple
+
+class OcrOptions(NamedTuple):
+    tesseract_cmd: str = 'tesseract'
+    pdftoppm_cmd: str = 'pdftoppm'
+    language: str = 'eng'
+    dpi: int = 300
+    timeout: float = 60
+
+def is_ocr_available(options: OcrOptions, pdf: bool = True) -> bool:
+    """
+    Return whether the command line tools OCRing PDFs, or with `pdf` False
+    image files, can be found. Only PDFs need pdftoppm to be rasterized.
+    """
+    if not shutil.which(options.tesseract_cmd):
+        return False
+    return not pdf or bool(shutil.which(options.pdftoppm_cmd))
+
+def ocr_image(image_path: str, options: OcrOptions) -> str:
+    """Return the text Tesseract recognizes in an image file."""
+    result = subprocess.run(
+        [options.tesseract_cmd, image_path, 'stdout', '-l', options.language],
+        capture_output=True,
+        check=True,
+        timeout=options.timeout,
+        # Each worker process OCRs one page; stop Tesseract from also spawning
+        # a thread per core, which oversubscribes the CPU
+        env={**os.environ, 'OMP_THREAD_LIMIT': '1'}
+    )
+    return result.stdout.decode('utf-8', errors='replace')
+
+def ocr_pdf_page(file_path: str, page_index: int, options: OcrOptions) -> str:
+    """Rasterize one page (0-based) of a PDF and return its OCR text."""
+    page_number = str(page_index + 1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_prefix = os.path.join(tmp_dir, 'page')
+        subprocess.run(
+            [
+                options.pdftoppm_cmd, '-f', page_number, '-l', page_number,
+                '-r', str(options.dpi), '-gray', '-png', '-singlefile',
+                file_path, image_prefix
+            ],
+            capture_output=True,
+            check=True,
+            timeout=options.timeout
+        )
+        return ocr_image(f"{image_prefix}.png", options)
@@ -0,0 +1,67 @@
+"""
+MinHash fingerprints of page text for near-duplicate detection.
+
+Pages are reduced to sets of word shingles and summarized with one
+permutation MinHash: every shingle is hashed once, the hash picks one of
+SIGNATURE_SIZE bins and each bin keeps its smallest value. The signature is
+then cut into LSH bands, each hashed to a short key, so two pages that share
+a band key very likely have a high Jaccard similarity.
+
+This module does not import Django.
+"""
+import hashlib
+import re
+from typing import List
+
+SHINGLE_WORDS = 4
+SIGNATURE_SIZE = 64
+BAND_ROWS = 4
+BAND_COUNT = SIGNATURE_SIZE // BAND_ROWS
+
+# Value of bins no shingle hashed into; short pages leave some bins empty
+EMPTY_BIN = (1 << 58) - 1
+
+WORD_PATTERN = re.compile(r'\w+')
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def shingles(text: str) -> set:
+    """Return the set of SHINGLE_WORDS-word shingles of a text, ignoring case and punctuation."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def minhash_signature(text: str) -> List[int]:
+    """Return the one permutation MinHash signature of a text, or [] if it has no words."""
+    page_shingles = shingles(text)
+    if not page_shingles:
+        return []
+    signature = [EMPTY_BIN] * SIGNATURE_SIZE
+    for shingle in page_shingles:
+        value = _hash(shingle)
+        index = value % SIGNATURE_SIZE
+        value //= SIGNATURE_SIZE
+        if value < signature[index]:
+            signature[index] = value
+    return signature
+
+def band_keys(signature: List[int]) -> List[str]:
+    """
+    Cut a signature into LSH bands and return a 16 hex digit key per band.
+
+    Bands with an empty bin are skipped, otherwise short pages would match
+    each other on their empty bins alone.
+    """
+    keys = []
+    for band in range(BAND_COUNT if signature else 0):
+        rows = signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+        if EMPTY_BIN in rows:
+            continue
+        keys.append(f"{_hash(f'{band}:' + ','.join(map(str, rows))):016x}")
+    return keys
+
+def fingerprint(text: str) -> str:
+    """Return the band keys of a text as a space separated string, empty if it has no words."""
+    return ' '.join(band_keys(minhash_signature(text)))
@@ -0,0 +1,43 @@
+"""
+PDF text extraction helpers that run inside extraction worker processes.
+
+This module must not import Django so that it can be loaded by freshly
+spawned worker processes without configuring settings.
+"""
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+import PyPDF2
+from .table_extractor import extract_page_tables
+
+class PageText(NamedTuple):
+    """The text of one page, plus a rendering with tables laid out if any were found."""
+    text: str
+    table_text: Optional[str] = None
+    is_ocr: bool = False
+
+def get_page_count(file_path: str) -> int:
+    """Return the number of pages in a PDF file."""
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def extract_page_range(file_path: str, start: int, stop: int, table_format: Optional[str] = None) -> List[PageText]:
+    """
+    Extract the text of pages [start, stop) of a PDF file.
+
+    When `table_format` is given, tables found on a page are reconstructed
+    from the text positions and rendered in that format.
+    """
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        pages = []
+        for index in range(start, stop):
+            page = pdf_reader.pages[index]
+            if table_format:
+                pages.append(PageText(*extract_page_tables(page, table_format)))
+            else:
+                pages.append(PageText(page.extract_text() or ''))
+        return pages
+
+def iter_page_ranges(page_count: int, pages_per_range: int) -> Iterator[Tuple[int, int]]:
+    """Split a page count into consecutive [start, stop) ranges."""
+    for start in range(0, page_count, pages_per_range):
+        yield start, min(start + pages_per_range, page_count)
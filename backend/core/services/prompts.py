@@ -2,21 +2,17 @@
 Utility file containing prompts for AI services
 """
 
-def get_renewal_comparison_system_prompt(context_details):
-    # Get values with defaults if keys are missing
-    business_name = context_details.get('business_name')
-    client_name = context_details.get('client_name')
-    insurance_agency_name = context_details.get('insurance_agency_name')
-    insurance_agent_name = context_details.get('insurance_agent_name')
-    
-    prompt = """
-        You are an insurance agent specializing in commercial policies. I will provide you with details of a client's current policy along with one or more renewal options (these may be uploaded as documents). 
+# Bump when the renewal comparison prompts change, so stored comparisons are regenerated
+RENEWAL_COMPARISON_PROMPT_VERSION = '4'
 
-        Here are details about the client and the insurance agency:
-            - Client Name: {client_name}
-            - Business Name: {business_name}
-            - Insurance Agency Name: {insurance_agency_name}
-            - Insurance Agent Name: {insurance_agent_name}
+# Bump when the document summary prompts change, so stored summaries are rewritten
+DOCUMENT_SUMMARY_PROMPT_VERSION = '1'
+
+# Instructions shared by every renewal comparison. They contain no per-request
+# values so providers can cache them as a prompt prefix; the client and agency
+# details follow in get_renewal_comparison_context_prompt.
+RENEWAL_COMPARISON_INSTRUCTIONS = """
+        You are an insurance agent specializing in commercial policies. I will provide you with details of a client's current policy along with one or more renewal options (these may be uploaded as documents). The details about the client and the insurance agency are given at the end of these instructions.
 
         Your task is to generate two outputs:
 
@@ -66,10 +62,10 @@ def get_renewal_comparison_system_prompt(context_details):
             - A section titled **Assumptions** that lists numerical assumptions used (e.g., annual gross sales assumed to be ~$375,000; BPP valuation ~$125,000, with an increase proposed to ~$137,500; etc.).
 
         Your response MUST be a valid JSON object with the following format:
-        {{
+        {
             "email": "The complete email content here",
             "attachment": "The complete markdown content for the PDF here"
-        }}
+        }
 
         Do not include any text outside of this JSON structure. The JSON must be properly formatted with escaped quotes and newlines where necessary.
 
@@ -81,7 +77,7 @@ def get_renewal_comparison_system_prompt(context_details):
 
         **Example Email:**
 
-        Dear {client_name},
+        Dear [Client Name],
 
         I hope you're doing well. Please find attached a PDF that provides a detailed, side‐by‐side comparison of your current policy and the renewal options we're considering. Here's a brief summary overview:
 
@@ -130,8 +126,8 @@ def get_renewal_comparison_system_prompt(context_details):
         Your feedback will help us finalize the best option for you. Please let me know if you have any questions.
 
         Best regards,
-        {insurance_agent_name}
-        {insurance_agency_name}
+        [Insurance Agent Name]
+        [Insurance Agency Name]
 
         ---
 
@@ -174,23 +170,75 @@ def get_renewal_comparison_system_prompt(context_details):
         6. Employment Practices Liability (EPL) terms vary between policies, with current/Hartford having no deductible and broader historical coverage, compared to Chubb's $1,000 deductible and a later retroactive date.
         ```
         """
-    
-    # Format the prompt with the values
-    formatted_prompt = prompt.format(
-        client_name=client_name,
-        business_name=business_name,
-        insurance_agency_name=insurance_agency_name,
-        insurance_agent_name=insurance_agent_name
-    )
-    
-    return formatted_prompt
 
-def get_renewal_comparison_user_prompt(document_contents):
-    prompt = """
+def get_renewal_comparison_context_prompt(context_details):
+    # Get values with defaults if keys are missing
+    business_name = context_details.get('business_name')
+    client_name = context_details.get('client_name')
+    insurance_agency_name = context_details.get('insurance_agency_name')
+    insurance_agent_name = context_details.get('insurance_agent_name')
+
+    return f"""
+        Here are details about the client and the insurance agency. Address the email to the client and sign it with the agent and agency names:
+            - Client Name: {client_name}
+            - Business Name: {business_name}
+            - Insurance Agency Name: {insurance_agency_name}
+            - Insurance Agent Name: {insurance_agent_name}
+        """
+
+def get_renewal_comparison_user_prompt(document_contents, change_sets=None, summarized=False):
+    if summarized:
+        parts = ["""
+    I'm providing you with coverage summaries of insurance policy documents, each extracted from one document. Please review them and generate the email and PDF content as instructed.
+    """]
+    else:
+        parts = ["""
     I'm providing you with insurance policy documents for analysis. Please review them and generate the email and PDF content as instructed.
-    """
+    """]
     
     for i, doc in enumerate(document_contents):
-        prompt += f"\nDocument {i+1}: {doc['name']}\n{doc['content']}\n"
+        parts.append(f"\nDocument {i+1}: {doc['name']}\n{doc['content']}\n")
+
+    if change_sets:
+        parts.append("""
+    The following clause-level changes were computed locally against the expiring policy. Use them to check that every changed limit, deductible, premium and date is covered, and verify them against the documents where provided.
+    """)
+        for change_set in change_sets:
+            parts.append(f"\n{change_set}")
     
-    return prompt
+    return "".join(parts)
+
+def get_document_summary_system_prompt():
+    return """
+        You are an insurance agent specializing in commercial policies. You will be given one insurance document: a current policy, a renewal, or a quote from another carrier.
+
+        Summarize its coverage so that it can later be compared with other documents without the original. Include:
+            - Carrier, named insured, policy number and policy period
+            - Every coverage with its limits, sublimits, deductibles and waiting periods, exactly as stated
+            - Premiums per coverage, taxes, fees and the total premium
+            - Retroactive dates, valuations (e.g. replacement cost), coinsurance and notable endorsements or exclusions
+            - Page numbers for the key figures when the document marks them (e.g. "[Page 3]")
+
+        Copy numbers and dates verbatim. Do not infer values that are not stated. Respond with a compact plain text list, without an introduction.
+    """
+
+def get_document_summary_user_prompt(document_name, document_content):
+    return f"""
+    Document: {document_name}
+    {document_content}
+    """
+
+def get_response_repair_system_prompt():
+    return """
+        You fix responses that were meant to be a JSON object with exactly two string fields: "email", the complete email to the client, and "attachment", the complete Markdown content of the attached comparison.
+
+        You will be given such a response and the reason it could not be read. Return the corrected JSON object only. Keep the wording of the email and the attachment unchanged; do not shorten, summarize or add content.
+    """
+
+def get_response_repair_user_prompt(response_text, error):
+    return f"""
+    The response could not be read: {error}
+
+    Response:
+    {response_text}
+    """
@@ -0,0 +1,195 @@
+"""
+Rate limiting of LLM provider requests shared by all worker processes.
+
+Every process of a host reads and updates the same state file per provider
+under LLM_STATE_DIR, holding an exclusive fcntl lock while it does. The
+state holds two token buckets, refilled continuously:
+
+- requests: <PROVIDER>_REQUESTS_PER_MINUTE requests
+- tokens: <PROVIDER>_TOKENS_PER_MINUTE input and output tokens
+
+It also holds the leases of requests in flight, capped at
+LLM_MAX_CONCURRENT_REQUESTS per provider, and a queue of waiting requests.
+When capacity frees up, the waiting request of the agency served least
+recently goes first, so one agency's bulk run cannot starve the others.
+Requests of the same agency are served in arrival order.
+
+A request is charged its estimated input tokens up front. The difference to
+the tokens actually used is settled when it finishes. A 429 response empties
+both buckets, so every worker backs off instead of retrying into the limit.
+Leases and queue entries of processes that died are dropped.
+
+Set LLM_RATE_LIMIT_ENABLED = False to send requests without limits, e.g. when
+a single process runs.
+"""
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+from django.conf import settings
+from .file_state import get_state_path, update_state_file
+
+# Seconds between checks of a waiting request
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+
+class LLMRateLimitTimeout(Exception):
+    pass
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class LLMRateLimiter:
+    """Token buckets, concurrency cap and fair queue of one provider."""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.enabled = getattr(settings, 'LLM_RATE_LIMIT_ENABLED', True)
+        prefix = provider.upper()
+        self.requests_per_minute = getattr(settings, f'{prefix}_REQUESTS_PER_MINUTE', 50)
+        self.tokens_per_minute = getattr(settings, f'{prefix}_TOKENS_PER_MINUTE', 100000)
+        self.max_concurrent = getattr(settings, 'LLM_MAX_CONCURRENT_REQUESTS', 8)
+        self.timeout = getattr(settings, 'LLM_RATE_LIMIT_TIMEOUT', 300.0)
+        self.path = get_state_path(f'llm-rate-limit-{provider}.json')
+
+    @contextmanager
+    def acquire(self, agency_id: Optional[int] = None, tokens: int = 0):
+        """
+        Wait for the agency's turn and capacity for a request of `tokens`
+        estimated tokens, then hold a concurrency slot until the block exits.
+
+        Yields a Lease; call lease.settle(usage) once the token usage is
+        known. Raises LLMRateLimitTimeout after LLM_RATE_LIMIT_TIMEOUT seconds.
+        """
+        if not self.enabled:
+            yield Lease(self, None, tokens)
+            return
+
+        lease = Lease(self, self._wait_for_turn(agency_id, tokens), tokens)
+        try:
+            yield lease
+        except Exception as e:
+            if getattr(e, 'status_code', None) == 429:
+                self._update(lambda state, now: self._throttle(state))
+            raise
+        finally:
+            self._update(lambda state, now: self._release(state, lease))
+
+    def _wait_for_turn(self, agency_id, tokens):
+        ticket = uuid.uuid4().hex
+        agency = str(agency_id) if agency_id is not None else ''
+        deadline = time.monotonic() + self.timeout
+        # Requests larger than a full bucket are let through when the bucket is full
+        tokens = min(tokens, self.tokens_per_minute)
+
+        def try_acquire(state, now):
+            state['waiting'].setdefault(ticket, [agency, now, os.getpid()])
+            if self._next_ticket(state) != ticket:
+                return None
+            if len(state['in_flight']) >= self.max_concurrent:
+                return None
+            wait = max(
+                (1 - state['requests']) * 60 / self.requests_per_minute,
+                (tokens - state['tokens']) * 60 / self.tokens_per_minute,
+                0
+            )
+            if wait > 0:
+                return wait
+            state['requests'] -= 1
+            state['tokens'] -= tokens
+            del state['waiting'][ticket]
+            state['served'][agency] = now
+            state['in_flight'][ticket] = [os.getpid(), now + self.timeout]
+            return 0
+
+        while True:
+            wait = self._update(try_acquire)
+            if wait == 0:
+                return ticket
+            if time.monotonic() >= deadline:
+                self._update(lambda state, now: state['waiting'].pop(ticket, None))
+                raise LLMRateLimitTimeout(f"Timed out waiting for {self.provider} rate limit capacity")
+            time.sleep(min(max(wait or POLL_INTERVAL, POLL_INTERVAL), MAX_POLL_INTERVAL))
+
+    @staticmethod
+    def _next_ticket(state):
+        """Return the waiting ticket of the least recently served agency, oldest first."""
+        if not state['waiting']:
+            return None
+        return min(
+            state['waiting'],
+            key=lambda ticket: (
+                state['served'].get(state['waiting'][ticket][0], 0),
+                state['waiting'][ticket][1]
+            )
+        )
+
+    def _release(self, state, lease):
+        state['in_flight'].pop(lease.ticket, None)
+        if lease.actual_tokens is not None:
+            state['tokens'] -= lease.actual_tokens - min(lease.tokens, self.tokens_per_minute)
+
+    @staticmethod
+    def _throttle(state):
+        state['requests'] = min(state['requests'], 0)
+        state['tokens'] = min(state['tokens'], 0)
+
+    def _update(self, change):
+        """Apply change(state, now) to the refilled state under the file lock and return its result."""
+        def apply(state):
+            now = time.time()
+            self._refill(state, now)
+            return change(state, now)
+        return update_state_file(self.path, apply)
+
+    def _refill(self, state, now):
+        elapsed = max(now - state.get('updated', now), 0)
+        state['requests'] = min(
+            state.get('requests', self.requests_per_minute) + elapsed * self.requests_per_minute / 60,
+            self.requests_per_minute
+        )
+        state['tokens'] = min(
+            state.get('tokens', self.tokens_per_minute) + elapsed * self.tokens_per_minute / 60,
+            self.tokens_per_minute
+        )
+        state['updated'] = now
+        state['in_flight'] = {
+            ticket: lease for ticket, lease in state.get('in_flight', {}).items()
+            if lease[1] > now and _is_alive(lease[0])
+        }
+        state['waiting'] = {
+            ticket: entry for ticket, entry in state.get('waiting', {}).items()
+            if entry[1] > now - self.timeout and _is_alive(entry[2])
+        }
+        # Agencies served longer ago than any waiting request are as good as never served
+        oldest = min((entry[1] for entry in state['waiting'].values()), default=now)
+        state['served'] = {
+            agency: served for agency, served in state.get('served', {}).items()
+            if served >= oldest
+        }
+
+class Lease:
+    """A granted request slot; settle it with the tokens the request actually used."""
+
+    def __init__(self, limiter: LLMRateLimiter, ticket: str, tokens: int):
+        self.limiter = limiter
+        self.ticket = ticket
+        self.tokens = tokens
+        self.usage = None
+        self.actual_tokens = None
+
+    def settle(self, usage: dict) -> None:
+        """Record the token usage of the request, as returned by RenewalComparator._*_usage."""
+        self.usage = usage
+        # Cache reads do not count towards the providers' input token limits
+        self.actual_tokens = sum(
+            usage.get(key) or 0
+            for key in ('input_tokens', 'output_tokens', 'cache_write_tokens')
+        )
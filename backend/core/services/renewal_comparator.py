@@ -1,15 +1,58 @@
-import os
 import json
-from typing import Dict, Any, List, Tuple
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Dict, Any, List, NamedTuple, Tuple
 from django.conf import settings
-from anthropic import Anthropic
-import openai
+from django.db import connection
 from django.db.models import Q
-from core.models import Business, Customer, Agency, AgencyUser
+from django.utils import timezone
+from core.models import Business, Customer, Agency, AgencyUser, RenewalComparison, DocumentSummary, LLMCall
 from django.contrib.auth.models import User
-from .prompts import get_renewal_comparison_system_prompt, get_renewal_comparison_user_prompt
-import PyPDF2
-import re
+from .prompts import (
+    DOCUMENT_SUMMARY_PROMPT_VERSION,
+    RENEWAL_COMPARISON_PROMPT_VERSION,
+    get_document_summary_system_prompt,
+    get_document_summary_user_prompt,
+    RENEWAL_COMPARISON_INSTRUCTIONS,
+    get_renewal_comparison_context_prompt,
+    get_renewal_comparison_user_prompt,
+    get_response_repair_system_prompt,
+    get_response_repair_user_prompt,
+)
+from .text_extraction import DocumentTextCache, TextExtractionError
+from .chunk_retrieval import select_document_contents
+from .llm_clients import get_llm_client
+from .clause_diff import diff_documents, format_change_set, pick_baseline
+from .token_estimator import estimate_pages_tokens, estimate_tokens
+from .rate_limiter import LLMRateLimiter, LLMRateLimitTimeout
+from .llm_usage import LLMUsageLedger
+from .model_router import LARGE, MODEL_TIERS, ModelRouter, get_policy_agency
+from .single_flight import SingleFlight
+from .circuit_breaker import CircuitBreaker, CircuitOpenError, is_provider_failure
+from .json_stream import JsonStringFieldStreamer
+from .structured_output import (
+    RENEWAL_COMPARISON_SCHEMA,
+    RENEWAL_COMPARISON_TOOL,
+    StructuredOutputError,
+    parse_renewal_comparison,
+)
+
+class RenewalComparisonError(Exception):
+    pass
+
+class ProviderUnavailableError(RenewalComparisonError):
+    """The provider failed or its circuit is open; another provider may still succeed."""
+
+class ComparisonResult(NamedTuple):
+    comparison: RenewalComparison
+    # Whether the comparison was generated for this request rather than found stored
+    created: bool
+    # Whether no provider was available and the last comparison of the policy was served instead,
+    # possibly of documents that have changed since
+    stale: bool = False
 
 class RenewalComparator:
     def __init__(self, policy, provider="anthropic"):
@@ -26,6 +69,17 @@ class RenewalComparator:
         # Validate provider
         if self.provider not in ["anthropic", "openai"]:
             raise ValueError("Provider must be either 'anthropic' or 'openai'")
+
+        # The large model serves until the documents are extracted and routed (see ModelRouter)
+        self.agency = get_policy_agency(policy) if policy is not None else None
+        self.model = ModelRouter.get_models(self.provider)[LARGE]
+        self.routing = {}
+
+        # Token usage of all provider calls of the last comparison, and the
+        # duration of its final comparison call
+        self.usage = self._empty_usage()
+        self.duration_ms = None
+        self._usage_lock = threading.Lock()
         
     def _get_policy_context_details(self):
         # Extract policy details for context using Django ORM
@@ -66,144 +120,806 @@ class RenewalComparator:
 
         return context_details
 
+    def get_input_hashes(self):
+        """
+        Return the sorted content hashes of the policy documents and a hash of
+        every input that determines the comparison: those documents, the
+        provider, its models and the routing settings choosing between them,
+        the prompt version and the prompt settings.
+        """
+        document_hashes = []
+        for doc in self.policy.documents.all():
+            try:
+                document_hashes.append(DocumentTextCache.get_content_hash(doc))
+            except OSError as e:
+                raise RenewalComparisonError(f"Could not read document {doc.name}: {str(e)}") from e
+        document_hashes.sort()
+
+        inputs = {
+            "documents": document_hashes,
+            "provider": self.provider,
+            "models": ModelRouter.get_models(self.provider),
+            "routing": ModelRouter.get_settings(self.agency),
+            "prompt_version": RENEWAL_COMPARISON_PROMPT_VERSION,
+            "prompt_mode": getattr(settings, 'RENEWAL_PROMPT_MODE', 'both'),
+            "prompt_max_chars": getattr(settings, 'RENEWAL_PROMPT_MAX_CHARS', 120000),
+            "change_set_max_chars": getattr(settings, 'RENEWAL_CHANGE_SET_MAX_CHARS', 20000),
+            "skip_boilerplate": getattr(settings, 'BOILERPLATE_FILTER_ENABLED', True),
+            "map_reduce": self._get_map_reduce_settings(),
+        }
+        input_hash = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+        return document_hashes, input_hash
+
+    def get_comparison(self, refresh=False, created_by=None):
+        """
+        Return the stored comparison for the current inputs, generating and
+        storing a new one if there is none or `refresh` is set.
+
+        If the provider is unavailable, the comparison is generated with the
+        other provider (LLM_FAILOVER_ENABLED), or with both at once if the
+        provider has not answered within LLM_HEDGE_AFTER seconds. If neither
+        provider is available, the last stored comparison of the policy is
+        returned, even if its documents have changed since.
+
+        Identical requests in flight at the same time, in any process, wait
+        for the first one and return the comparison it stored.
+
+        Returns a ComparisonResult, with `stale` set if the last stored
+        comparison was served, and raises RenewalComparisonError if the
+        comparison could not be generated.
+        """
+        document_hashes, input_hash = self.get_input_hashes()
+        if not refresh:
+            comparison = self._find_comparison(input_hash)
+            if comparison is not None:
+                return ComparisonResult(comparison, created=False)
+
+        fallback = self._get_fallback()
+        if fallback is not None and not refresh and not CircuitBreaker(self.provider).is_available():
+            comparison = fallback.get_stored_comparison()
+            if comparison is not None:
+                return ComparisonResult(comparison, created=False)
+
+        started = timezone.now()
+
+        def find_generated():
+            comparison = self._find_comparison(input_hash, created_since=started)
+            return ComparisonResult(comparison, created=False) if comparison is not None else None
+
+        return self._single_flight(input_hash).run(
+            lambda: self._generate_and_store(fallback, document_hashes, input_hash, created_by),
+            find_generated
+        )
+
+    def _generate_and_store(self, fallback, document_hashes, input_hash, created_by):
+        try:
+            comparator, result = self._generate_with_failover(fallback)
+        except ProviderUnavailableError as e:
+            return ComparisonResult(self._get_last_comparison(e), created=False, stale=True)
+
+        if comparator is not self:
+            document_hashes, input_hash = comparator.get_input_hashes()
+        return ComparisonResult(comparator._store_comparison(result, document_hashes, input_hash, created_by), created=True)
+
+    def _get_last_comparison(self, error):
+        """Return the last stored comparison of the policy while no provider is available, or raise `error`."""
+        comparison = self.policy.renewal_comparisons.first()
+        if comparison is None:
+            raise error
+        print(f"No provider available; serving renewal comparison {comparison.id} of policy {self.policy.id}")
+        return comparison
+
+    def get_stored_comparison(self):
+        """Return the stored comparison for the current inputs, or None."""
+        _, input_hash = self.get_input_hashes()
+        return self._find_comparison(input_hash)
+
+    def _find_comparison(self, input_hash, created_since=None):
+        comparisons = self.policy.renewal_comparisons.filter(input_hash=input_hash)
+        if created_since is not None:
+            comparisons = comparisons.filter(created_at__gte=created_since)
+        return comparisons.first()
+
+    def _single_flight(self, input_hash):
+        """Return the single flight of comparisons of this policy with these documents, provider and settings."""
+        return SingleFlight(f"renewal-comparison:{self.policy.id}:{input_hash}")
+
+    def stream_comparison(self, refresh=False, created_by=None):
+        """
+        Streaming counterpart of get_comparison.
+
+        Yields ("delta", {"field": ..., "text": ...}) events while the email
+        and attachment are generated, or once per field for a stored
+        comparison, then ("comparison", ComparisonResult). Fails over to the
+        other provider only before any text has been streamed; requests are
+        not hedged. An identical request in flight is waited for and its
+        comparison sent as stored. Raises RenewalComparisonError if the
+        comparison could not be generated.
+        """
+        fallback = self._get_fallback()
+        comparators = [self] if fallback is None else [self, fallback]
+        error = None
+        for comparator in comparators:
+            document_hashes, input_hash = comparator.get_input_hashes()
+            if not refresh:
+                # The fallback's stored comparison is only served while this provider is unavailable
+                comparison = comparator._find_comparison(input_hash)
+                if comparison is not None:
+                    yield from self._stream_stored(comparison)
+                    return
+
+            if not CircuitBreaker(comparator.provider).is_available():
+                error = ProviderUnavailableError(f"{comparator.provider} is unavailable after repeated failures")
+                continue
+
+            started = timezone.now()
+            with comparator._single_flight(input_hash).hold() as waited:
+                comparison = comparator._find_comparison(input_hash, created_since=started) if waited else None
+                if comparison is not None:
+                    yield from self._stream_stored(comparison)
+                    return
+
+                streamed = False
+                try:
+                    for event, data in comparator.stream_compare():
+                        if event == "delta":
+                            streamed = True
+                            yield event, data
+                        else:
+                            result = data
+                except ProviderUnavailableError as e:
+                    if streamed:
+                        raise
+                    print(f"Failing over from {comparator.provider}: {str(e)}")
+                    error = e
+                    continue
+                except RenewalComparisonError:
+                    raise
+                except Exception as e:
+                    print(f"Error in stream_comparison method: {str(e)}")
+                    raise RenewalComparisonError(f"Failed to generate comparison: {str(e)}") from e
+
+                comparison = comparator._store_comparison(result, document_hashes, input_hash, created_by)
+                yield "comparison", ComparisonResult(comparison, created=True)
+                return
+
+        yield from self._stream_stored(self._get_last_comparison(error), stale=True)
+
+    @staticmethod
+    def _stream_stored(comparison, stale=False):
+        yield "delta", {"field": "email", "text": comparison.email}
+        yield "delta", {"field": "attachment", "text": comparison.attachment}
+        yield "comparison", ComparisonResult(comparison, created=False, stale=stale)
+
+    def _get_fallback(self):
+        """Return a comparator of the other provider, or None if failover is disabled."""
+        if not getattr(settings, 'LLM_FAILOVER_ENABLED', True):
+            return None
+        provider = next(provider for provider in MODEL_TIERS if provider != self.provider)
+        return RenewalComparator(self.policy, provider)
+
+    def _generate_with_failover(self, fallback):
+        """
+        Generate the comparison with this provider, then the fallback while
+        providers are unavailable. Returns (comparator, result) of the provider
+        that succeeded; raises ProviderUnavailableError if none did.
+        """
+        comparators = [self] if fallback is None else [self, fallback]
+        available = [c for c in comparators if CircuitBreaker(c.provider).is_available()]
+        if not available:
+            raise ProviderUnavailableError("No AI provider is available; please try again later")
+
+        hedge_after = getattr(settings, 'LLM_HEDGE_AFTER', 0)
+        if hedge_after and len(available) == 2:
+            return self._generate_hedged(fallback, hedge_after)
+
+        error = None
+        for comparator in available:
+            try:
+                return comparator, comparator._generate()
+            except ProviderUnavailableError as e:
+                print(f"Failing over from {comparator.provider}: {str(e)}")
+                error = e
+        raise error
+
+    def _generate_hedged(self, fallback, hedge_after):
+        """
+        Start the fallback provider as well if this one has not answered
+        within `hedge_after` seconds, or has failed; the first result wins.
+        The slower request runs to completion in the background.
+        """
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='llm-hedge')
+        try:
+            futures = {executor.submit(self._generate_in_thread): self}
+            done, _ = wait(futures, timeout=hedge_after)
+            primary = next(iter(done), None)
+            if primary is not None and primary.exception() is None:
+                return self, primary.result()
+            if primary is not None and not isinstance(primary.exception(), ProviderUnavailableError):
+                raise primary.exception()
+
+            print(f"Hedging the {self.provider} request with {fallback.provider}")
+            futures[executor.submit(fallback._generate_in_thread)] = fallback
+            pending = [future for future in futures if future is not primary]
+            errors = []
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return futures[future], future.result()
+                    errors.append(future.exception())
+            if primary is not None:
+                errors.insert(0, primary.exception())
+            # Report an error about the request itself before provider outages
+            raise next((e for e in errors if not isinstance(e, ProviderUnavailableError)), errors[-1])
+        finally:
+            executor.shutdown(wait=False)
+
+    def _generate_in_thread(self):
+        try:
+            return self._generate()
+        finally:
+            connection.close()
+
+    def _store_comparison(self, result, document_hashes, input_hash, created_by):
+        return RenewalComparison.objects.create(
+            policy=self.policy,
+            provider=self.provider,
+            model=self.model,
+            prompt_version=RENEWAL_COMPARISON_PROMPT_VERSION,
+            document_hashes=document_hashes,
+            input_hash=input_hash,
+            input_tokens=self.usage["input_tokens"],
+            output_tokens=self.usage["output_tokens"],
+            cache_read_tokens=self.usage["cache_read_tokens"],
+            cache_write_tokens=self.usage["cache_write_tokens"],
+            duration_ms=self.duration_ms,
+            routing=self.routing,
+            email=result["email"],
+            attachment=result["attachment"],
+            created_by=created_by,
+        )
+
     def compare(self):
+        try:
+            return self._generate()
+        except RenewalComparisonError as e:
+            return {"error": str(e)}
+        except Exception as e:
+            print(f"Error in compare method: {str(e)}")
+            return {"error": f"Failed to generate comparison: {str(e)}"}
+
+    def _generate(self):
+        """Generate the comparison with this provider and return the parsed email and attachment."""
+        self.usage = self._empty_usage()
+        system_prompt, user_prompt = self._build_prompts()
+
+        # Call the appropriate AI provider
+        started = time.monotonic()
+        comparison_result = self._complete(system_prompt, user_prompt, structured=True)
+        self.duration_ms = int((time.monotonic() - started) * 1000)
+
+        # Parse the response to extract email and attachment
+        return self._parse_response(comparison_result)
+
+    def stream_compare(self):
+        """
+        Generate the comparison with the provider's streaming API.
+
+        Yields ("delta", {"field": ..., "text": ...}) events as the email and
+        attachment are written and finally ("result", parsed_result). Raises
+        RenewalComparisonError if the prompts cannot be built.
+        """
+        self.usage = self._empty_usage()
+        system_prompt, user_prompt = self._build_prompts()
+
+        streamer = JsonStringFieldStreamer()
+        chunks = []
+        started = time.monotonic()
+        for chunk in self._stream(system_prompt, user_prompt, structured=True):
+            chunks.append(chunk)
+            for field, text in streamer.feed(chunk):
+                if field in ("email", "attachment"):
+                    yield "delta", {"field": field, "text": text}
+        self.duration_ms = int((time.monotonic() - started) * 1000)
+
+        yield "result", self._parse_response("".join(chunks))
+
+    def _build_prompts(self):
+        """
+        Return the system and user prompts comparing the policy documents,
+        summarizing the documents first if they exceed the token budget.
+        Chooses the model for the documents as well.
+        """
         # Get all uploaded documents associated with this policy
         uploaded_documents = self.policy.documents.all()
         
         # Check if we have any documents to compare
         if not uploaded_documents.exists():
-            return {"error": "No documents available for comparison"}
+            raise RenewalComparisonError("No documents available for comparison")
         
         # Get context details for the policy
         context_details = self._get_policy_context_details()
         
         # Prepare document contents for analysis
-        document_contents = []
+        documents = []
         for doc in uploaded_documents:
             try:
-                # Get file path
-                file_path = doc.file.path
-                
-                # Check if file is a PDF
-                if file_path.lower().endswith('.pdf'):
-                    # Extract text from PDF
-                    text = self._extract_text_from_pdf(file_path)
-                else:
-                    # For non-PDF files, try to read as text
-                    with open(file_path, 'r', errors='replace') as f:
-                        text = f.read()
-                
-                document_contents.append({
-                    "name": doc.name,
-                    "content": text
-                })
-            except Exception as e:
-                print(f"Error reading document {doc.name}: {str(e)}")
-        
+                # Reuse the cached extraction, extracting the file only on first use.
+                # Pages with coverage tables are sent in their compact table form
+                # and standard forms repeated across the corpus are left out.
+                pages = DocumentTextCache.get_prompt_pages(
+                    doc,
+                    skip_boilerplate=getattr(settings, 'BOILERPLATE_FILTER_ENABLED', True)
+                )
+            except TextExtractionError as e:
+                print(f"Error extracting text from document {doc.name}: {str(e)}")
+                pages = [f"[Could not extract text from document: {str(e)}]"]
+                # Never store a summary of the placeholder under the file's hash
+                doc.content_hash = ''
+
+            documents.append({
+                "name": doc.name,
+                "pages": pages,
+                "content_hash": doc.content_hash
+            })
+
+        self.routing = ModelRouter.route(self.provider, documents, ModelRouter.get_settings(self.agency))
+        self.model = self.routing["model"]
+
+        # Diff the renewal documents against the expiring policy clause by clause
+        mode = getattr(settings, 'RENEWAL_PROMPT_MODE', 'both')
+        change_sets = []
+        if mode in ('both', 'changes') and len(documents) > 1:
+            change_sets, baseline = self._get_change_sets(documents)
+            if mode == 'changes':
+                # The change sets stand in for the full text of the renewal documents
+                documents = [baseline]
+
+        # Packets too large for one prompt are summarized document by document first
+        summarize = self._should_summarize(documents)
+        if summarize:
+            document_contents = self._summarize_documents(documents)
+        else:
+            # Keep only the coverage-relevant chunks of documents that exceed their share of the
+            # prompt; the change sets take their part of the budget first
+            max_chars = getattr(settings, 'RENEWAL_PROMPT_MAX_CHARS', 120000)
+            max_chars = max(0, max_chars - sum(len(change_set) for change_set in change_sets))
+            document_contents = select_document_contents(documents, max_chars)
+
         # Create prompt for AI using the utility function
-        system_prompt = get_renewal_comparison_system_prompt(context_details)
-        user_prompt = get_renewal_comparison_user_prompt(document_contents)
-        
-        # Call the appropriate AI provider
+        # The instructions are identical across comparisons and sent first so the
+        # provider can cache them; the client and agency details follow
+        system_prompt = [RENEWAL_COMPARISON_INSTRUCTIONS, get_renewal_comparison_context_prompt(context_details)]
+        user_prompt = get_renewal_comparison_user_prompt(document_contents, change_sets, summarized=summarize)
+        return system_prompt, user_prompt
+    
+    def _get_change_sets(self, documents):
+        """
+        Diff every document against the one describing the expiring policy.
+
+        Returns the formatted change sets, sharing RENEWAL_CHANGE_SET_MAX_CHARS,
+        and the baseline document.
+        """
+        baseline_index = pick_baseline(documents)
+        baseline = documents[baseline_index]
+        others = [doc for i, doc in enumerate(documents) if i != baseline_index]
+        max_chars = getattr(settings, 'RENEWAL_CHANGE_SET_MAX_CHARS', 20000) // len(others)
+
+        change_sets = []
+        for doc in others:
+            change_set = diff_documents(baseline['pages'], doc['pages'])
+            change_sets.append(format_change_set(change_set, baseline['name'], doc['name'], max_chars))
+        return change_sets, baseline
+
+    def _get_map_reduce_settings(self):
+        return {
+            "enabled": getattr(settings, 'RENEWAL_MAP_REDUCE_ENABLED', True),
+            "token_budget": getattr(settings, 'RENEWAL_MAP_REDUCE_TOKEN_BUDGET', 40000),
+            "summary_max_chars": getattr(settings, 'RENEWAL_SUMMARY_MAX_CHARS', 100000),
+            "summary_max_tokens": getattr(settings, 'RENEWAL_SUMMARY_MAX_TOKENS', 1500),
+        }
+
+    def _should_summarize(self, documents):
+        """
+        Return whether the documents are estimated to exceed
+        RENEWAL_MAP_REDUCE_TOKEN_BUDGET tokens with the selected provider.
+        """
+        map_reduce = self._get_map_reduce_settings()
+        if not map_reduce["enabled"]:
+            return False
+        tokens = sum(estimate_pages_tokens(doc["pages"], self.provider) for doc in documents)
+        return tokens > map_reduce["token_budget"]
+
+    def _summarize_documents(self, documents):
+        """
+        Return a coverage summary of every document in place of its content.
+
+        Summaries are stored per file content hash, provider, model and prompt
+        version; the missing ones are written in parallel, one provider call
+        per document, each trimmed to RENEWAL_SUMMARY_MAX_CHARS characters.
+        """
+        map_reduce = self._get_map_reduce_settings()
+        summaries = {}
+        missing = []
+        for i, doc in enumerate(documents):
+            stored = None
+            if doc["content_hash"]:
+                stored = DocumentSummary.objects.filter(
+                    content_hash=doc["content_hash"],
+                    provider=self.provider,
+                    model=self.model,
+                    prompt_version=DOCUMENT_SUMMARY_PROMPT_VERSION
+                ).first()
+            if stored is not None:
+                summaries[i] = stored.summary
+            else:
+                missing.append(i)
+
+        system_prompt = get_document_summary_system_prompt()
+
+        def summarize(doc):
+            content = select_document_contents([doc], map_reduce["summary_max_chars"])[0]["content"]
+            user_prompt = get_document_summary_user_prompt(doc["name"], content)
+            try:
+                return self._complete(
+                    system_prompt,
+                    user_prompt,
+                    max_tokens=map_reduce["summary_max_tokens"],
+                    with_usage=True,
+                    purpose=LLMCall.SUMMARY
+                )
+            finally:
+                # The call is recorded in the usage ledger from this worker thread
+                connection.close()
+
+        if missing:
+            workers = min(len(missing), getattr(settings, 'RENEWAL_SUMMARY_WORKERS', 4))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(summarize, [documents[i] for i in missing]))
+
+            for i, (summary, usage) in zip(missing, results):
+                summaries[i] = summary
+                if documents[i]["content_hash"]:
+                    DocumentSummary.objects.update_or_create(
+                        content_hash=documents[i]["content_hash"],
+                        provider=self.provider,
+                        model=self.model,
+                        prompt_version=DOCUMENT_SUMMARY_PROMPT_VERSION,
+                        defaults={
+                            "summary": summary,
+                            "input_tokens": usage["input_tokens"],
+                            "output_tokens": usage["output_tokens"]
+                        }
+                    )
+
+        return [{"name": doc["name"], "content": summaries[i]} for i, doc in enumerate(documents)]
+
+    def _complete(self, system_prompt, user_prompt, max_tokens=4000, with_usage=False, structured=False,
+                  purpose=LLMCall.COMPARISON):
+        """
+        Call the selected provider and return the response text, adding the
+        tokens used to self.usage. With `with_usage`, return a (text, usage) tuple.
+        With `structured`, the response is constrained to RENEWAL_COMPARISON_SCHEMA.
+        """
+        structured = structured and self._use_structured_output()
+        attempt = 0
+        while True:
+            try:
+                with self._provider_call(system_prompt, user_prompt, purpose) as lease:
+                    if self.provider == "anthropic":
+                        text, usage = self._call_anthropic(system_prompt, user_prompt, max_tokens, structured)
+                    else:  # openai
+                        text, usage = self._call_openai(system_prompt, user_prompt, max_tokens, structured)
+                    lease.settle(usage)
+                break
+            except ProviderUnavailableError as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                self._wait_before_retry(e, attempt)
+                attempt += 1
+
+        self._add_usage(usage)
+        return (text, usage) if with_usage else text
+
+    def _should_retry(self, error, attempt):
+        """
+        Return whether a failed provider call is tried again. The SDKs do not
+        retry, so every attempt waits for the rate limits and counts towards
+        the circuit breaker; nothing is retried once the circuit is open.
+        """
+        if isinstance(error.__cause__, CircuitOpenError) or not CircuitBreaker(self.provider).is_available():
+            return False
+        return attempt < getattr(settings, 'LLM_MAX_RETRIES', 1)
+
+    def _wait_before_retry(self, error, attempt):
+        delay = getattr(settings, 'LLM_RETRY_BACKOFF', 1.0) * 2 ** attempt
+        print(f"Retrying {self.provider} request in {delay:.1f}s: {str(error)}")
+        time.sleep(delay)
+
+    @contextmanager
+    def _provider_call(self, system_prompt, user_prompt, purpose=LLMCall.COMPARISON):
+        """
+        Guard a provider call with the provider's circuit breaker and rate
+        limits, and record it in the LLM usage ledger. Raises
+        ProviderUnavailableError if the circuit is open or the call fails for
+        reasons other than the request itself.
+        """
+        outcome = LLMCall.FAILED
+        lease = None
+        started = time.monotonic()
+        requested = None
         try:
+            with CircuitBreaker(self.provider).call():
+                with self._rate_limited(system_prompt, user_prompt) as lease:
+                    requested = time.monotonic()
+                    yield lease
+                    outcome = LLMCall.SUCCEEDED
+        except CircuitOpenError as e:
+            outcome = LLMCall.UNAVAILABLE
+            raise ProviderUnavailableError(str(e)) from e
+        except LLMRateLimitTimeout:
+            outcome = LLMCall.RATE_LIMITED
+            raise
+        except Exception as e:
+            if is_provider_failure(e):
+                raise ProviderUnavailableError(f"{self.provider} request failed: {str(e)}") from e
+            raise
+        finally:
+            finished = time.monotonic()
+            LLMUsageLedger.record(
+                self.provider,
+                self.model,
+                purpose,
+                outcome,
+                usage=lease.usage if lease is not None else None,
+                agency_id=self._get_agency_id(),
+                policy_id=self.policy.id if self.policy is not None else None,
+                queue_ms=int(((requested or finished) - started) * 1000),
+                duration_ms=int((finished - requested) * 1000) if requested is not None else None
+            )
+
+    def _get_agency_id(self):
+        return self.policy.business.customer.agency_id if self.policy is not None else None
+
+    @contextmanager
+    def _rate_limited(self, system_prompt, user_prompt):
+        """
+        Wait for the provider's request and token rate limits, shared by all
+        worker processes, with requests of the policy's agency taking their turn.
+        """
+        sections = [system_prompt] if isinstance(system_prompt, str) else system_prompt
+        tokens = estimate_tokens("".join(sections) + user_prompt, self.provider)
+        with LLMRateLimiter(self.provider).acquire(self._get_agency_id(), tokens) as lease:
+            yield lease
+
+    @staticmethod
+    def _use_structured_output():
+        return getattr(settings, 'RENEWAL_STRUCTURED_OUTPUT', True)
+
+    @staticmethod
+    def _anthropic_tool_options():
+        """Return the request options making Claude answer with the comparison tool's input."""
+        return {
+            "tools": [{
+                "name": RENEWAL_COMPARISON_TOOL,
+                "description": "Record the renewal email and the comparison attached to it.",
+                "input_schema": RENEWAL_COMPARISON_SCHEMA
+            }],
+            "tool_choice": {"type": "tool", "name": RENEWAL_COMPARISON_TOOL}
+        }
+
+    @staticmethod
+    def _openai_response_format():
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": RENEWAL_COMPARISON_TOOL,
+                "strict": True,
+                "schema": RENEWAL_COMPARISON_SCHEMA
+            }
+        }
+
+    @staticmethod
+    def _empty_usage():
+        return {"input_tokens": None, "output_tokens": None, "cache_read_tokens": None, "cache_write_tokens": None}
+
+    @staticmethod
+    def _anthropic_system(system_prompt):
+        """
+        Return the system parameter of an Anthropic request. A system prompt
+        given as a list of sections is cached up to the end of its first section.
+        """
+        if isinstance(system_prompt, str):
+            return system_prompt
+        blocks = [{"type": "text", "text": section} for section in system_prompt]
+        blocks[0]["cache_control"] = {"type": "ephemeral"}
+        return blocks
+
+    @staticmethod
+    def _openai_messages(system_prompt, user_prompt):
+        """
+        Return the messages of an OpenAI request. OpenAI caches the longest
+        previously seen prefix of a prompt by itself, so system prompt
+        sections are sent in order as separate messages.
+        """
+        sections = [system_prompt] if isinstance(system_prompt, str) else system_prompt
+        return [{"role": "system", "content": section} for section in sections] + [
+            {"role": "user", "content": user_prompt}
+        ]
+
+    @staticmethod
+    def _anthropic_usage(usage):
+        return {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", None),
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", None)
+        }
+
+    @staticmethod
+    def _openai_usage(usage):
+        if usage is None:
+            return RenewalComparator._empty_usage()
+        details = getattr(usage, "prompt_tokens_details", None)
+        return {
+            "input_tokens": usage.prompt_tokens,
+            "output_tokens": usage.completion_tokens,
+            "cache_read_tokens": getattr(details, "cached_tokens", None),
+            # OpenAI does not charge for writing its prompt cache
+            "cache_write_tokens": None
+        }
+
+    def _add_usage(self, usage):
+        with self._usage_lock:
+            for key, tokens in usage.items():
+                if tokens is not None:
+                    self.usage[key] = (self.usage[key] or 0) + tokens
+
+    def _stream(self, system_prompt, user_prompt, structured=False):
+        """
+        Call the selected provider's streaming API, yielding the response text
+        as it arrives. A call failing before any text arrived is retried like
+        those of _complete.
+        """
+        attempt = 0
+        while True:
+            streamed = False
+            try:
+                for text in self._stream_once(system_prompt, user_prompt, structured):
+                    streamed = True
+                    yield text
+                return
+            except ProviderUnavailableError as e:
+                if streamed or not self._should_retry(e, attempt):
+                    raise
+                self._wait_before_retry(e, attempt)
+                attempt += 1
+
+    def _stream_once(self, system_prompt, user_prompt, structured=False):
+        structured = structured and self._use_structured_output()
+        with self._provider_call(system_prompt, user_prompt) as lease:
             if self.provider == "anthropic":
-                comparison_result = self._call_anthropic(system_prompt, user_prompt)
+                usage = yield from self._stream_anthropic(system_prompt, user_prompt, structured=structured)
             else:  # openai
-                comparison_result = self._call_openai(system_prompt, user_prompt)
-            
-            # Parse the response to extract email and attachment
-            parsed_result = self._parse_response(comparison_result)
-            
-            return parsed_result
-            
-        except Exception as e:
-            print(f"Error in compare method: {str(e)}")
-            return {"error": f"Failed to generate comparison: {str(e)}"}
-    
-    def _call_anthropic(self, system_prompt, user_prompt):
-        """Call the Anthropic API and return the response text."""
-        # Initialize Anthropic client
-        client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+                usage = yield from self._stream_openai(system_prompt, user_prompt, structured=structured)
+            lease.settle(usage)
+
+        self._add_usage(usage)
+
+    def _stream_anthropic(self, system_prompt, user_prompt, max_tokens=4000, structured=False):
+        client = get_llm_client("anthropic")
+
+        with client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            temperature=0.2,
+            system=self._anthropic_system(system_prompt),
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ],
+            **(self._anthropic_tool_options() if structured else {})
+        ) as stream:
+            for event in stream:
+                # The tool input arrives as partial JSON, plain answers as text
+                if event.type == "text":
+                    yield event.text
+                elif event.type == "input_json":
+                    yield event.partial_json
+            response = stream.get_final_message()
+
+        return self._anthropic_usage(response.usage)
+
+    def _stream_openai(self, system_prompt, user_prompt, max_tokens=4000, structured=False):
+        client = get_llm_client("openai")
+
+        stream = client.chat.completions.create(
+            model=self.model,
+            max_completion_tokens=max_tokens,
+            messages=self._openai_messages(system_prompt, user_prompt),
+            stream=True,
+            stream_options={"include_usage": True},
+            **({"response_format": self._openai_response_format()} if structured else {})
+        )
+
+        usage = self._empty_usage()
+        with stream:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage is not None:
+                    usage = self._openai_usage(chunk.usage)
+        return usage
+
+    def _call_anthropic(self, system_prompt, user_prompt, max_tokens=4000, structured=False):
+        """
+        Call the Anthropic API and return the response text and token usage.
+        A structured response is returned as the JSON text of the tool input.
+        """
+        # Reuse the pooled Anthropic client of this process
+        client = get_llm_client("anthropic")
         
         response = client.messages.create(
-            model="claude-3-7-sonnet-latest",
-            max_tokens=4000,
+            model=self.model,
+            max_tokens=max_tokens,
             temperature=0.2,
-            system=system_prompt,
+            system=self._anthropic_system(system_prompt),
             messages=[
                 {"role": "user", "content": user_prompt}
-            ]
+            ],
+            **(self._anthropic_tool_options() if structured else {})
         )
         
+        usage = self._anthropic_usage(response.usage)
+
         # Extract the response content
-        return response.content[0].text
+        for block in response.content:
+            if block.type == "tool_use":
+                return json.dumps(block.input), usage
+        return response.content[0].text, usage
     
-    def _call_openai(self, system_prompt, user_prompt):
-        """Call the OpenAI API and return the response text."""
-        # Initialize OpenAI client
-        client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    def _call_openai(self, system_prompt, user_prompt, max_tokens=4000, structured=False):
+        """
+        Call the OpenAI API and return the response text and token usage.
+        `max_tokens` is sent as max_completion_tokens, which also bounds the
+        reasoning tokens of o-series models.
+        """
+        # Reuse the pooled OpenAI client of this process
+        client = get_llm_client("openai")
         
         response = client.chat.completions.create(
-            model="o3-mini-2025-01-31",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+            model=self.model,
+            max_completion_tokens=max_tokens,
+            messages=self._openai_messages(system_prompt, user_prompt),
+            **({"response_format": self._openai_response_format()} if structured else {})
         )
         
+        usage = self._openai_usage(response.usage)
+
         # Extract the response content
-        return response.choices[0].message.content
-    
-    def _extract_text_from_pdf(self, file_path):
-        """Extract text from a PDF file."""
-        text = ""
-        try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n\n"
-            return text
-        except Exception as e:
-            print(f"Error extracting text from PDF: {str(e)}")
-            return f"[Could not extract text from PDF: {str(e)}]"
+        return response.choices[0].message.content, usage
     
     def _parse_response(self, response_text):
-        """Parse the response from AI to extract email and attachment."""
+        """
+        Parse the response from AI to extract email and attachment.
+
+        A response that does not match RENEWAL_COMPARISON_SCHEMA is sent back
+        to the provider once to be repaired; raises RenewalComparisonError if
+        the repaired response does not match either.
+        """
         try:
-            # First try to parse as JSON
-            try:
-                # Clean up the response text to make it valid JSON
-                cleaned_text = response_text.strip()
-                # If the response starts with a newline and "email", it might be a malformed JSON
-                if cleaned_text.startswith('"email"') or cleaned_text.startswith('\n"email"'):
-                    # Try to convert it to a proper JSON object
-                    cleaned_text = '{' + cleaned_text + '}'
-                
-                data = json.loads(cleaned_text)
-                return data
-            except json.JSONDecodeError:
-                # If JSON parsing fails, try to extract email and attachment using regex
-                email_match = re.search(r'email["\s:]+(.+?)(?=attachment["\s:]+|$)', response_text, re.DOTALL)
-                attachment_match = re.search(r'attachment["\s:]+(.+?)$', response_text, re.DOTALL)
-                
-                email = email_match.group(1).strip() if email_match else ""
-                attachment = attachment_match.group(1).strip() if attachment_match else ""
-                
-                # Clean up quotes if present
-                if email.startswith('"') and email.endswith('"'):
-                    email = email[1:-1]
-                if attachment.startswith('"') and attachment.endswith('"'):
-                    attachment = attachment[1:-1]
-                
-                return {
-                    "email": email,
-                    "attachment": attachment,
-                }
-        except Exception as e:
-            print(f"Error parsing response: {str(e)}")
-            # If all parsing attempts fail, return the raw response
-            return {
-                "comparison": response_text,
-                "parsing_error": str(e)
-            }
+            return parse_renewal_comparison(response_text)
+        except StructuredOutputError as e:
+            print(f"Repairing invalid response from {self.provider}: {str(e)}")
+            error = e
+
+        repaired_text = self._complete(
+            get_response_repair_system_prompt(),
+            get_response_repair_user_prompt(response_text, error),
+            structured=True,
+            purpose=LLMCall.REPAIR
+        )
+        try:
+            return parse_renewal_comparison(repaired_text)
+        except StructuredOutputError as e:
+            raise RenewalComparisonError(f"Unexpected response from {self.provider}: {str(e)}") from e
@@ -0,0 +1,128 @@
+"""
+Single-flight execution of expensive work shared by threads and processes.
+
+Identical requests arriving together, such as a double-clicked button or
+several agents opening the same policy, should do the work once. Work is
+identified by a key naming its inputs, e.g. the policy, document hashes and
+provider of a comparison. The first request for a key runs it while holding
+a per-key thread lock and an exclusive fcntl lock on a file under
+LLM_STATE_DIR; identical requests in any process of the host block until it
+is done and then look up the result in the store the work writes to, such as
+the database, instead of computing it again. If the result is not there, the
+work failed or was abandoned and the waiter runs it itself.
+
+Locks are released when their holder finishes or its process dies. A request
+still waiting after SINGLE_FLIGHT_TIMEOUT seconds runs the work regardless.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+from django.conf import settings
+from .file_state import get_state_path
+
+T = TypeVar('T')
+
+# Seconds between attempts to take a lock held by another process
+POLL_INTERVAL = 0.1
+
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+class SingleFlight:
+    def __init__(self, key: str, timeout: Optional[float] = None):
+        self.key = key
+        self.timeout = timeout if timeout is not None else getattr(settings, 'SINGLE_FLIGHT_TIMEOUT', 600)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        self.path = get_state_path(f'single-flight-{digest}.lock')
+
+    def run(self, compute: Callable[[], T], lookup: Callable[[], Optional[T]]) -> T:
+        """
+        Return compute(), or lookup() if an identical request finished while
+        this one waited and lookup finds its result (anything but None).
+        """
+        with self.hold() as waited:
+            if waited:
+                result = lookup()
+                if result is not None:
+                    return result
+            return compute()
+
+    @contextmanager
+    def hold(self):
+        """
+        Hold the key for the duration of the block, waiting while another
+        request holds it. Yields whether this request had to wait.
+        """
+        deadline = time.monotonic() + self.timeout
+        thread_lock = self._get_thread_lock()
+        waited = not thread_lock.acquire(blocking=False)
+        if waited and not thread_lock.acquire(timeout=self.timeout):
+            print(f"Timed out waiting for {self.key}; running it again")
+            self._release_thread_lock(thread_lock, held=False)
+            yield True
+            return
+
+        try:
+            lock_file, file_waited = self._lock_file(deadline)
+            try:
+                yield waited or file_waited
+            finally:
+                if lock_file is not None:
+                    self._unlock_file(lock_file)
+        finally:
+            self._release_thread_lock(thread_lock, held=True)
+
+    def _get_thread_lock(self) -> threading.Lock:
+        with _thread_locks_lock:
+            entry = _thread_locks.setdefault(self.key, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_thread_lock(self, thread_lock: threading.Lock, held: bool) -> None:
+        with _thread_locks_lock:
+            if held:
+                thread_lock.release()
+            entry = _thread_locks[self.key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _thread_locks[self.key]
+
+    def _lock_file(self, deadline: float):
+        """
+        Take the key's file lock, waiting for other processes until the
+        deadline. Returns the locked file, or None after a timeout, and
+        whether another process held it.
+        """
+        waited = False
+        while True:
+            lock_file = open(self.path, 'a+')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                waited = True
+                if time.monotonic() > deadline:
+                    print(f"Timed out waiting for {self.key}; running it again")
+                    return None, waited
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            # The previous holder removes the file when it is done; a lock on a removed file guards nothing
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return lock_file, waited
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+    def _unlock_file(self, lock_file) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
@@ -0,0 +1,71 @@
+"""
+JSON schema and validating parser of the renewal comparison response.
+
+The schema is sent to the providers as an Anthropic tool input schema or an
+OpenAI structured output format, so the response is a JSON object with an
+email and an attachment. parse_renewal_comparison validates the text the
+provider returned against it and raises StructuredOutputError with the
+reason if it does not match, which is given to the model in a repair request.
+
+This module does not import Django.
+"""
+import json
+import re
+from typing import Any, Dict
+
+RENEWAL_COMPARISON_TOOL = 'renewal_comparison'
+
+RENEWAL_COMPARISON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "email": {
+            "type": "string",
+            "description": "The complete email to the client",
+        },
+        "attachment": {
+            "type": "string",
+            "description": "The complete Markdown content of the attached comparison",
+        },
+    },
+    "required": ["email", "attachment"],
+    "additionalProperties": False,
+}
+
+# A response wrapped in a Markdown code fence
+CODE_FENCE_PATTERN = re.compile(r'^```(?:json)?\s*(.*?)\s*```$', re.DOTALL)
+
+class StructuredOutputError(ValueError):
+    pass
+
+def validate_renewal_comparison(data: Any) -> Dict[str, str]:
+    """Check a decoded response against RENEWAL_COMPARISON_SCHEMA and return it."""
+    if not isinstance(data, dict):
+        raise StructuredOutputError(f"expected a JSON object, got {type(data).__name__}")
+    for field in RENEWAL_COMPARISON_SCHEMA["required"]:
+        if field not in data:
+            raise StructuredOutputError(f"missing required field '{field}'")
+        if not isinstance(data[field], str):
+            raise StructuredOutputError(f"field '{field}' must be a string")
+        if not data[field].strip():
+            raise StructuredOutputError(f"field '{field}' is empty")
+    extra = set(data) - set(RENEWAL_COMPARISON_SCHEMA["properties"])
+    if extra:
+        raise StructuredOutputError(f"unexpected fields: {', '.join(sorted(extra))}")
+    return {field: data[field] for field in RENEWAL_COMPARISON_SCHEMA["required"]}
+
+def parse_renewal_comparison(text: str) -> Dict[str, str]:
+    """
+    Decode and validate the text of a renewal comparison response.
+
+    A surrounding Markdown code fence is removed; anything else that is not
+    a single JSON object matching the schema raises StructuredOutputError.
+    """
+    cleaned = (text or '').strip()
+    match = CODE_FENCE_PATTERN.match(cleaned)
+    if match:
+        cleaned = match.group(1)
+    try:
+        data = json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"invalid JSON: {e}") from e
+    return validate_renewal_comparison(data)
@@ -0,0 +1,184 @@
+"""
+Layout-aware table extraction from PDF text positions.
+
+Text fragments are grouped into lines by their baseline and split into cells
+on wide horizontal gaps. Runs of consecutive multi-cell lines that carry
+numbers (limits, deductibles, premiums) are treated as tables, their cells
+are aligned into columns and each table is emitted as compact TSV or
+Markdown.
+
+Like pdf_text, this module must not import Django because it runs inside
+extraction worker processes.
+"""
+import math
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+TSV = 'tsv'
+MARKDOWN = 'markdown'
+
+# Average glyph width as a fraction of the font size, used to estimate where a
+# fragment ends since PyPDF2 only reports where it starts
+AVERAGE_GLYPH_WIDTH = 0.6
+
+# A horizontal gap wider than this many font sizes starts a new cell
+CELL_GAP = 1.5
+
+# Minimum number of consecutive multi-cell lines that form a table
+MIN_TABLE_ROWS = 3
+
+# Tables with more columns than this are almost always mis-detected prose
+MAX_TABLE_COLUMNS = 10
+
+NUMBER_PATTERN = re.compile(r'\d')
+
+class TextFragment(NamedTuple):
+    x: float
+    y: float
+    size: float
+    text: str
+
+class Cell(NamedTuple):
+    x: float
+    text: str
+
+class Line(NamedTuple):
+    y: float
+    size: float
+    cells: List[Cell]
+
+def collect_fragments(page) -> Tuple[str, List[TextFragment]]:
+    """Extract a PyPDF2 page's text together with the position of each text fragment."""
+    fragments = []
+
+    def visit(text, cm, tm, font_dict, font_size):
+        if not text or not text.strip():
+            return
+        # Combine the text and current transformation matrices to get page coordinates
+        a = tm[0] * cm[0] + tm[1] * cm[2]
+        b = tm[0] * cm[1] + tm[1] * cm[3]
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        size = abs(font_size or 1) * (math.hypot(a, b) or 1)
+        fragments.append(TextFragment(x, y, size, ' '.join(text.split())))
+
+    text = page.extract_text(visitor_text=visit) or ''
+    return text, fragments
+
+def group_lines(fragments: List[TextFragment]) -> List[Line]:
+    """Group fragments sharing a baseline into lines of cells, ordered top to bottom."""
+    lines = []
+    current = []
+    for fragment in sorted(fragments, key=lambda f: (-f.y, f.x)):
+        if current and abs(current[0].y - fragment.y) > 0.4 * max(current[0].size, fragment.size):
+            lines.append(_build_line(current))
+            current = []
+        current.append(fragment)
+    if current:
+        lines.append(_build_line(current))
+    return lines
+
+def _build_line(fragments: List[TextFragment]) -> Line:
+    fragments = sorted(fragments, key=lambda f: f.x)
+    size = max(f.size for f in fragments)
+    cells = []
+    cell_x, cell_text, cell_end = fragments[0].x, fragments[0].text, _estimate_end(fragments[0])
+    for fragment in fragments[1:]:
+        gap = fragment.x - cell_end
+        if gap > CELL_GAP * size:
+            cells.append(Cell(cell_x, cell_text))
+            cell_x, cell_text = fragment.x, fragment.text
+        else:
+            cell_text = f"{cell_text} {fragment.text}" if gap > 0.15 * fragment.size else cell_text + fragment.text
+        cell_end = max(cell_end, _estimate_end(fragment))
+    cells.append(Cell(cell_x, cell_text))
+    return Line(fragments[0].y, size, cells)
+
+def _estimate_end(fragment: TextFragment) -> float:
+    return fragment.x + len(fragment.text) * fragment.size * AVERAGE_GLYPH_WIDTH
+
+def detect_tables(lines: List[Line]) -> List[Tuple[int, int]]:
+    """
+    Return [start, stop) line ranges that look like tables.
+
+    A table is a run of vertically adjacent lines with at least two cells
+    each, where at least half of the rows contain a number.
+    """
+    tables = []
+    start = None
+    for index in range(len(lines) + 1):
+        line = lines[index] if index < len(lines) else None
+        is_row = line is not None and len(line.cells) >= 2
+        if is_row and start is not None:
+            previous = lines[index - 1]
+            # A large vertical gap ends the table even if the next line has cells
+            if previous.y - line.y > 3 * max(previous.size, line.size):
+                _close_table(lines, start, index, tables)
+                start = None
+        if is_row and start is None:
+            start = index
+        elif not is_row and start is not None:
+            _close_table(lines, start, index, tables)
+            start = None
+    return tables
+
+def _close_table(lines: List[Line], start: int, stop: int, tables: List[Tuple[int, int]]) -> None:
+    rows = lines[start:stop]
+    if len(rows) < MIN_TABLE_ROWS:
+        return
+    numeric_rows = sum(1 for line in rows if any(NUMBER_PATTERN.search(cell.text) for cell in line.cells))
+    if numeric_rows * 2 >= len(rows):
+        tables.append((start, stop))
+
+def align_columns(rows: List[Line]) -> List[List[str]]:
+    """Align the cells of table rows into a grid by clustering their x positions."""
+    size = max(line.size for line in rows)
+    anchors = []
+    for x in sorted(cell.x for line in rows for cell in line.cells):
+        if anchors and x - anchors[-1][-1] <= 2 * size:
+            anchors[-1].append(x)
+        else:
+            anchors.append([x])
+    columns = [sum(xs) / len(xs) for xs in anchors]
+
+    grid = []
+    for line in rows:
+        row = [''] * len(columns)
+        for cell in line.cells:
+            column = min(range(len(columns)), key=lambda i: abs(columns[i] - cell.x))
+            row[column] = f"{row[column]} {cell.text}".strip()
+        grid.append(row)
+    return grid
+
+def format_table(grid: List[List[str]], table_format: str = TSV) -> str:
+    """Render a grid of cells as TSV or as a Markdown table with the first row as header."""
+    if table_format == MARKDOWN:
+        rendered = [f"| {' | '.join(cell.replace('|', '/') for cell in row)} |" for row in grid]
+        rendered.insert(1, f"|{'---|' * len(grid[0])}")
+        return '\n'.join(rendered)
+    return '\n'.join('\t'.join(cell.replace('\t', ' ') for cell in row) for row in grid)
+
+def extract_page_tables(page, table_format: str = TSV) -> Tuple[str, Optional[str]]:
+    """
+    Extract a PyPDF2 page's raw text and, when it contains tables, a layout
+    rendering in which every table is replaced by its TSV or Markdown form.
+
+    Returns (text, table_text), where table_text is None if no table was found.
+    """
+    text, fragments = collect_fragments(page)
+    lines = group_lines(fragments)
+    tables = [
+        (start, stop) for start, stop in detect_tables(lines)
+        if len(align_columns(lines[start:stop])[0]) <= MAX_TABLE_COLUMNS
+    ]
+    if not tables:
+        return text, None
+
+    blocks = []
+    index = 0
+    for start, stop in tables:
+        blocks.extend(' '.join(cell.text for cell in line.cells) for line in lines[index:start])
+        blocks.append(format_table(align_columns(lines[start:stop]), table_format))
+        index = stop
+    blocks.extend(' '.join(cell.text for cell in line.cells) for line in lines[index:])
+    return text, '\n'.join(blocks)
@@ -0,0 +1,567 @@
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from ..models import DocumentExtraction, ExtractedPage, OcrPage, UploadedBusinessDocument
+from .table_extractor import TSV
+from .pdf_text import PageText, get_page_count, extract_page_range, iter_page_ranges
+from .ocr import OcrOptions, is_ocr_available, ocr_image, ocr_pdf_page
+from .extractors import (
+    CSV, DOCX, EML, IMAGE_TYPES, PDF, TEXT, XLSX,
+    detect_mime_type, iter_csv_pages, iter_docx_pages, iter_eml_pages, iter_xlsx_pages
+)
+from .boilerplate import BoilerplateIndex
+from .single_flight import SingleFlight
+
+# Bump whenever the extraction logic changes so cached pages are re-extracted
+EXTRACTOR_VERSION = '4'
+
+# Bump whenever OCR output changes so cached OCR pages are recognized again
+OCR_VERSION = '1'
+
+# Number of extracted pages written to the database per transaction
+PAGE_BATCH_SIZE = 50
+
+# Seconds between touches of an extraction in progress, telling waiting processes it is alive
+EXTRACTION_HEARTBEAT_INTERVAL = 10
+
+class TextExtractionError(Exception):
+    """Raised when text cannot be extracted from a document."""
+
+class ExtractionWorkerError(TextExtractionError):
+    """Raised when an extraction worker process dies, breaking the pool."""
+
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of a file, reading it in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_extraction_workers() -> int:
+    """Return the configured number of extraction worker processes."""
+    return getattr(settings, 'TEXT_EXTRACTION_WORKERS', None) or os.cpu_count() or 1
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """
+    Return the process-wide extraction pool, creating it on first use.
+
+    Workers are spawned rather than forked so they never inherit the state of
+    a threaded server process, and the pool is recreated in forked children.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=get_extraction_workers(),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def shutdown_extraction_pool() -> None:
+    """Shut down the extraction pool; the next extraction starts a new one."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_pid = None
+
+def _wait_for_pages(future, deadline: float, timeout: float) -> List[PageText]:
+    """Return the pages computed by a pool task, translating pool failures."""
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FuturesTimeoutError:
+        raise TextExtractionError(f"Timed out after {timeout} seconds extracting PDF text")
+    except BrokenProcessPool as e:
+        shutdown_extraction_pool()
+        raise ExtractionWorkerError(f"Extraction worker died: {str(e)}") from e
+    except Exception as e:
+        raise TextExtractionError(str(e)) from e
+
+def iter_pdf_pages(
+    file_path: str,
+    workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    max_pages: Optional[int] = None
+) -> Iterator[PageText]:
+    """
+    Yield the text of each page of a PDF in order.
+
+    Large PDFs are split into page ranges which are extracted in parallel by
+    the extraction pool. At most two ranges per worker are in flight, so
+    memory stays bounded however long the document is. If a worker dies, the
+    remaining pages are extracted in this process. Raises
+    TextExtractionError if the document is not extracted within `timeout`
+    seconds.
+    """
+    workers = workers or get_extraction_workers()
+    timeout = timeout or getattr(settings, 'TEXT_EXTRACTION_TIMEOUT', 120)
+    pages_per_task = getattr(settings, 'TEXT_EXTRACTION_PAGES_PER_TASK', 25)
+    table_format = getattr(settings, 'TABLE_EXTRACTION_FORMAT', TSV)
+
+    page_count = get_page_count(file_path)
+    if max_pages is not None:
+        page_count = min(page_count, max_pages)
+
+    yielded = 0
+    if workers > 1 and page_count > pages_per_task:
+        try:
+            for page in _iter_pool_pages(file_path, page_count, pages_per_task, table_format, workers, timeout):
+                yield page
+                yielded += 1
+            return
+        except ExtractionWorkerError as e:
+            print(f"{str(e)}; extracting pages {yielded + 1}-{page_count} of {os.path.basename(file_path)} in this process")
+
+    for start, stop in iter_page_ranges(page_count - yielded, pages_per_task):
+        yield from extract_page_range(file_path, yielded + start, yielded + stop, table_format)
+
+def _iter_pool_pages(
+    file_path: str,
+    page_count: int,
+    pages_per_task: int,
+    table_format: str,
+    workers: int,
+    timeout: float
+) -> Iterator[PageText]:
+    pool = get_extraction_pool()
+    deadline = time.monotonic() + timeout
+    pending = deque()
+    try:
+        for start, stop in iter_page_ranges(page_count, pages_per_task):
+            pending.append(pool.submit(extract_page_range, file_path, start, stop, table_format))
+            if len(pending) >= workers * 2:
+                yield from _wait_for_pages(pending.popleft(), deadline, timeout)
+        while pending:
+            yield from _wait_for_pages(pending.popleft(), deadline, timeout)
+    finally:
+        # Drop queued work when the consumer stops early or extraction fails
+        for future in pending:
+            future.cancel()
+
+def extract_pdf_pages(file_path: str, workers: Optional[int] = None, timeout: Optional[float] = None) -> List[PageText]:
+    """Extract the text of every page of a PDF."""
+    return list(iter_pdf_pages(file_path, workers=workers, timeout=timeout))
+
+def iter_text_file_chunks(file_path: str, chunk_size: Optional[int] = None) -> Iterator[str]:
+    """Yield a text file in fixed-size chunks of characters."""
+    chunk_size = chunk_size or getattr(settings, 'TEXT_EXTRACTION_CHUNK_SIZE', 64 * 1024)
+    with open(file_path, 'r', errors='replace') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+def iter_pages(file_path: str, max_pages: Optional[int] = None) -> Iterator[PageText]:
+    """
+    Yield the text of a file page by page, using the extractor registered
+    for its detected MIME type.
+
+    Files of an unsupported type, such as arbitrary binaries, yield nothing
+    rather than garbage characters.
+    """
+    try:
+        mime_type = detect_mime_type(file_path)
+        extractor = EXTRACTORS.get(mime_type)
+        if extractor is None:
+            print(f"Skipping text extraction of {os.path.basename(file_path)}: unsupported type {mime_type}")
+            return
+        yield from itertools.islice(extractor(file_path, max_pages), max_pages)
+    except TextExtractionError:
+        raise
+    except Exception as e:
+        raise TextExtractionError(str(e)) from e
+
+def _iter_pdf_file_pages(file_path: str, max_pages: Optional[int]) -> Iterator[PageText]:
+    return iter_pdf_pages(file_path, max_pages=max_pages)
+
+def _iter_text_file_pages(file_path: str, max_pages: Optional[int]) -> Iterator[PageText]:
+    for chunk in iter_text_file_chunks(file_path):
+        yield PageText(chunk)
+
+def _iter_table_file_pages(extract: Callable[[str, Optional[str], Optional[int]], Iterator[PageText]]):
+    def iter_table_file_pages(file_path: str, max_pages: Optional[int]) -> Iterator[PageText]:
+        return extract(
+            file_path,
+            getattr(settings, 'TABLE_EXTRACTION_FORMAT', TSV),
+            getattr(settings, 'TEXT_EXTRACTION_MAX_BYTES', 20 * 1024 * 1024)
+        )
+    return iter_table_file_pages
+
+def _iter_email_file_pages(file_path: str, max_pages: Optional[int]) -> Iterator[PageText]:
+    return iter_eml_pages(
+        file_path,
+        extract_attachment=_iter_attachment_pages,
+        max_bytes=getattr(settings, 'TEXT_EXTRACTION_MAX_BYTES', 20 * 1024 * 1024)
+    )
+
+def _iter_attachment_pages(file_path: str) -> Iterator[PageText]:
+    try:
+        yield from iter_pages(file_path)
+    except TextExtractionError as e:
+        print(f"Error extracting text from attachment {os.path.basename(file_path)}: {str(e)}")
+
+def _iter_image_file_pages(file_path: str, max_pages: Optional[int]) -> Iterator[PageText]:
+    text = ocr_image_file(file_path)
+    if text is not None:
+        yield PageText(text, is_ocr=True)
+
+# Page extractors by detected MIME type; each takes a file path and a page limit
+EXTRACTORS: Dict[str, Callable[[str, Optional[int]], Iterator[PageText]]] = {
+    PDF: _iter_pdf_file_pages,
+    DOCX: _iter_table_file_pages(iter_docx_pages),
+    XLSX: _iter_table_file_pages(iter_xlsx_pages),
+    CSV: _iter_table_file_pages(iter_csv_pages),
+    EML: _iter_email_file_pages,
+    TEXT: _iter_text_file_pages,
+    **{image_type: _iter_image_file_pages for image_type in IMAGE_TYPES},
+}
+
+def get_ocr_options(pdf: bool = True) -> Optional[OcrOptions]:
+    """
+    Return the configured options for OCRing PDFs, or with `pdf` False image
+    files, or None if OCR is disabled or its tools are not installed.
+    """
+    if not getattr(settings, 'OCR_ENABLED', True):
+        return None
+    options = OcrOptions(
+        tesseract_cmd=getattr(settings, 'OCR_TESSERACT_CMD', 'tesseract'),
+        pdftoppm_cmd=getattr(settings, 'OCR_PDFTOPPM_CMD', 'pdftoppm'),
+        language=getattr(settings, 'OCR_LANGUAGE', 'eng'),
+        dpi=getattr(settings, 'OCR_DPI', 300),
+        timeout=getattr(settings, 'OCR_PAGE_TIMEOUT', 60)
+    )
+    return options if is_ocr_available(options, pdf) else None
+
+def get_ocr_config(options: OcrOptions) -> str:
+    """Return the identifier under which OCR results produced with `options` are cached."""
+    return f"tesseract-{OCR_VERSION}:{options.language}:{options.dpi}"
+
+def get_extraction_stale_after() -> float:
+    """
+    Return how many seconds an unfinished extraction may go without a
+    heartbeat before waiting processes consider it abandoned.
+
+    A live extraction touches its row at least every
+    EXTRACTION_HEARTBEAT_INTERVAL seconds between pages, so the longest
+    silence is one blocking step: waiting for a PDF page range, bounded by
+    TEXT_EXTRACTION_TIMEOUT, or rasterizing and recognizing one page, each
+    bounded by OCR_PAGE_TIMEOUT.
+    """
+    longest_step = max(
+        getattr(settings, 'TEXT_EXTRACTION_TIMEOUT', 120),
+        2 * getattr(settings, 'OCR_PAGE_TIMEOUT', 60)
+    )
+    return longest_step + 2 * EXTRACTION_HEARTBEAT_INTERVAL
+
+def ocr_pdf_pages(
+    file_path: str,
+    content_hash: str,
+    page_numbers: List[int],
+    heartbeat: Optional[Callable[[], None]] = None
+) -> Dict[int, str]:
+    """
+    Return the OCR text of the given 1-based pages of a PDF.
+
+    Pages already recognized for this file content are read from the OCR
+    cache; the others are OCR'd in parallel on the extraction pool and
+    cached. Pages that fail to OCR are left out of the result. `heartbeat`
+    is called after every page.
+    """
+    heartbeat = heartbeat or (lambda: None)
+    options = get_ocr_options()
+    if options is None or not page_numbers:
+        return {}
+
+    ocr_config = get_ocr_config(options)
+    texts = dict(OcrPage.objects.filter(
+        content_hash=content_hash,
+        ocr_config=ocr_config,
+        page_number__in=page_numbers
+    ).values_list('page_number', 'text'))
+    missing = [page_number for page_number in page_numbers if page_number not in texts]
+    if not missing:
+        return texts
+
+    workers = get_extraction_workers()
+    recognized = []
+    if workers <= 1 or len(missing) == 1:
+        for page_number in missing:
+            try:
+                recognized.append((page_number, ocr_pdf_page(file_path, page_number - 1, options)))
+            except Exception as e:
+                print(f"Error running OCR on page {page_number}: {str(e)}")
+            heartbeat()
+    else:
+        pool = get_extraction_pool()
+        futures = [
+            (page_number, pool.submit(ocr_pdf_page, file_path, page_number - 1, options))
+            for page_number in missing
+        ]
+        deadline = time.monotonic() + options.timeout * (len(missing) / workers + 1)
+        try:
+            for page_number, future in futures:
+                try:
+                    recognized.append((page_number, future.result(timeout=max(0, deadline - time.monotonic()))))
+                except BrokenProcessPool as e:
+                    shutdown_extraction_pool()
+                    print(f"Error running OCR on page {page_number}: {str(e)}")
+                    break
+                except Exception as e:
+                    print(f"Error running OCR on page {page_number}: {str(e) or type(e).__name__}")
+                heartbeat()
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+    OcrPage.objects.bulk_create(
+        [
+            OcrPage(content_hash=content_hash, page_number=page_number, ocr_config=ocr_config, text=text)
+            for page_number, text in recognized
+        ],
+        ignore_conflicts=True
+    )
+    texts.update(recognized)
+    return texts
+
+def ocr_image_file(file_path: str) -> Optional[str]:
+    """
+    Return the OCR text of an image file, reading it from the OCR cache when
+    the same image was recognized before. Returns None if OCR is unavailable.
+    """
+    options = get_ocr_options(pdf=False)
+    if options is None:
+        print(f"Skipping text extraction of {os.path.basename(file_path)}: OCR is not available")
+        return None
+
+    content_hash = compute_file_hash(file_path)
+    ocr_config = get_ocr_config(options)
+    cached = OcrPage.objects.filter(content_hash=content_hash, page_number=1, ocr_config=ocr_config).first()
+    if cached is not None:
+        return cached.text
+    text = ocr_image(file_path, options)
+    OcrPage.objects.bulk_create(
+        [OcrPage(content_hash=content_hash, page_number=1, ocr_config=ocr_config, text=text)],
+        ignore_conflicts=True
+    )
+    return text
+
+class DocumentTextCache:
+    """
+    Persistent cache of extracted document text.
+
+    Pages are stored per content hash and extractor version, so a file is
+    parsed once no matter how many documents or comparisons refer to it.
+    Extraction is streamed into the cache in batches and capped at
+    TEXT_EXTRACTION_MAX_PAGES pages and TEXT_EXTRACTION_MAX_BYTES bytes of
+    text per document. PDF pages without a text layer are OCR'd when
+    Tesseract is installed.
+    """
+
+    @staticmethod
+    def get_content_hash(uploaded_doc: UploadedBusinessDocument) -> str:
+        """
+        Return the content hash of a document, hashing its file only if no
+        hash is stored yet. Raises OSError if the file cannot be read.
+        """
+        if not uploaded_doc.content_hash:
+            uploaded_doc.content_hash = compute_file_hash(uploaded_doc.file.path)
+            UploadedBusinessDocument.objects.filter(pk=uploaded_doc.pk).update(content_hash=uploaded_doc.content_hash)
+        return uploaded_doc.content_hash
+
+    @staticmethod
+    def get_extraction(uploaded_doc: UploadedBusinessDocument) -> DocumentExtraction:
+        """Return the complete cached extraction for a document, extracting it if needed."""
+        file_path = uploaded_doc.file.path
+        try:
+            content_hash = DocumentTextCache.get_content_hash(uploaded_doc)
+        except OSError as e:
+            raise TextExtractionError(str(e)) from e
+
+        extraction = DocumentExtraction.objects.filter(
+            content_hash=content_hash,
+            extractor_version=EXTRACTOR_VERSION,
+            is_complete=True
+        ).first()
+        if extraction is not None:
+            return extraction
+
+        timeout = getattr(settings, 'TEXT_EXTRACTION_TIMEOUT', 120)
+        # Requests for the same file on this host wait for the first one to extract it
+        with SingleFlight(f"document-extraction:{content_hash}:{EXTRACTOR_VERSION}", timeout=timeout).hold():
+            deadline = time.monotonic() + timeout
+            while True:
+                extraction = DocumentExtraction.objects.filter(
+                    content_hash=content_hash,
+                    extractor_version=EXTRACTOR_VERSION
+                ).first()
+                if extraction is None:
+                    extraction = DocumentTextCache._claim(content_hash)
+                    if extraction is not None:
+                        return DocumentTextCache._extract_into(extraction, file_path)
+                elif extraction.is_complete:
+                    return extraction
+                elif extraction.updated_at < timezone.now() - timedelta(seconds=get_extraction_stale_after()):
+                    # The process that claimed this extraction died; take it over
+                    extraction.delete()
+                    continue
+
+                # Another process, e.g. on another host, is extracting this file; wait for it to finish
+                if time.monotonic() > deadline:
+                    raise TextExtractionError(f"Timed out after {timeout} seconds waiting for extraction")
+                time.sleep(0.5)
+
+    @staticmethod
+    def iter_prompt_pages(uploaded_doc: UploadedBusinessDocument) -> Iterator[str]:
+        """
+        Yield the text of each page as it should be sent to an LLM: pages with
+        tables use their compact table rendering instead of the raw text.
+        """
+        extraction = DocumentTextCache.get_extraction(uploaded_doc)
+        for text, table_text in extraction.pages.values_list('text', 'table_text').iterator(chunk_size=PAGE_BATCH_SIZE):
+            yield table_text or text
+
+    @staticmethod
+    def get_prompt_pages(uploaded_doc: UploadedBusinessDocument, skip_boilerplate: bool = False) -> List[str]:
+        """
+        Return the prompt text of each page of a document, optionally leaving
+        out pages the boilerplate index recognizes as standard forms.
+        """
+        extraction = DocumentTextCache.get_extraction(uploaded_doc)
+        pages = list(extraction.pages.only('page_number', 'text', 'table_text', 'fingerprint'))
+        boilerplate = BoilerplateIndex.find_boilerplate(pages) if skip_boilerplate else set()
+        return [page.table_text or page.text for page in pages if page.page_number not in boilerplate]
+
+    @staticmethod
+    def _claim(content_hash: str) -> Optional[DocumentExtraction]:
+        """Create an incomplete extraction row, or return None if another process owns it."""
+        try:
+            with transaction.atomic():
+                return DocumentExtraction.objects.create(
+                    content_hash=content_hash,
+                    extractor_version=EXTRACTOR_VERSION
+                )
+        except IntegrityError:
+            return None
+
+    @staticmethod
+    def _extract_into(extraction: DocumentExtraction, file_path: str) -> DocumentExtraction:
+        """Stream the pages of a file into a claimed extraction, applying the size caps."""
+        max_pages = getattr(settings, 'TEXT_EXTRACTION_MAX_PAGES', 1000)
+        max_bytes = getattr(settings, 'TEXT_EXTRACTION_MAX_BYTES', 20 * 1024 * 1024)
+
+        page_count = 0
+        total_bytes = 0
+        batch = []
+        file_bands = set()
+        heartbeat = DocumentTextCache._heartbeat(extraction)
+        try:
+            ocr_empty_pages = detect_mime_type(file_path) == PDF
+            # Ask for one page more than the cap to detect truncation
+            for page in iter_pages(file_path, max_pages=max_pages + 1):
+                if page_count >= max_pages:
+                    extraction.is_truncated = True
+                    break
+
+                text = page.text
+                table_text = page.table_text or ''
+                encoded = text.encode('utf-8')
+                if total_bytes + len(encoded) > max_bytes:
+                    text = encoded[:max_bytes - total_bytes].decode('utf-8', errors='ignore')
+                    table_text = ''
+                    extraction.is_truncated = True
+                total_bytes += len(encoded) + len(table_text.encode('utf-8'))
+                page_count += 1
+                batch.append(ExtractedPage(
+                    extraction=extraction,
+                    page_number=page_count,
+                    text=text,
+                    table_text=table_text,
+                    is_ocr=page.is_ocr
+                ))
+
+                if len(batch) >= PAGE_BATCH_SIZE:
+                    total_bytes += DocumentTextCache._store_pages(
+                        extraction, file_path, batch, file_bands, ocr_empty_pages, max_bytes - total_bytes, heartbeat
+                    )
+                    batch = []
+                heartbeat()
+                if extraction.is_truncated:
+                    break
+
+            DocumentTextCache._store_pages(
+                extraction, file_path, batch, file_bands, ocr_empty_pages, max_bytes - total_bytes, heartbeat
+            )
+
+            extraction.page_count = page_count
+            extraction.is_complete = True
+            # The file counts towards the boilerplate index only once its extraction is complete
+            with transaction.atomic():
+                BoilerplateIndex.add_file(extraction, file_bands)
+                extraction.save(update_fields=['page_count', 'is_complete', 'is_truncated', 'updated_at'])
+        except BaseException:
+            extraction.delete()
+            raise
+        return extraction
+
+    @staticmethod
+    def _heartbeat(extraction: DocumentExtraction) -> Callable[[], None]:
+        """Return a function touching an extraction in progress, at most every EXTRACTION_HEARTBEAT_INTERVAL seconds."""
+        last_touched = [time.monotonic()]
+
+        def heartbeat():
+            if time.monotonic() - last_touched[0] >= EXTRACTION_HEARTBEAT_INTERVAL:
+                DocumentExtraction.objects.filter(pk=extraction.pk).update(updated_at=timezone.now())
+                last_touched[0] = time.monotonic()
+        return heartbeat
+
+    @staticmethod
+    def _store_pages(
+        extraction: DocumentExtraction,
+        file_path: str,
+        pages: List[ExtractedPage],
+        file_bands: set,
+        ocr_empty_pages: bool,
+        max_ocr_bytes: int,
+        heartbeat: Callable[[], None]
+    ) -> int:
+        """
+        Save a batch of extracted pages, first OCRing PDF pages that have no
+        text layer and fingerprinting the pages into `file_bands`. OCR text
+        beyond `max_ocr_bytes` is cut off and the extraction marked
+        truncated. Returns the number of bytes of text added by OCR.
+        """
+        ocr_bytes = 0
+        empty_pages = {page.page_number: page for page in pages if not page.text.strip()}
+        if empty_pages and ocr_empty_pages:
+            ocr_texts = ocr_pdf_pages(file_path, extraction.content_hash, list(empty_pages), heartbeat)
+            for page_number, text in sorted(ocr_texts.items()):
+                if not text.strip():
+                    continue
+                encoded = text.encode('utf-8')
+                if ocr_bytes + len(encoded) > max_ocr_bytes:
+                    text = encoded[:max(0, max_ocr_bytes - ocr_bytes)].decode('utf-8', errors='ignore')
+                    encoded = text.encode('utf-8')
+                    extraction.is_truncated = True
+                page = empty_pages[page_number]
+                page.text = text
+                page.is_ocr = True
+                ocr_bytes += len(encoded)
+        BoilerplateIndex.fingerprint_pages(pages, file_bands)
+        ExtractedPage.objects.bulk_create(pages)
+        return ocr_bytes
@@ -0,0 +1,42 @@
+"""
+Offline estimates of how many tokens a text costs with each LLM provider.
+
+Neither provider's tokenizer is available locally, so text is split the way
+BPE tokenizers roughly split it: digit runs in groups of three, words in
+pieces of a provider-specific average length, and one token per punctuation
+mark and line break. Dense numeric tables, which dominate insurance
+documents, are estimated far better this way than by dividing characters by
+four. Estimates err on the high side.
+
+This module does not import Django.
+"""
+import re
+
+# Average characters per token of a run of letters
+LETTERS_PER_TOKEN = {
+    'anthropic': 4,
+    'openai': 5,
+}
+DIGITS_PER_TOKEN = 3
+
+# Margin added for tokenizer differences not modelled here
+SAFETY_MARGIN = 1.1
+
+TOKEN_PIECE_PATTERN = re.compile(r'\d+|[^\W\d_]+|\n+|[^\w\s]|_')
+
+def estimate_tokens(text: str, provider: str = 'anthropic') -> int:
+    """Return an estimate of the number of tokens of a text for a provider."""
+    letters_per_token = LETTERS_PER_TOKEN.get(provider, min(LETTERS_PER_TOKEN.values()))
+    tokens = 0
+    for piece in TOKEN_PIECE_PATTERN.findall(text):
+        if piece[0].isdigit():
+            tokens += -(-len(piece) // DIGITS_PER_TOKEN)
+        elif piece[0].isalpha():
+            tokens += -(-len(piece) // letters_per_token)
+        else:
+            tokens += 1
+    return int(tokens * SAFETY_MARGIN)
+
+def estimate_pages_tokens(pages, provider: str = 'anthropic') -> int:
+    """Return an estimate of the number of tokens of the pages of a document."""
+    return sum(estimate_tokens(page, provider) for page in pages)
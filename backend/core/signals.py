@@ -0,0 +1,9 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import UploadedBusinessDocument
+from .services.document_search import DocumentSearchIndex
+
+@receiver(post_delete, sender=UploadedBusinessDocument)
+def remove_document_from_search_index(sender, instance, **kwargs):
+    # Runs for cascaded deletes too, e.g. when a business is deleted
+    DocumentSearchIndex.remove_document(instance.pk)
@@ -1,3 +1,1296 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+import anthropic
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject, TextStringObject
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .models import (
+    Agency, AgencyUser, Business, Customer, Document, DocumentExtraction, DocumentSummary, ExtractedPage, Field,
+    FieldValue, LLMCall, PageFingerprintBand, Policy, RenewalComparison, RenewalComparisonJob, UploadedBusinessDocument
+)
+from .services.acroform_reader import AcroFormReader
+from .services.boilerplate import BoilerplateIndex
+from .services.page_fingerprint import fingerprint
+from .services import chunk_retrieval
+from .services.chunk_retrieval import chunk_pages, select_document_contents, tokenize, MONEY_TOKEN, DATE_TOKEN
+from .services import extractors
+from .services.extractors import CSV, DOCX, EML, XLSX, detect_mime_type, iter_csv_pages, iter_docx_pages, iter_xlsx_pages
+from .services.document_processor import UploadedDocumentProcessor
+from .services import document_search
+from .services.document_search import DocumentSearchIndex
+from .services.bulk_renewals import BulkRenewalRunner, select_expiring_policies
+from .services.comparison_jobs import RenewalComparisonJobs
+from .serializers import RenewalComparisonJobSerializer
+from .services.clause_diff import diff_documents, format_change_set, pick_baseline
+from .services.token_estimator import estimate_tokens
+from .services.json_stream import JsonStringFieldStreamer
+from .services.fake_llm import FakeAnthropicClient, FakeOpenAIClient
+from .services.fake_vapi import build_end_of_call_report
+from .services.prompts import RENEWAL_COMPARISON_INSTRUCTIONS
+from .services.renewal_comparator import ProviderUnavailableError, RenewalComparator
+from .services.rate_limiter import LLMRateLimiter
+from .services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from .services.llm_clients import close_llm_clients
+from .services.llm_usage import estimate_cost
+from .services.model_router import ModelRouter
+from .services.single_flight import SingleFlight
+from .services.structured_output import StructuredOutputError, parse_renewal_comparison
+from .services.pdf_text import PageText, extract_page_range, get_page_count
+from .services import text_extraction
+from .services.text_extraction import (
+    DocumentTextCache, TextExtractionError, get_extraction_stale_after, get_ocr_options, iter_pages
+)
+from .services.table_extractor import MARKDOWN, TSV, TextFragment, detect_tables, extract_page_tables, group_lines
 
-# Create your tests here.
+MEDIA_DIR = Path(__file__).resolve().parent.parent / 'media'
+SAMPLE_DOCUMENTS_DIR = MEDIA_DIR / 'uploaded_documents' / 'business_17'
+
+def load_prompt_pages(file_name):
+    """Extract a sample PDF the way DocumentTextCache.iter_prompt_pages returns it."""
+    file_path = str(SAMPLE_DOCUMENTS_DIR / file_name)
+    pages = extract_page_range(file_path, 0, get_page_count(file_path), TSV)
+    return [page.table_text or page.text for page in pages]
+
+def create_business(agency_name: str = 'Harbor Insurance') -> Business:
+    agency = Agency.objects.create(name=agency_name, phone_number='5125550100', email='office@example.com')
+    user = User.objects.create_user(username=f"agent-{agency.id}", password='password')
+    AgencyUser.objects.create(user=user, agency=agency, role='agent', is_primary=True)
+    customer = Customer.objects.create(
+        first_name='Dana', last_name='Reyes', email='dana@example.com', phone_number='5125550101',
+        agency=agency, created_by=user
+    )
+    return Business.objects.create(name='Riverton Pool & Spa LLC', customer=customer)
+
+def build_form_pdf(values: dict) -> io.BytesIO:
+    """Return a one-page PDF whose AcroForm holds the given field values."""
+    writer = PdfWriter()
+    writer.add_blank_page(612, 792)
+    fields = ArrayObject()
+    for name, value in values.items():
+        field_type = '/Btn' if value.startswith('/') else '/Tx'
+        fields.append(writer._add_object(DictionaryObject({
+            NameObject('/FT'): NameObject(field_type),
+            NameObject('/T'): TextStringObject(name),
+            NameObject('/V'): NameObject(value) if field_type == '/Btn' else TextStringObject(value),
+        })))
+    writer._root_object[NameObject('/AcroForm')] = DictionaryObject({NameObject('/Fields'): fields})
+    file = io.BytesIO()
+    writer.write(file)
+    return file
+
+def create_sample_document(business: Business, file_name: str) -> UploadedBusinessDocument:
+    return UploadedBusinessDocument.objects.create(
+        business=business,
+        name=file_name,
+        file=f'uploaded_documents/business_17/{file_name}'
+    )
+
+def create_renewal_policy(business: Business = None) -> Policy:
+    """Return a policy holding the expiring and the renewal sample documents."""
+    business = business or create_business()
+    policy = Policy.objects.create(business=business)
+    for file_name in ['03.15.2024_BOP_Riverton_Pool_Spa_Excerpt.pdf', '03.15.2025_BOP_Renewal_Excerpt.pdf']:
+        policy.documents.add(create_sample_document(business, file_name))
+    return policy
+
+def create_comparison(policy: Policy, input_hash: str = 'outdated', provider: str = 'anthropic') -> RenewalComparison:
+    return RenewalComparison.objects.create(
+        policy=policy, provider=provider, model='fake-model', prompt_version='1', input_hash=input_hash,
+        email='Earlier email', attachment='# Earlier options'
+    )
+
+class FakePdfPage:
+    """A PyPDF2 page stand-in reporting text fragments at (x, y) positions in a 10pt font."""
+    def __init__(self, fragments):
+        self.fragments = fragments
+
+    def extract_text(self, visitor_text=None):
+        for x, y, text in self.fragments:
+            visitor_text(text, [1, 0, 0, 1, 0, 0], [1, 0, 0, 1, x, y], None, 10)
+        return '\n'.join(text for _, _, text in self.fragments)
+
+class TableExtractorTests(SimpleTestCase):
+    COVERAGE_PAGE = [
+        (50, 700, 'Your policy covers the premises described below.'),
+        (50, 670, 'Coverage'), (300, 670, 'Limit'), (450, 670, 'Premium'),
+        (50, 655, 'General Aggregate'), (300, 655, '$4,000,000'), (450, 655, '$268'),
+        (50, 640, 'Each Occurrence'), (300, 640, '$2,000,000'), (450, 640, '$175'),
+        (50, 625, 'Property Deductible'), (300, 625, '$1,000'), (450, 625, 'Included'),
+        (50, 560, 'Please read the policy carefully.'),
+    ]
+
+    def test_numeric_rows_are_detected_as_a_table(self):
+        lines = group_lines([TextFragment(x, y, 10, text) for x, y, text in self.COVERAGE_PAGE])
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(detect_tables(lines), [(1, 5)])
+
+    def test_prose_is_not_a_table(self):
+        lines = group_lines([
+            TextFragment(50, 700 - 15 * i, 10, f"Line {i} of the declarations text.") for i in range(5)
+        ])
+        self.assertEqual(detect_tables(lines), [])
+
+    def test_tables_are_rendered_between_the_prose(self):
+        text, table_text = extract_page_tables(FakePdfPage(self.COVERAGE_PAGE), TSV)
+        self.assertIn('General Aggregate', text)
+        self.assertEqual(table_text.split('\n'), [
+            'Your policy covers the premises described below.',
+            'Coverage\tLimit\tPremium',
+            'General Aggregate\t$4,000,000\t$268',
+            'Each Occurrence\t$2,000,000\t$175',
+            'Property Deductible\t$1,000\tIncluded',
+            'Please read the policy carefully.',
+        ])
+
+        _, markdown = extract_page_tables(FakePdfPage(self.COVERAGE_PAGE), MARKDOWN)
+        self.assertIn('| Coverage | Limit | Premium |\n|---|---|---|', markdown)
+
+    def test_pages_without_tables_have_no_table_text(self):
+        self.assertIsNone(extract_page_tables(FakePdfPage(self.COVERAGE_PAGE[:1]))[1])
+
+WORD_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+SHEET_NAMESPACE = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+def write_zip(path: str, parts: dict) -> str:
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, content in parts.items():
+            archive.writestr(name, content)
+    return path
+
+class FileExtractorTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def path(self, file_name):
+        return str(Path(self.tmp_dir) / file_name)
+
+    def write_docx(self, body):
+        return write_zip(self.path('quote.docx'), {
+            'word/document.xml': f'<w:document xmlns:w="{WORD_NAMESPACE}"><w:body>{body}</w:body></w:document>',
+        })
+
+    def write_xlsx(self, rows):
+        return write_zip(self.path('schedule.xlsx'), {
+            'xl/workbook.xml': (
+                f'<workbook xmlns="{SHEET_NAMESPACE}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                '<sheets><sheet name="Locations" sheetId="1" r:id="rId1"/></sheets></workbook>'
+            ),
+            'xl/_rels/workbook.xml.rels': (
+                '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>'
+            ),
+            'xl/sharedStrings.xml': f'<sst xmlns="{SHEET_NAMESPACE}"><si><t>Location</t></si><si><t>Building Limit</t></si></sst>',
+            'xl/worksheets/sheet1.xml': f'<worksheet xmlns="{SHEET_NAMESPACE}"><sheetData>{rows}</sheetData></worksheet>',
+        })
+
+    def test_docx_pages_split_at_page_breaks(self):
+        path = self.write_docx(
+            '<w:p><w:r><w:t>Commercial Property Quote</w:t></w:r></w:p>'
+            '<w:tbl><w:tr><w:tc><w:p><w:r><w:t>Deductible</w:t></w:r></w:p></w:tc>'
+            '<w:tc><w:p><w:r><w:t>$1,000</w:t></w:r></w:p></w:tc></w:tr></w:tbl>'
+            '<w:p><w:r><w:br w:type="page"/><w:t>Premium $4,200</w:t></w:r></w:p>'
+        )
+
+        self.assertEqual(detect_mime_type(path), DOCX)
+        self.assertEqual(
+            [page.text for page in iter_docx_pages(path)],
+            ['Commercial Property Quote\nDeductible\t$1,000', 'Premium $4,200']
+        )
+
+    def test_docx_text_stops_at_max_bytes(self):
+        path = self.write_docx(''.join(f'<w:p><w:r><w:t>Paragraph {i}</w:t></w:r></w:p>' for i in range(1000)))
+        pages = list(iter_docx_pages(path, max_bytes=25))
+        self.assertEqual([page.text for page in pages], ['Paragraph 0\nParagraph 1\nPar'])
+
+    def test_xlsx_rows_become_tables(self):
+        path = self.write_xlsx(
+            '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1" t="s"><v>1</v></c></row>'
+            '<row r="2"><c r="A2" t="inlineStr"><is><t>Main St</t></is></c><c r="C2"><v>250000.0</v></c></row>'
+        )
+
+        self.assertEqual(detect_mime_type(path), XLSX)
+        self.assertEqual(
+            [page.text for page in iter_xlsx_pages(path)],
+            ['Sheet: Locations\nLocation\tBuilding Limit\nMain St\t250000']
+        )
+
+    def test_xlsx_rows_stop_at_max_bytes(self):
+        path = self.write_xlsx(''.join(
+            f'<row r="{i}"><c r="A{i}" t="inlineStr"><is><t>Location {i}</t></is></c></row>' for i in range(1, 5000)
+        ))
+        pages = list(iter_xlsx_pages(path, max_bytes=101))
+        self.assertEqual(len(pages), 1)
+        self.assertEqual(pages[0].text.splitlines()[-1], 'Location 10')
+
+    def test_csv_rows_become_tables(self):
+        path = self.path('drivers.csv')
+        Path(path).write_text('Driver,License\nDana Reyes,TX1234\n\nSam Cole,TX5678\n')
+
+        self.assertEqual(detect_mime_type(path), CSV)
+        self.assertEqual(
+            [page.text for page in iter_csv_pages(path)],
+            ['Driver\tLicense\nDana Reyes\tTX1234\nSam Cole\tTX5678']
+        )
+
+    EMAIL = (
+        b'From: underwriter@example.com\r\nTo: agent@example.com\r\nSubject: Renewal terms\r\n'
+        b'Date: Mon, 03 Feb 2025 10:00:00 -0600\r\nMIME-Version: 1.0\r\n'
+        b'Content-Type: multipart/mixed; boundary="b"\r\n\r\n'
+        b'--b\r\nContent-Type: text/html; charset=utf-8\r\n\r\n<p>Renewal premium is <b>$4,200</b>.</p>\r\n'
+        b'--b\r\nContent-Type: text/csv\r\nContent-Disposition: attachment; filename="drivers.csv"\r\n\r\n'
+        b'Driver,License\r\nDana Reyes,TX1234\r\n'
+        b'--b--\r\n'
+    )
+
+    def test_eml_body_and_attachments_are_extracted(self):
+        path = self.path('renewal.eml')
+        Path(path).write_bytes(self.EMAIL)
+
+        self.assertEqual(detect_mime_type(path), EML)
+        pages = [page.text for page in iter_pages(path)]
+        self.assertEqual(len(pages), 2)
+        self.assertIn('Subject: Renewal terms', pages[0])
+        self.assertIn('Renewal premium is $4,200.', pages[0])
+        self.assertEqual(pages[1], '[Attachment: drivers.csv]\nDriver\tLicense\nDana Reyes\tTX1234')
+
+    def test_eml_beyond_the_size_limit_keeps_only_its_body(self):
+        path = self.path('renewal.eml')
+        Path(path).write_bytes(self.EMAIL)
+
+        with mock.patch.object(extractors, 'EMAIL_CHUNK_BYTES', 64), \
+                override_settings(TEXT_EXTRACTION_MAX_BYTES=self.EMAIL.index(b'Driver,License')):
+            pages = [page.text for page in iter_pages(path)]
+        self.assertEqual(len(pages), 1)
+        self.assertIn('Renewal premium is $4,200.', pages[0])
+
+class ChunkRetrievalTests(SimpleTestCase):
+    # Coverage facts of the sample 2025 Hartford BOP renewal
+    RENEWAL_FACTS = [
+        '$4,000,000',  # general aggregate limit
+        '$2,000,000',  # liability and medical expenses limit
+        '$1,000',  # property deductible
+        '$175',  # employment practices liability premium
+        '$268',  # policy base premium
+        '03/15/2016',  # EPL retroactive date
+        '03/15/2026',  # policy expiration
+        'Riverton Pool & Spa LLC',
+    ]
+
+    def test_tokenize_marks_money_and_dates(self):
+        self.assertEqual(
+            tokenize('Aggregate Limit $4,000,000 RETROACTIVE DATE:03/15/2016'),
+            ['aggregate', 'limit', MONEY_TOKEN, 'retroactive', 'date', DATE_TOKEN]
+        )
+
+    def test_chunks_end_on_line_boundaries(self):
+        pages = ['\n'.join(f'row {i}\t$1,000' for i in range(200))]
+        chunks = chunk_pages(pages, chunk_chars=100)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunk.text for chunk in chunks), pages[0])
+        self.assertTrue(all(chunk.text.endswith('\n') for chunk in chunks[:-1]))
+
+    def test_small_documents_are_sent_whole(self):
+        contents = select_document_contents([{'name': 'quote', 'pages': ['Premium $1,200']}], 1000)
+        self.assertEqual(contents[0]['content'], 'Premium $1,200\n\n')
+
+    def test_key_coverage_numbers_survive_trimming(self):
+        pages = load_prompt_pages('03.15.2025_BOP_Renewal_Excerpt.pdf')
+        max_chars = 10000
+
+        content = select_document_contents([{'name': 'renewal', 'pages': pages}], max_chars)[0]
+
+        self.assertGreater(content['original_chars'], max_chars)
+        self.assertLessEqual(len(content['content']), max_chars)
+        for fact in self.RENEWAL_FACTS:
+            self.assertIn(fact, content['content'])
+
+    def test_packet_fits_prompt_budget(self):
+        documents = [
+            {'name': file_name, 'pages': load_prompt_pages(file_name)}
+            for file_name in [
+                '03.15.2024_BOP_Riverton_Pool_Spa_Excerpt.pdf',
+                '03.15.2025_BOP_Renewal_Excerpt.pdf',
+                'Riverton_Pool__Spa_LLC_Chubb_Quote_Proposal.pdf',
+            ]
+        ]
+        max_chars = 30000
+
+        contents = select_document_contents(documents, max_chars)
+
+        self.assertLessEqual(sum(len(content['content']) for content in contents), max_chars)
+        self.assertTrue(all(content['content'] for content in contents))
+
+NOTICE_TEXT = (
+    "IMPORTANT NOTICE TO POLICYHOLDERS. This notice describes how your insurance company "
+    "protects the privacy of personal information collected when you apply for coverage, "
+    "including the categories of information we collect, the sources we obtain it from, "
+    "the parties we may share it with and the rights you have to access and correct it. "
+    "Please keep this notice with your policy documents for future reference and contact "
+    "your agent or the company if you have any questions about our privacy practices."
+)
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR))
+class RenewalPromptTests(TestCase):
+    def setUp(self):
+        self.policy = create_renewal_policy()
+
+    @override_settings(
+        RENEWAL_PROMPT_MODE='both', RENEWAL_PROMPT_MAX_CHARS=12000, RENEWAL_CHANGE_SET_MAX_CHARS=4000,
+        RENEWAL_MAP_REDUCE_ENABLED=False
+    )
+    def test_change_sets_share_the_prompt_budget(self):
+        select = mock.patch(
+            'core.services.renewal_comparator.select_document_contents',
+            wraps=chunk_retrieval.select_document_contents
+        )
+        with select as select_document_contents:
+            _, user_prompt = RenewalComparator(self.policy, 'anthropic')._build_prompts()
+
+        documents, max_chars = select_document_contents.call_args[0]
+        self.assertEqual(len(documents), 2)
+        self.assertIn('changes', user_prompt.lower())
+        self.assertLess(max_chars, 12000)
+        self.assertGreaterEqual(max_chars, 12000 - 4000)
+
+    @override_settings(
+        LLM_BACKEND='fake', LLM_RATE_LIMIT_ENABLED=False, RENEWAL_PROMPT_MODE='full',
+        RENEWAL_MAP_REDUCE_TOKEN_BUDGET=100
+    )
+    def test_large_packets_are_summarized_once_per_file(self):
+        summarize = mock.patch.object(RenewalComparator, '_summarize_documents', autospec=True,
+                                      side_effect=RenewalComparator._summarize_documents)
+        with summarize as summarize_documents:
+            _, user_prompt = RenewalComparator(self.policy, 'anthropic')._build_prompts()
+        self.assertEqual(summarize_documents.call_count, 1)
+        summaries = DocumentSummary.objects.order_by('id')
+        self.assertEqual(
+            sorted(summaries.values_list('content_hash', flat=True)),
+            sorted(doc.content_hash for doc in self.policy.documents.all())
+        )
+        self.assertIn(summaries[0].summary, user_prompt)
+
+        # Unchanged files reuse their stored summaries without calling the provider
+        with mock.patch.object(RenewalComparator, '_complete') as complete:
+            _, second_prompt = RenewalComparator(self.policy, 'anthropic')._build_prompts()
+        complete.assert_not_called()
+        self.assertEqual(second_prompt, user_prompt)
+        self.assertEqual(DocumentSummary.objects.count(), 2)
+
+    @override_settings(LLM_BACKEND='fake', RENEWAL_PROMPT_MODE='full', RENEWAL_MAP_REDUCE_TOKEN_BUDGET=1000000)
+    def test_packets_within_the_budget_are_sent_whole(self):
+        comparator = RenewalComparator(self.policy, 'anthropic')
+        with mock.patch.object(RenewalComparator, '_summarize_documents') as summarize_documents:
+            comparator._build_prompts()
+        summarize_documents.assert_not_called()
+        self.assertFalse(DocumentSummary.objects.exists())
+
+    def test_client_details_follow_the_cached_instructions(self):
+        system_prompt, _ = RenewalComparator(self.policy, 'anthropic')._build_prompts()
+
+        self.assertEqual(system_prompt[0], RENEWAL_COMPARISON_INSTRUCTIONS)
+        self.assertIn('Dana Reyes', system_prompt[1])
+        self.assertIn('Harbor Insurance', system_prompt[1])
+        self.assertNotIn('Dana Reyes', system_prompt[0])
+
+        blocks = RenewalComparator._anthropic_system(system_prompt)
+        self.assertEqual([block.get('cache_control') for block in blocks], [{'type': 'ephemeral'}, None])
+        messages = RenewalComparator._openai_messages(system_prompt, 'Documents')
+        self.assertEqual([message['content'] for message in messages], [*system_prompt, 'Documents'])
+
+@override_settings(LLM_BACKEND='fake', LLM_RATE_LIMIT_ENABLED=False)
+class PromptCachingTests(TestCase):
+    def setUp(self):
+        # Start from a fake provider that has not cached anything yet
+        close_llm_clients()
+
+    def test_repeated_instructions_are_read_from_the_cache(self):
+        system_prompt = [RENEWAL_COMPARISON_INSTRUCTIONS, 'Client Name: Dana Reyes']
+        first = RenewalComparator(None, 'anthropic')
+        first._complete(system_prompt, 'Documents')
+        second = RenewalComparator(None, 'anthropic')
+        second._complete([RENEWAL_COMPARISON_INSTRUCTIONS, 'Client Name: Sam Cole'], 'Other documents')
+
+        self.assertGreater(first.usage['cache_write_tokens'], 0)
+        self.assertEqual(second.usage['cache_read_tokens'], first.usage['cache_write_tokens'])
+        self.assertEqual(
+            list(LLMCall.objects.order_by('id').values_list('cache_read_tokens', flat=True)),
+            [0, first.usage['cache_write_tokens']]
+        )
+
+    def test_cache_report_counts_only_comparison_calls(self):
+        for client_name in ('Dana Reyes', 'Sam Cole'):
+            RenewalComparator(None, 'anthropic')._complete([RENEWAL_COMPARISON_INSTRUCTIONS, client_name], 'Documents')
+        RenewalComparator(None, 'anthropic')._complete('Summarize.', 'Documents', purpose=LLMCall.SUMMARY)
+
+        stdout = io.StringIO()
+        call_command('prompt_cache_report', stdout=stdout)
+        self.assertIn('anthropic: 2 comparison calls, 1 cache hits', stdout.getvalue())
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR), LLM_BACKEND='fake', LLM_RATE_LIMIT_ENABLED=False)
+class RenewalFailoverTests(TestCase):
+    RESULT = {"email": "Hedged email", "attachment": "# Hedged options"}
+
+    def setUp(self):
+        state_dir = override_settings(LLM_STATE_DIR=tempfile.mkdtemp())
+        state_dir.enable()
+        self.addCleanup(state_dir.disable)
+        close_llm_clients()
+        self.policy = create_renewal_policy()
+
+    def fail_provider(self, provider, generate=RenewalComparator._generate):
+        """Patch _generate so that `provider` is unavailable and the other provider calls `generate`."""
+        def side_effect(comparator):
+            if comparator.provider == provider:
+                raise ProviderUnavailableError(f"{provider} is overloaded")
+            return generate(comparator)
+        return mock.patch.object(RenewalComparator, '_generate', autospec=True, side_effect=side_effect)
+
+    def test_unavailable_provider_fails_over(self):
+        with self.fail_provider('anthropic'):
+            result = RenewalComparator(self.policy, 'anthropic').get_comparison()
+
+        self.assertEqual((result.created, result.stale), (True, False))
+        self.assertEqual(result.comparison.provider, 'openai')
+        self.assertTrue(result.comparison.email)
+
+    @override_settings(LLM_HEDGE_AFTER=0.05)
+    def test_slow_provider_is_hedged(self):
+        answered = threading.Event()
+        self.addCleanup(answered.set)
+
+        def generate(comparator):
+            if comparator.provider == 'anthropic':
+                answered.wait(5)
+            return dict(self.RESULT)
+
+        with mock.patch.object(RenewalComparator, '_generate', autospec=True, side_effect=generate):
+            result = RenewalComparator(self.policy, 'anthropic').get_comparison()
+
+        self.assertEqual((result.created, result.stale), (True, False))
+        self.assertEqual((result.comparison.provider, result.comparison.email), ('openai', 'Hedged email'))
+
+    @override_settings(LLM_FAKE_ERROR_RATE=1.0, LLM_FAKE_ERROR_STATUS=529, LLM_MAX_RETRIES=0)
+    def test_last_comparison_is_served_as_stale_without_a_provider(self):
+        with self.assertRaises(ProviderUnavailableError):
+            RenewalComparator(self.policy, 'anthropic').get_comparison()
+
+        last = create_comparison(self.policy)
+        result = RenewalComparator(self.policy, 'anthropic').get_comparison()
+        self.assertEqual((result.comparison, result.created, result.stale), (last, False, True))
+
+        events = list(RenewalComparator(self.policy, 'anthropic').stream_comparison())
+        self.assertEqual(events[-1], ('comparison', (last, False, True)))
+
+    @override_settings(LLM_FAKE_ERROR_RATE=1.0, LLM_FAKE_ERROR_STATUS=529, LLM_MAX_RETRIES=0)
+    def test_job_reports_a_stale_comparison(self):
+        last = create_comparison(self.policy)
+        _, job = RenewalComparisonJobs.submit(self.policy, 'anthropic')
+        RenewalComparisonJobs.run(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.comparison, job.stale), (RenewalComparisonJob.SUCCEEDED, last, True))
+        self.assertTrue(RenewalComparisonJobSerializer(job).data['stale'])
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR))
+class DocumentSearchTests(TestCase):
+    def setUp(self):
+        business = create_business()
+        other_business = create_business('Summit Insurance')
+        self.documents = [
+            create_sample_document(business, '03.15.2025_BOP_Renewal_Excerpt.pdf'),
+            # An identical file uploaded twice is two documents
+            create_sample_document(business, '03.15.2025_BOP_Renewal_Excerpt.pdf'),
+            create_sample_document(other_business, '03.15.2025_BOP_Renewal_Excerpt.pdf'),
+        ]
+        for document in self.documents:
+            DocumentSearchIndex.index_document(document)
+        self.agency = business.customer.agency
+        self.other_agency = other_business.customer.agency
+        self.client.force_login(User.objects.get(agencyuser__agency=self.agency))
+
+    def search(self, **params):
+        return self.client.get('/api/document-search/', params)
+
+    def test_results_are_limited_to_the_users_agencies(self):
+        response = self.search(q='Riverton')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertTrue(results)
+        self.assertEqual({result['document_id'] for result in results}, {doc.id for doc in self.documents[:2]})
+        self.assertIn('<mark>', results[0]['snippet'])
+
+    def test_other_agencies_cannot_be_searched(self):
+        self.assertEqual(self.search(q='Riverton', agency_id=self.other_agency.id).status_code, 403)
+        self.assertEqual(self.search(q='Riverton', agency_id=self.agency.id).status_code, 200)
+        self.assertEqual(self.search(q='').status_code, 400)
+
+    def test_fallback_search_returns_every_matching_document(self):
+        with mock.patch.object(document_search, 'is_search_index_available', return_value=False):
+            results = self.search(q='Riverton', limit=50).json()['results']
+
+        self.assertEqual({result['document_id'] for result in results}, {doc.id for doc in self.documents[:2]})
+        pages = {(result['document_id'], result['page_number']) for result in results}
+        self.assertEqual(len(pages), len(results))
+        self.assertEqual(len(results), 2 * len({result['page_number'] for result in results}))
+
+class BoilerplateTests(TestCase):
+    def test_near_duplicate_pages_share_fingerprint_bands(self):
+        bands = set(fingerprint(NOTICE_TEXT).split())
+        self.assertGreaterEqual(len(bands), 4)
+        reworded = set(fingerprint(NOTICE_TEXT.replace("future reference", "later reference")).split())
+        self.assertGreaterEqual(len(bands & reworded), len(bands) - 1)
+        unrelated = set(fingerprint("Declarations for Riverton Pool & Spa LLC, general liability coverage part " * 3).split())
+        self.assertFalse(bands & unrelated)
+        self.assertEqual(fingerprint("  \n"), "")
+
+    @override_settings(BOILERPLATE_MIN_FILES=2, BOILERPLATE_SIMILARITY=0.8)
+    def test_pages_repeated_across_files_are_boilerplate(self):
+        pages = [
+            ExtractedPage(page_number=1, text=NOTICE_TEXT, fingerprint=fingerprint(NOTICE_TEXT)),
+            ExtractedPage(page_number=2, text=NOTICE_TEXT + " Premium $268", fingerprint=fingerprint(NOTICE_TEXT)),
+            ExtractedPage(page_number=3, text="Short page", fingerprint=fingerprint("Short page")),
+        ]
+        self.assertEqual(BoilerplateIndex.find_boilerplate(pages), set())
+
+        for content_hash in ('a', 'b'):
+            extraction = DocumentExtraction.objects.create(content_hash=content_hash, extractor_version='1', is_complete=True)
+            BoilerplateIndex.add_file(extraction, BoilerplateIndex.fingerprint_pages([pages[0]]))
+        # Pages stating amounts are policy specific even when their text is a standard form
+        self.assertEqual(BoilerplateIndex.find_boilerplate(pages), {1})
+
+    def test_files_are_counted_once_across_extractor_versions(self):
+        bands = set(fingerprint(NOTICE_TEXT).split())
+        for version in ('3', '4'):
+            extraction = DocumentExtraction.objects.create(content_hash='a', extractor_version=version, is_complete=True)
+            BoilerplateIndex.add_file(extraction, bands)
+        self.assertEqual(set(PageFingerprintBand.objects.values_list('file_count', flat=True)), {1})
+
+        for extraction in DocumentExtraction.objects.all():
+            ExtractedPage.objects.create(extraction=extraction, page_number=1, text=NOTICE_TEXT)
+        self.assertEqual(BoilerplateIndex.rebuild('4'), 1)
+        self.assertEqual(set(PageFingerprintBand.objects.values_list('file_count', flat=True)), {1})
+
+class FakeExtractionPool:
+    """Extracts page ranges in this process; ranges starting at a `broken` page lose their worker, `hung` ones never finish."""
+    def __init__(self, broken=(), hung=()):
+        self.broken = set(broken)
+        self.hung = set(hung)
+
+    def submit(self, extract, file_path, start, stop, table_format):
+        future = Future()
+        if start in self.broken:
+            future.set_exception(BrokenProcessPool('A worker process terminated abruptly'))
+        elif start not in self.hung:
+            future.set_result(extract(file_path, start, stop, table_format))
+        return future
+
+@override_settings(TEXT_EXTRACTION_PAGES_PER_TASK=3, TABLE_EXTRACTION_FORMAT=TSV)
+class ParallelExtractionTests(TestCase):
+    FILE_PATH = str(SAMPLE_DOCUMENTS_DIR / '03.15.2025_BOP_Renewal_Excerpt.pdf')
+
+    def setUp(self):
+        self.expected = [page.text for page in extract_page_range(self.FILE_PATH, 0, get_page_count(self.FILE_PATH), TSV)]
+
+    def extract(self, pool, **options):
+        with mock.patch.object(text_extraction, 'get_extraction_pool', return_value=pool), \
+                mock.patch.object(text_extraction, 'shutdown_extraction_pool') as shutdown:
+            pages = [page.text for page in text_extraction.iter_pdf_pages(self.FILE_PATH, workers=2, **options)]
+        return pages, shutdown
+
+    def test_page_ranges_come_back_in_order(self):
+        self.addCleanup(text_extraction.shutdown_extraction_pool)
+        pages = [page.text for page in text_extraction.iter_pdf_pages(self.FILE_PATH, workers=2)]
+        self.assertEqual(pages, self.expected)
+
+    def test_pages_of_a_dead_worker_are_extracted_in_process(self):
+        pages, shutdown = self.extract(FakeExtractionPool(broken={6}))
+        self.assertEqual(pages, self.expected)
+        shutdown.assert_called_once()
+
+    def test_timed_out_extraction_stores_nothing(self):
+        with self.assertRaises(TextExtractionError):
+            self.extract(FakeExtractionPool(hung={9}), timeout=0.1)
+
+        extraction = DocumentExtraction.objects.create(content_hash='hung', extractor_version='1')
+        with mock.patch.object(text_extraction, 'get_extraction_pool', return_value=FakeExtractionPool(hung={9})), \
+                override_settings(TEXT_EXTRACTION_WORKERS=2, TEXT_EXTRACTION_TIMEOUT=0.1):
+            with self.assertRaises(TextExtractionError):
+                DocumentTextCache._extract_into(extraction, self.FILE_PATH)
+        self.assertFalse(DocumentExtraction.objects.filter(content_hash='hung').exists())
+        self.assertFalse(ExtractedPage.objects.exists())
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR))
+class TextExtractionTests(TestCase):
+    @override_settings(TEXT_EXTRACTION_TIMEOUT=30, OCR_PAGE_TIMEOUT=60)
+    def test_extraction_is_stale_after_its_longest_step(self):
+        self.assertGreaterEqual(get_extraction_stale_after(), 2 * 60)
+
+    def test_images_are_ocrd_without_pdftoppm(self):
+        with mock.patch('shutil.which', side_effect=lambda cmd: '/usr/bin/tesseract' if cmd == 'tesseract' else None):
+            self.assertIsNone(get_ocr_options())
+            self.assertIsNotNone(get_ocr_options(pdf=False))
+        with mock.patch('shutil.which', return_value=None):
+            self.assertIsNone(get_ocr_options(pdf=False))
+
+    def test_ocr_text_counts_towards_the_size_limit(self):
+        extraction = DocumentExtraction.objects.create(content_hash='a', extractor_version='1')
+        pages = [ExtractedPage(extraction=extraction, page_number=number, text='') for number in (1, 2)]
+        ocr_texts = {1: 'a' * 8, 2: 'b' * 8}
+        with mock.patch.object(text_extraction, 'ocr_pdf_pages', return_value=ocr_texts):
+            ocr_bytes = DocumentTextCache._store_pages(extraction, 'scan.pdf', pages, set(), True, 12, lambda: None)
+
+        self.assertEqual(ocr_bytes, 12)
+        self.assertTrue(extraction.is_truncated)
+        self.assertEqual(
+            list(ExtractedPage.objects.filter(extraction=extraction).values_list('text', 'is_ocr')),
+            [('a' * 8, True), ('b' * 4, True)]
+        )
+
+    def test_extraction_is_capped_in_pages_and_bytes(self):
+        pages = [PageText(letter * 40) for letter in 'abcde']
+        listing = mock.patch.object(
+            text_extraction, 'iter_pages', side_effect=lambda file_path, max_pages=None: iter(pages[:max_pages])
+        )
+
+        def extract(content_hash, **limits):
+            extraction = DocumentExtraction.objects.create(content_hash=content_hash, extractor_version='1')
+            with listing, override_settings(**limits), tempfile.NamedTemporaryFile(suffix='.txt') as file:
+                DocumentTextCache._extract_into(extraction, file.name)
+            return extraction, list(extraction.pages.values_list('text', flat=True))
+
+        extraction, texts = extract('pages', TEXT_EXTRACTION_MAX_PAGES=3, TEXT_EXTRACTION_MAX_BYTES=1000)
+        self.assertEqual((extraction.is_complete, extraction.is_truncated, extraction.page_count), (True, True, 3))
+        self.assertEqual(texts, ['a' * 40, 'b' * 40, 'c' * 40])
+
+        extraction, texts = extract('bytes', TEXT_EXTRACTION_MAX_PAGES=5, TEXT_EXTRACTION_MAX_BYTES=100)
+        self.assertEqual((extraction.is_truncated, extraction.page_count), (True, 3))
+        self.assertEqual(texts, ['a' * 40, 'b' * 40, 'c' * 20])
+
+        extraction, _ = extract('whole', TEXT_EXTRACTION_MAX_PAGES=5, TEXT_EXTRACTION_MAX_BYTES=200)
+        self.assertEqual((extraction.is_truncated, extraction.page_count), (False, 5))
+
+    def test_files_are_extracted_once_per_content(self):
+        business = create_business()
+        renewal = create_sample_document(business, '03.15.2025_BOP_Renewal_Excerpt.pdf')
+        copy = create_sample_document(business, '03.15.2025_BOP_Renewal_Excerpt.pdf')
+
+        extraction = DocumentTextCache.get_extraction(renewal)
+
+        self.assertTrue(extraction.is_complete)
+        self.assertEqual(extraction.pages.count(), extraction.page_count)
+        self.assertEqual(DocumentTextCache.get_extraction(copy), extraction)
+        self.assertEqual(DocumentExtraction.objects.count(), 1)
+        self.assertEqual(UploadedBusinessDocument.objects.get(pk=copy.pk).content_hash, extraction.content_hash)
+
+    def test_new_extractor_version_extracts_again(self):
+        renewal = create_sample_document(create_business(), '03.15.2025_BOP_Renewal_Excerpt.pdf')
+        old = DocumentTextCache.get_extraction(renewal)
+
+        with mock.patch.object(text_extraction, 'EXTRACTOR_VERSION', 'test'):
+            new = DocumentTextCache.get_extraction(renewal)
+
+        self.assertNotEqual(new, old)
+        self.assertEqual((new.content_hash, new.extractor_version), (old.content_hash, 'test'))
+        self.assertEqual(new.pages.count(), old.pages.count())
+
+    def test_stored_content_hash_is_not_recomputed(self):
+        business = create_business()
+        policy = Policy.objects.create(business=business)
+        hashed = create_sample_document(business, '03.15.2025_BOP_Renewal_Excerpt.pdf')
+        UploadedBusinessDocument.objects.filter(pk=hashed.pk).update(content_hash='stored')
+        policy.documents.add(hashed, create_sample_document(business, '03.15.2024_BOP_Riverton_Pool_Spa_Excerpt.pdf'))
+
+        with mock.patch.object(text_extraction, 'compute_file_hash', return_value='computed') as compute_file_hash:
+            document_hashes, _ = RenewalComparator(policy, 'anthropic').get_input_hashes()
+            self.assertEqual(compute_file_hash.call_count, 1)
+            RenewalComparator(policy, 'anthropic').get_input_hashes()
+            self.assertEqual(compute_file_hash.call_count, 1)
+        self.assertEqual(document_hashes, ['computed', 'stored'])
+
+    def test_documents_are_extracted_on_upload(self):
+        business = create_business()
+        self.client.force_login(User.objects.get(agencyuser__agency=business.customer.agency))
+        source = SAMPLE_DOCUMENTS_DIR / '03.15.2025_BOP_Renewal_Excerpt.pdf'
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with open(source, 'rb') as file:
+                response = self.client.post(
+                    f'/api/businesses/{business.id}/upload_document/',
+                    {'name': 'Renewal', 'file': file}
+                )
+
+        self.assertEqual(response.status_code, 201, response.content)
+        uploaded_doc = UploadedBusinessDocument.objects.get(pk=response.json()['id'])
+        self.assertTrue(DocumentExtraction.objects.filter(
+            content_hash=uploaded_doc.content_hash,
+            extractor_version=text_extraction.EXTRACTOR_VERSION,
+            is_complete=True
+        ).exists())
+
+class AcroFormTests(TestCase):
+    def test_form_values_are_mapped_to_fields(self):
+        file = build_form_pdf({
+            'NamedInsured_FullName_A': 'Riverton Pool & Spa LLC',
+            'Policy_EffectiveDate_A': '03/15/2025',
+            'NamedInsured_LegalEntity_CorporationIndicator_A': '/Yes',
+            'NamedInsured_LegalEntity_PartnershipIndicator_A': '/Off',
+            'Unmapped_Field_A': 'ignored',
+        })
+
+        self.assertEqual(AcroFormReader(file).read_field_values(), {
+            'applicant_name': 'Riverton Pool & Spa LLC',
+            'proposed_effective_date': '03/15/2025',
+            'business_type': 'Corporation',
+        })
+
+    @override_settings(ACORD_FORM_FIELD_MAPPING={'NamedInsured_FullName_A': None, 'Custom_Name': 'applicant_name'})
+    def test_mapping_setting_overrides_defaults(self):
+        file = build_form_pdf({'NamedInsured_FullName_A': 'Riverton', 'Custom_Name': 'Riverton Pool & Spa LLC'})
+        self.assertEqual(AcroFormReader(file).read_field_values(), {'applicant_name': 'Riverton Pool & Spa LLC'})
+
+    def test_malformed_pdf_has_no_values(self):
+        self.assertEqual(AcroFormReader(io.BytesIO(b'%PDF-1.4 truncated')).read_field_values(), {})
+
+    def test_field_values_are_upserted(self):
+        business = create_business()
+        document = Document.objects.create(name='ACORD 125')
+        Field.objects.create(field_id='applicant_name', name='Applicant Name', document=document)
+        Field.objects.create(field_id='proposed_effective_date', name='Effective Date', document=document, field_type=Field.DATE)
+        applicant = FieldValue.objects.create(
+            field=Field.objects.get(field_id='applicant_name'), business=business, value='Riverton'
+        )
+        uploaded_doc = UploadedBusinessDocument.objects.create(business=business, file='acord125.pdf')
+
+        UploadedDocumentProcessor(None, business, uploaded_doc)._store_field_values(
+            {'applicant_name': 'Riverton Pool & Spa LLC', 'proposed_effective_date': '03/15/2025', 'naic_code': '12345'},
+            uploaded_doc
+        )
+
+        self.assertEqual(FieldValue.objects.filter(business=business).count(), 2)
+        applicant.refresh_from_db()
+        self.assertEqual(
+            (applicant.value, applicant.source, applicant.source_id),
+            ('Riverton Pool & Spa LLC', FieldValue.DOCUMENT, uploaded_doc.id)
+        )
+        self.assertEqual(
+            FieldValue.objects.get(business=business, field__field_id='proposed_effective_date').value, '2025-03-15'
+        )
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR), LLM_BACKEND='fake', LLM_RATE_LIMIT_ENABLED=False)
+class RenewalComparisonViewTests(TestCase):
+    def setUp(self):
+        state_dir = override_settings(LLM_STATE_DIR=tempfile.mkdtemp())
+        state_dir.enable()
+        self.addCleanup(state_dir.disable)
+        close_llm_clients()
+        self.policy = create_renewal_policy()
+        self.client.force_login(User.objects.get(agencyuser__agency=self.policy.business.customer.agency))
+
+    def stream(self, **params):
+        """Return the (event, data) pairs of a streamed comparison."""
+        response = self.client.get(
+            f'/api/policies/{self.policy.id}/stream_renewal_comparison/',
+            {'ai_provider': 'anthropic', **params}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode('utf-8')
+        events = []
+        for message in body.split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+            if fields:
+                events.append((fields['event'], json.loads(fields['data'])))
+        return events
+
+    def test_streamed_comparison_is_stored_and_replayed(self):
+        events = self.stream()
+
+        self.assertEqual(events[-1][0], 'comparison')
+        self.assertEqual({event for event, _ in events[:-1]}, {'delta'})
+        self.assertEqual(events[0][1]['field'], 'email')
+        comparison = self.policy.renewal_comparisons.get()
+        data = events[-1][1]
+        self.assertEqual((data['id'], data['stale']), (comparison.id, False))
+        streamed = {'email': '', 'attachment': ''}
+        for _, delta in events[:-1]:
+            streamed[delta['field']] += delta['text']
+        self.assertEqual(streamed, {'email': comparison.email, 'attachment': comparison.attachment})
+        calls = LLMCall.objects.count()
+        self.assertGreater(calls, 0)
+
+        # The stored comparison is sent again without calling the provider
+        events = self.stream()
+        self.assertEqual(events, [
+            ('delta', {'field': 'email', 'text': comparison.email}),
+            ('delta', {'field': 'attachment', 'text': comparison.attachment}),
+            ('comparison', data),
+        ])
+        self.assertEqual(LLMCall.objects.count(), calls)
+        self.assertEqual(self.policy.renewal_comparisons.count(), 1)
+
+    def url(self, action):
+        return f'/api/policies/{self.policy.id}/{action}/'
+
+    def test_stored_comparison_is_returned_for_matching_documents(self):
+        _, input_hash = RenewalComparator(self.policy, 'anthropic').get_input_hashes()
+        stored = create_comparison(self.policy, input_hash)
+
+        response = self.client.post(self.url('generate_renewal_comparison') + '?ai_provider=anthropic')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['id'], data['cached'], data['stale']), (stored.id, True, False))
+        self.assertFalse(RenewalComparisonJob.objects.exists())
+
+    def test_refresh_generates_a_new_comparison(self):
+        _, input_hash = RenewalComparator(self.policy, 'anthropic').get_input_hashes()
+        stored = create_comparison(self.policy, input_hash)
+
+        response = self.client.post(self.url('generate_renewal_comparison') + '?ai_provider=anthropic&refresh=true')
+
+        self.assertEqual(response.status_code, 202)
+        job = RenewalComparisonJob.objects.get(pk=response.json()['id'])
+        self.assertTrue(job.refresh)
+        # Jobs start once the request's transaction commits, which tests never do
+        RenewalComparisonJobs.run(job.pk)
+        data = self.client.get(self.url(f'renewal_comparison_jobs/{job.pk}')).json()
+        self.assertEqual((data['status'], data['stale']), (RenewalComparisonJob.SUCCEEDED, False))
+        generated = self.policy.renewal_comparisons.exclude(pk=stored.pk).get()
+        self.assertEqual((data['comparison']['id'], generated.input_hash), (generated.id, input_hash))
+
+    def test_comparisons_are_listed_newest_first_within_the_agency(self):
+        older = create_comparison(self.policy, provider='openai')
+        RenewalComparison.objects.filter(pk=older.pk).update(created_at=timezone.now() - timedelta(days=1))
+        newer = create_comparison(self.policy)
+
+        response = self.client.get(self.url('renewal_comparisons'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([comparison['id'] for comparison in response.json()], [newer.id, older.id])
+
+        other_agency = create_business('Summit Insurance').customer.agency
+        self.assertEqual(self.client.get(self.url('renewal_comparisons'), {'agency_id': other_agency.id}).status_code, 404)
+        self.client.force_login(User.objects.get(agencyuser__agency=other_agency))
+        self.assertEqual(self.client.get(self.url('renewal_comparisons')).status_code, 404)
+
+def create_expiring_policies(business: Business) -> dict:
+    """Return policies of a business expiring soon, with and without documents, and one expiring later."""
+    today = timezone.localdate()
+    with_documents = create_renewal_policy(business)
+    Policy.objects.filter(pk=with_documents.pk).update(expiration_date=today + timedelta(days=10))
+    return {
+        'documents': with_documents,
+        'no_documents': Policy.objects.create(business=business, expiration_date=today + timedelta(days=20)),
+        'later': Policy.objects.create(business=business, expiration_date=today + timedelta(days=90)),
+    }
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR), LLM_BACKEND='fake', LLM_RATE_LIMIT_ENABLED=False, LLM_MAX_RETRIES=0)
+class BulkRenewalRunnerTests(TransactionTestCase):
+    # The runner compares policies in worker threads, which only see committed rows
+
+    def setUp(self):
+        state_dir = override_settings(LLM_STATE_DIR=tempfile.mkdtemp())
+        state_dir.enable()
+        self.addCleanup(state_dir.disable)
+        close_llm_clients()
+        business = create_business()
+        self.agency_id = business.customer.agency_id
+        self.policies = create_expiring_policies(business)
+        # Another agency's policies in the window
+        create_expiring_policies(create_business('Summit Insurance'))
+
+    def run_bulk(self, refresh=False):
+        today = timezone.localdate()
+        policies = select_expiring_policies(today, today + timedelta(days=30), self.agency_id)
+        return BulkRenewalRunner(provider='anthropic', workers=2, refresh=refresh).run(policies)
+
+    def test_runner_reports_each_outcome(self):
+        with_documents = self.policies['documents'].id
+        report = self.run_bulk()
+        self.assertEqual(report.total, 2)
+        self.assertEqual(report.generated, [with_documents])
+        self.assertEqual((report.skipped, report.failures), ([self.policies['no_documents'].id], []))
+
+        report = self.run_bulk()
+        self.assertEqual((report.generated, report.unchanged), ([], [with_documents]))
+
+        with override_settings(LLM_FAKE_ERROR_RATE=1.0, LLM_FAKE_ERROR_STATUS=529):
+            report = self.run_bulk(refresh=True)
+        self.assertEqual((report.generated, report.unchanged, report.stale), ([], [], [with_documents]))
+        self.assertEqual(RenewalComparison.objects.filter(policy_id=with_documents).count(), 1)
+
+    def test_command_prints_the_report(self):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('run_bulk_renewals', '--days', '30', '--agency', str(self.agency_id), '--provider', 'anthropic',
+                     stdout=stdout, stderr=stderr)
+
+        output = stdout.getvalue()
+        self.assertIn('2 policies expiring', output)
+        self.assertIn('Generated 1, unchanged 0, stale without a provider 0, skipped without documents 1, failed 0', output)
+        self.assertEqual(stderr.getvalue(), '')
+
+@override_settings(MEDIA_ROOT=str(MEDIA_DIR), LLM_BACKEND='fake')
+class BulkRenewalViewTests(TestCase):
+    def setUp(self):
+        business = create_business()
+        self.agency = business.customer.agency
+        self.policies = create_expiring_policies(business)
+        other_business = create_business('Summit Insurance')
+        self.other_agency = other_business.customer.agency
+        create_expiring_policies(other_business)
+        self.client.force_login(User.objects.get(agencyuser__agency=self.agency))
+
+    def post(self, agency_id, **data):
+        return self.client.post(f'/api/policies/bulk_renewal_comparisons/?agency_id={agency_id}', data)
+
+    def test_agency_policies_are_queued(self):
+        stored = self.policies['documents']
+        response = self.post(self.agency.id, days=30)
+
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        job = RenewalComparisonJob.objects.get(policy=stored)
+        self.assertEqual(data['queued'], [{'policy': stored.id, 'job': job.id}])
+        self.assertEqual((data['total'], data['skipped'], data['up_to_date']), (2, [self.policies['no_documents'].id], []))
+
+        # A stored comparison of the current documents is reported as up to date
+        _, input_hash = RenewalComparator(stored, 'anthropic').get_input_hashes()
+        comparison = create_comparison(stored, input_hash)
+        data = self.post(self.agency.id, days=30, ai_provider='anthropic').json()
+        self.assertEqual(data['up_to_date'], [{'policy': stored.id, 'comparison': comparison.id}])
+
+    def test_other_agencies_are_refused(self):
+        self.assertEqual(self.post(self.other_agency.id, days=30).status_code, 403)
+        self.assertFalse(RenewalComparisonJob.objects.exists())
+
+class RenewalComparisonJobTests(TestCase):
+    def setUp(self):
+        self.policy = Policy.objects.create(business=create_business())
+
+    def test_unfinished_job_is_reused_only_for_the_same_refresh_flag(self):
+        _, job = RenewalComparisonJobs.submit(self.policy, 'anthropic')
+        self.assertEqual(RenewalComparisonJobs.submit(self.policy, 'anthropic')[1], job)
+
+        _, refresh_job = RenewalComparisonJobs.submit(self.policy, 'anthropic', refresh=True)
+        self.assertNotEqual(refresh_job, job)
+        self.assertTrue(refresh_job.refresh)
+        self.assertEqual(RenewalComparisonJobs.submit(self.policy, 'anthropic', refresh=True)[1], refresh_job)
+
+    def test_abandoned_job_fails_and_stays_failed(self):
+        _, job = RenewalComparisonJobs.submit(self.policy, 'anthropic')
+        RenewalComparisonJob.objects.filter(pk=job.pk).update(
+            status=RenewalComparisonJob.RUNNING,
+            updated_at=timezone.now() - timedelta(seconds=300)
+        )
+
+        with override_settings(RENEWAL_JOB_TIMEOUT=120):
+            job = RenewalComparisonJobs.get(job.pk, self.policy)
+        self.assertEqual(job.status, RenewalComparisonJob.FAILED)
+
+        # A worker finishing late does not turn the reported failure into a success
+        RenewalComparisonJobs._finish(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, RenewalComparisonJob.FAILED)
+
+class ClauseDiffTests(SimpleTestCase):
+    def test_changed_values_are_aligned_by_label(self):
+        old = ['PROPERTY\nDeductible $500\nWindstorm or Hail 1%\nSpoilage $10,000']
+        new = ['PROPERTY\nSpoilage $10,000\nDeductible $1,000\nWindstorm or Hail 2%\nEquipment Breakdown Included']
+
+        change_set = diff_documents(old, new)
+
+        self.assertEqual(
+            [(change.label, change.old_values, change.new_values) for change in change_set.value_changes],
+            [('Deductible', ('$500',), ('$1,000',)), ('Windstorm or Hail', ('1%',), ('2%',))]
+        )
+        self.assertEqual([clause.text for clause in change_set.added], ['Equipment Breakdown Included'])
+        self.assertEqual(change_set.removed, [])
+
+    def test_renewal_changes_against_expiring_policy(self):
+        documents = [
+            {'name': file_name, 'pages': load_prompt_pages(file_name)}
+            for file_name in ['03.15.2025_BOP_Renewal_Excerpt.pdf', '03.15.2024_BOP_Riverton_Pool_Spa_Excerpt.pdf']
+        ]
+        self.assertEqual(pick_baseline(documents), 1)
+
+        change_set = diff_documents(documents[1]['pages'], documents[0]['pages'])
+        text = format_change_set(change_set, 'expiring', 'renewal', max_chars=5000)
+
+        self.assertLessEqual(len(text), 5000)
+        self.assertIn('TOTAL PREMIUM', text)
+        self.assertIn('$3,812 -> $4,668', text)
+        self.assertIn('Included -> $175', text)
+
+class TokenEstimatorTests(SimpleTestCase):
+    def test_numbers_cost_more_than_words(self):
+        self.assertGreater(estimate_tokens('$4,000,000 03/15/2026'), estimate_tokens('general aggregate'))
+
+    def test_estimate_errs_high_for_prose(self):
+        # Four characters per token is the usual rule of thumb for English prose
+        text = 'The policy covers property damage caused by fire, windstorm and theft. ' * 20
+        self.assertGreaterEqual(estimate_tokens(text, 'anthropic'), len(text) / 4)
+        self.assertGreaterEqual(estimate_tokens(text, 'anthropic'), estimate_tokens(text, 'openai'))
+
+class JsonStreamTests(SimpleTestCase):
+    def test_fields_are_decoded_across_chunk_boundaries(self):
+        response = '```json\n' + json.dumps({
+            'email': 'Dear "Riverton",\nPremium: $4,668 \u2014 up 22%',
+            'meta': {'note': 'ignored "}"'},
+            'attachment': '# Comparison\n| Limit | $2,000,000 |',
+        }) + '\n```'
+        for size in (1, 2, 3, 7):
+            streamer = JsonStringFieldStreamer()
+            fields = {}
+            for start in range(0, len(response), size):
+                for field, text in streamer.feed(response[start:start + size]):
+                    fields[field] = fields.get(field, '') + text
+            self.assertEqual(fields, {
+                'email': 'Dear "Riverton",\nPremium: $4,668 \u2014 up 22%',
+                'attachment': '# Comparison\n| Limit | $2,000,000 |',
+            })
+
+class FakeProviderTests(SimpleTestCase):
+    SYSTEM = [
+        {"type": "text", "text": "Return JSON with \"email\" and \"attachment\". " * 50, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": "Client: Riverton Pool & Spa"},
+    ]
+    MESSAGES = [{"role": "user", "content": "Compare the documents."}]
+
+    def test_responses_are_deterministic_and_cached_prefixes_are_read(self):
+        client = FakeAnthropicClient()
+        first = client.messages.create(model='fake', max_tokens=100, system=self.SYSTEM, messages=self.MESSAGES)
+        second = client.messages.create(model='fake', max_tokens=100, system=self.SYSTEM, messages=self.MESSAGES)
+        self.assertEqual(first.content[0].text, second.content[0].text)
+        self.assertEqual(set(json.loads(first.content[0].text)), {'email', 'attachment'})
+        self.assertGreater(first.usage.cache_creation_input_tokens, 0)
+        self.assertEqual(second.usage.cache_read_input_tokens, first.usage.cache_creation_input_tokens)
+
+    @override_settings(LLM_FAKE_ERROR_RATE=1.0, LLM_FAKE_ERROR_STATUS=429)
+    def test_failures_raise_sdk_errors(self):
+        with self.assertRaises(anthropic.RateLimitError):
+            FakeAnthropicClient().messages.create(model='fake', max_tokens=100, system=self.SYSTEM, messages=self.MESSAGES)
+
+    def test_end_of_call_report_answers_the_schema(self):
+        payload = {"assistantOverrides": {"analysisPlan": {"structuredDataPlan": {"schema": {"properties": {
+            "number_of_employees": {"type": "number", "description": "Employees"},
+            "business_type": {"type": "string", "enum": ["Corporation", "Individual"]},
+            "proposed_effective_date": {"type": "string", "description": "Effective date"},
+        }}}}}}
+        report = build_end_of_call_report({"id": "call", "customer": {"number": "+15555550123"}}, payload)
+        self.assertEqual(report['message']['type'], 'end-of-call-report')
+        structured_data = report['message']['analysis']['structuredData']
+        self.assertEqual(structured_data['number_of_employees'], 1)
+        self.assertEqual(structured_data['business_type'], 'Corporation')
+        self.assertRegex(structured_data['proposed_effective_date'], r'^\d{4}-\d{2}-\d{2}$')
+
+class StructuredOutputTests(TestCase):
+    def test_fenced_json_is_accepted(self):
+        result = parse_renewal_comparison('```json\n{"email": "Hi", "attachment": "# Options"}\n```')
+        self.assertEqual(result, {"email": "Hi", "attachment": "# Options"})
+
+    def test_responses_not_matching_the_schema_are_rejected(self):
+        for text in ['"email": "Hi"', '{"email": "Hi"}', '{"email": "Hi", "attachment": 3}', '["Hi", "# Options"]']:
+            with self.assertRaises(StructuredOutputError):
+                parse_renewal_comparison(text)
+
+    @override_settings(LLM_BACKEND='fake')
+    def test_invalid_response_is_repaired_once(self):
+        comparator = RenewalComparator(None, 'anthropic')
+        result = comparator._parse_response('email: Hi\nattachment: # Options')
+        self.assertEqual(set(result), {'email', 'attachment'})
+        self.assertGreater(comparator.usage['output_tokens'], 0)
+        call = LLMCall.objects.get()
+        self.assertEqual((call.purpose, call.outcome), (LLMCall.REPAIR, LLMCall.SUCCEEDED))
+        self.assertEqual(call.output_tokens, comparator.usage['output_tokens'])
+
+class LLMRetryTests(TestCase):
+    def setUp(self):
+        state_dir = override_settings(
+            LLM_BACKEND='fake', LLM_STATE_DIR=tempfile.mkdtemp(), LLM_RETRY_BACKOFF=0,
+            LLM_FAKE_ERROR_RATE=1.0, LLM_FAKE_ERROR_STATUS=529
+        )
+        state_dir.enable()
+        self.addCleanup(state_dir.disable)
+
+    @override_settings(LLM_MAX_RETRIES=1, LLM_CIRCUIT_FAILURE_THRESHOLD=5)
+    def test_failed_calls_are_retried_through_the_limits(self):
+        with self.assertRaises(ProviderUnavailableError):
+            RenewalComparator(None, 'anthropic')._complete('Compare.', 'Documents')
+        self.assertEqual(list(LLMCall.objects.values_list('outcome', flat=True)), [LLMCall.FAILED] * 2)
+
+    @override_settings(LLM_MAX_RETRIES=3, LLM_CIRCUIT_FAILURE_THRESHOLD=2)
+    def test_calls_are_not_retried_once_the_circuit_opens(self):
+        with self.assertRaises(ProviderUnavailableError):
+            RenewalComparator(None, 'anthropic')._complete('Compare.', 'Documents')
+        self.assertEqual(list(LLMCall.objects.values_list('outcome', flat=True)), [LLMCall.FAILED] * 2)
+
+class OpenAIRequestTests(TestCase):
+    @override_settings(LLM_BACKEND='fake', LLM_RATE_LIMIT_ENABLED=False)
+    def test_max_tokens_bound_the_completion(self):
+        client = FakeOpenAIClient()
+        comparator = RenewalComparator(None, 'openai')
+        with mock.patch.object(client.chat.completions, 'create', wraps=client.chat.completions.create) as create, \
+                mock.patch('core.services.renewal_comparator.get_llm_client', return_value=client):
+            comparator._complete('Summarize.', 'Documents', max_tokens=1500)
+            list(comparator._stream('Summarize.', 'Documents'))
+
+        self.assertEqual([call.kwargs['max_completion_tokens'] for call in create.call_args_list], [1500, 4000])
+
+class RateLimiterTests(SimpleTestCase):
+    def test_least_recently_served_agency_goes_first(self):
+        state = {
+            'waiting': {'a1': ['1', 10.0, 1], 'a2': ['1', 11.0, 1], 'b1': ['2', 12.0, 1]},
+            'served': {'1': 9.0},
+        }
+        self.assertEqual(LLMRateLimiter._next_ticket(state), 'b1')
+        state['served']['2'] = 13.0
+        self.assertEqual(LLMRateLimiter._next_ticket(state), 'a1')
+
+    def test_rate_limit_response_empties_buckets(self):
+        class RateLimited(Exception):
+            status_code = 429
+
+        with override_settings(LLM_STATE_DIR=tempfile.mkdtemp(), LLM_RATE_LIMIT_ENABLED=True):
+            limiter = LLMRateLimiter('anthropic')
+            with self.assertRaises(RateLimited):
+                with limiter.acquire(agency_id=1, tokens=1000):
+                    raise RateLimited()
+            state = limiter._update(lambda state, now: dict(state))
+        self.assertLess(state['requests'], 1)
+        self.assertLess(state['tokens'], 1000)
+        self.assertEqual(state['in_flight'], {})
+
+@override_settings(LLM_CIRCUIT_FAILURE_THRESHOLD=2, LLM_CIRCUIT_RESET_TIMEOUT=60)
+class CircuitBreakerTests(SimpleTestCase):
+    class ProviderError(Exception):
+        def __init__(self, status_code):
+            super().__init__(f"Error code: {status_code}")
+            self.status_code = status_code
+
+    def setUp(self):
+        state_dir = override_settings(LLM_STATE_DIR=tempfile.mkdtemp())
+        state_dir.enable()
+        self.addCleanup(state_dir.disable)
+        self.breaker = CircuitBreaker('anthropic')
+
+    def fail(self, status_code):
+        with self.assertRaises(self.ProviderError):
+            with self.breaker.call():
+                raise self.ProviderError(status_code)
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.fail(529)
+        self.assertTrue(self.breaker.is_available())
+        self.fail(503)
+        self.assertFalse(self.breaker.is_available())
+        with self.assertRaises(CircuitOpenError):
+            with self.breaker.call():
+                pass
+
+    def test_request_errors_do_not_count(self):
+        self.fail(529)
+        self.fail(400)
+        self.fail(529)
+        self.assertEqual(self.breaker.get_health()['state'], 'closed')
+
+    @override_settings(LLM_CIRCUIT_RESET_TIMEOUT=0)
+    def test_successful_trial_closes_the_circuit(self):
+        self.breaker = CircuitBreaker('anthropic')
+        self.fail(529)
+        self.fail(529)
+        self.assertEqual(self.breaker.get_health()['state'], 'open')
+        with self.breaker.call():
+            pass
+        self.assertEqual(self.breaker.get_health()['state'], 'closed')
+
+class LLMUsageTests(SimpleTestCase):
+    def test_cached_tokens_are_priced_per_provider(self):
+        # Anthropic reports cache reads besides the input tokens, OpenAI within them
+        self.assertAlmostEqual(estimate_cost('anthropic', 'claude-3-7-sonnet-latest', 1000, 1000, 10000), 0.021)
+        self.assertAlmostEqual(estimate_cost('openai', 'o3-mini-2025-01-31', 11000, 1000, 10000), 0.0011 + 0.0055 + 0.0044)
+        self.assertEqual(estimate_cost('anthropic', 'fake-claude-3-7-sonnet-latest', 1000), 0.003)
+        self.assertEqual(estimate_cost('openai', 'unknown-model', 1000), 0.0)
+
+@override_settings(LLM_BACKEND='live', LLM_ROUTING_ENABLED=True, LLM_SMALL_MODEL_MAX_TOKENS=1000, LLM_SMALL_MODEL_MAX_DOCUMENTS=2)
+class ModelRouterTests(SimpleTestCase):
+    def route(self, documents, agency=None):
+        return ModelRouter.route('anthropic', documents, ModelRouter.get_settings(agency))
+
+    def test_small_inputs_go_to_the_small_model(self):
+        quote = {"pages": ["Premium $1,200"]}
+        routing = self.route([quote, quote])
+        self.assertEqual((routing['tier'], routing['model']), ('small', 'claude-3-5-haiku-latest'))
+        self.assertLess(routing['estimated_cost'], routing['large_model_cost'])
+
+        self.assertEqual(self.route([quote] * 3)['tier'], 'large')
+        self.assertEqual(self.route([{"pages": ["Premium $1,200 " * 500]}])['tier'], 'large')
+
+    def test_agency_settings_override_the_defaults(self):
+        packet = [{"pages": ["Premium $1,200 " * 500]}]
+        self.assertEqual(self.route(packet, Agency(ai_small_model_max_tokens=100000))['tier'], 'small')
+        self.assertEqual(self.route(packet[:0], Agency(ai_model_tier=Agency.AI_MODEL_LARGE))['tier'], 'large')
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        state_dir = override_settings(LLM_STATE_DIR=tempfile.mkdtemp())
+        state_dir.enable()
+        self.addCleanup(state_dir.disable)
+
+    def test_identical_requests_wait_for_the_first(self):
+        calls = []
+        results = []
+        store = {}
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            store['result'] = 'comparison'
+            return 'comparison'
+
+        def request():
+            results.append(SingleFlight('policy-1').run(compute, lambda: store.get('result')))
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['comparison'] * 4)
+
+    def test_waiters_run_failed_work_themselves(self):
+        def fail():
+            raise ValueError('provider failed')
+
+        with self.assertRaises(ValueError):
+            SingleFlight('policy-1').run(fail, lambda: None)
+        self.assertEqual(SingleFlight('policy-1').run(lambda: 'retried', lambda: None), 'retried')
+
+    def test_other_processes_wait_for_the_lock(self):
+        started = multiprocessing.get_context('fork').Event()
+
+        def hold():
+            with SingleFlight('policy-1').hold():
+                started.set()
+                time.sleep(0.5)
+
+        process = multiprocessing.get_context('fork').Process(target=hold)
+        process.start()
+        started.wait(5)
+        begin = time.monotonic()
+        with SingleFlight('policy-1').hold() as waited:
+            self.assertTrue(waited)
+            self.assertGreater(time.monotonic() - begin, 0.2)
+        process.join()
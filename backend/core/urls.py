@@ -6,7 +6,7 @@ from .views import (
     FieldViewSet, FieldValueViewSet,
     get_csrf, login, logout, get_user,
     BusinessDocumentViewSet, UploadedBusinessDocumentViewSet,
-    vapi_webhook, PolicyViewSet
+    vapi_webhook, PolicyViewSet, search_documents
 )
 from .views.agency import AgencyViewSet
 
@@ -32,4 +32,5 @@ urlpatterns = [
     path('api/auth/logout/', logout, name='logout'),
     path('api/auth/user/', get_user, name='user'),
     path('api/vapi/webhook/', vapi_webhook, name='vapi-webhook'),
+    path('api/document-search/', search_documents, name='document-search'),
 ] 
\ No newline at end of file
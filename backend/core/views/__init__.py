@@ -5,6 +5,7 @@ from .field import FieldViewSet, FieldValueViewSet
 from .auth import get_csrf, login, logout, get_user
 from .vapi import vapi_webhook
 from .policy import PolicyViewSet
+from .search import search_documents
 
 __all__ = [
     'CustomerViewSet',
@@ -20,4 +21,5 @@ __all__ = [
     'logout',
     'get_user',
     'vapi_webhook',
+    'search_documents',
 ] 
\ No newline at end of file
@@ -13,6 +13,8 @@ from ..serializers import (
     UploadedBusinessDocumentSerializer
 )
 from ..services.contact_customer import ContactCustomerService
+from ..services.document_search import DocumentSearchIndex
+from ..services.text_extraction import TextExtractionError
 
 class DocumentViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
@@ -146,7 +148,22 @@ class UploadedBusinessDocumentViewSet(viewsets.ModelViewSet):
         return context
 
     def perform_create(self, serializer):
-        serializer.save(business_id=self.kwargs['business_pk'])
+        uploaded_document = serializer.save(business_id=self.kwargs['business_pk'])
+        try:
+            DocumentSearchIndex.index_document(uploaded_document)
+        except TextExtractionError as e:
+            print(f"Error indexing document {uploaded_document.name}: {str(e)}")
+
+    def perform_update(self, serializer):
+        if 'file' in serializer.validated_data:
+            # The stored hash describes the replaced file
+            uploaded_document = serializer.save(content_hash='')
+            try:
+                DocumentSearchIndex.index_document(uploaded_document)
+            except TextExtractionError as e:
+                print(f"Error indexing document {uploaded_document.name}: {str(e)}")
+        else:
+            serializer.save()
 
     @action(detail=True, methods=['get'])
     def field_values(self, request, business_pk=None, pk=None):
@@ -2,11 +2,25 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from core.models import Policy, Business, UploadedBusinessDocument, AgencyUser
-from core.serializers import PolicySerializer, UploadedBusinessDocumentSerializer
+from core.models import Policy, Business, UploadedBusinessDocument, Agency, AgencyUser, RenewalComparisonJob
+from core.serializers import (
+    PolicySerializer,
+    UploadedBusinessDocumentSerializer,
+    RenewalComparisonSerializer,
+    RenewalComparisonJobSerializer,
+)
 from core.permissions import HasAgencyAccess
-from core.services.renewal_comparator import RenewalComparator
+from core.renderers import EventStreamRenderer, format_event
+from core.services.renewal_comparator import RenewalComparator, RenewalComparisonError
+from core.services.comparison_jobs import RenewalComparisonJobs
+from core.services.bulk_renewals import select_expiring_policies
+from core.services.model_router import ModelRouter, get_policy_agency
+from core.services.text_extraction import TextExtractionError
+from core.services.document_search import DocumentSearchIndex
 import json
 from datetime import datetime, timedelta
 
@@ -107,6 +121,12 @@ class PolicyViewSet(viewsets.ModelViewSet):
             
             # Add the document to the policy
             policy.documents.add(document)
+
+            # Extract and index the document text now so comparisons and search can reuse it
+            try:
+                DocumentSearchIndex.index_document(document)
+            except TextExtractionError as e:
+                print(f"Error extracting text from document {document.name}: {str(e)}")
             
             # Return the serialized document
             serializer = UploadedBusinessDocumentSerializer(document)
@@ -121,9 +141,16 @@ class PolicyViewSet(viewsets.ModelViewSet):
         Generate a renewal comparison for a policy.
         This endpoint uses the RenewalComparator service to analyze policy documents
         and generate a comparison between the current policy and potential renewal options.
+        The comparison is stored and returned as is while the documents, provider,
+        model and prompts are unchanged.
+
+        A stored comparison is returned right away with status 200. Otherwise the
+        comparison is generated in the background and the job is returned with
+        status 202; poll renewal_comparison_jobs/<job_id>/ for its result.
         
         Query Parameters:
-            - ai_provider: The AI provider to use ('anthropic' or 'openai'). Default is 'anthropic'.
+            - ai_provider: The AI provider to use ('anthropic' or 'openai'). Default is the agency's provider.
+            - refresh: Set to 'true' to generate a new comparison even if a stored one matches.
         """
         try:
             policy = self.get_object()
@@ -135,8 +162,11 @@ class PolicyViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get AI provider from query parameters (default to anthropic)
-            ai_provider = request.query_params.get('ai_provider', 'anthropic').lower()
+            # Get AI provider from query parameters (default to the agency's provider)
+            ai_provider = (
+                request.query_params.get('ai_provider')
+                or ModelRouter.get_default_provider(get_policy_agency(policy))
+            ).lower()
             
             # Validate AI provider
             if ai_provider not in ['anthropic', 'openai']:
@@ -145,25 +175,187 @@ class PolicyViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Use the RenewalComparator service with the specified provider
-            comparator = RenewalComparator(policy, provider=ai_provider)
-            result = comparator.compare()
-            
-            # Check if there was an error
-            if "error" in result:
-                return Response({"detail": result["error"]}, status=status.HTTP_400_BAD_REQUEST)
+            refresh = request.query_params.get('refresh', 'false').lower() == 'true'
+
+            # Return the stored comparison or queue a job generating it with the specified provider
+            try:
+                comparison, job = RenewalComparisonJobs.submit(
+                    policy,
+                    ai_provider,
+                    refresh=refresh,
+                    created_by=request.user
+                )
+            except RenewalComparisonError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
-            comparison_data = {
-                "ai_provider": ai_provider,
-                "email": result["email"],
-                "attachment": result["attachment"]
-            }
+            if job is not None:
+                return Response(RenewalComparisonJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+            comparison_data = RenewalComparisonSerializer(comparison).data
+            comparison_data["cached"] = True
+            comparison_data["stale"] = False
             
             return Response(comparison_data, status=status.HTTP_200_OK)
             
         except Exception as e:
             return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def stream_renewal_comparison(self, request, pk=None):
+        """
+        Generate a renewal comparison and stream it as server-sent events.
+
+        Sends "delta" events with {"field": "email" | "attachment", "text": ...}
+        as the provider writes the comparison, then a "comparison" event with
+        the stored comparison, or an "error" event with {"detail": ...}. A
+        stored comparison matching the documents is sent at once. If no
+        provider is available, the policy's last comparison is sent with
+        "stale": true.
+
+        Query Parameters:
+            - ai_provider: The AI provider to use ('anthropic' or 'openai'). Default is the agency's provider.
+            - refresh: Set to 'true' to generate a new comparison even if a stored one matches.
+        """
+        policy = self.get_object()
+
+        if not policy.documents.exists():
+            return Response(
+                {"detail": "No documents available for comparison. Please upload policy documents first."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ai_provider = (
+            request.query_params.get('ai_provider')
+            or ModelRouter.get_default_provider(get_policy_agency(policy))
+        ).lower()
+        if ai_provider not in ['anthropic', 'openai']:
+            return Response(
+                {"detail": "Invalid AI provider. Must be either 'anthropic' or 'openai'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        refresh = request.query_params.get('refresh', 'false').lower() == 'true'
+        comparator = RenewalComparator(policy, provider=ai_provider)
+        user = request.user
+
+        def events():
+            # Sent first so proxies and the browser start delivering the stream right away
+            yield ": stream opened\n\n"
+            try:
+                for event, data in comparator.stream_comparison(refresh=refresh, created_by=user):
+                    if event == "comparison":
+                        result = data
+                        data = RenewalComparisonSerializer(result.comparison).data
+                        data["stale"] = result.stale
+                    yield format_event(event, data)
+            except RenewalComparisonError as e:
+                yield format_event("error", {"detail": str(e)})
+            except Exception as e:
+                print(f"Error streaming renewal comparison: {str(e)}")
+                yield format_event("error", {"detail": f"Failed to generate comparison: {str(e)}"})
+
+        response = StreamingHttpResponse(events(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Disable response buffering in nginx
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @action(detail=False, methods=['post'])
+    def bulk_renewal_comparisons(self, request):
+        """
+        Queue renewal comparisons for the agency's policies expiring in a date window.
+
+        Comparisons run as background jobs, RENEWAL_JOB_WORKERS at a time per
+        server process. Policies whose stored comparison still matches their
+        documents are not compared again unless refresh is set.
+
+        Query Parameters:
+            - agency_id: The agency whose policies to compare (required).
+            - ai_provider: The AI provider to use ('anthropic' or 'openai'). Default is the agency's provider.
+        Body:
+            - expiring_from, expiring_to: Expiration date window (YYYY-MM-DD), or
+            - days: Policies expiring within this many days from today. Default is 60.
+            - refresh: Regenerate comparisons even if documents are unchanged.
+        """
+        agency_id = request.query_params.get('agency_id')
+        if not agency_id or not AgencyUser.objects.filter(user=request.user, agency_id=agency_id).exists():
+            return Response({"detail": "A valid agency_id is required."}, status=status.HTTP_403_FORBIDDEN)
+
+        ai_provider = (
+            request.query_params.get('ai_provider')
+            or ModelRouter.get_default_provider(Agency.objects.filter(id=agency_id).first())
+        ).lower()
+        if ai_provider not in ['anthropic', 'openai']:
+            return Response(
+                {"detail": "Invalid AI provider. Must be either 'anthropic' or 'openai'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            today = datetime.now().date()
+            expiring_from = datetime.strptime(request.data['expiring_from'], '%Y-%m-%d').date() if request.data.get('expiring_from') else today
+            expiring_to = (
+                datetime.strptime(request.data['expiring_to'], '%Y-%m-%d').date() if request.data.get('expiring_to')
+                else today + timedelta(days=int(request.data.get('days', 60)))
+            )
+        except (TypeError, ValueError):
+            return Response({"detail": "Dates must be formatted as YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        refresh = str(request.data.get('refresh', 'false')).lower() == 'true'
+
+        queued, up_to_date, skipped, failed = [], [], [], []
+        # Jobs start when the transaction commits, after every policy has been submitted
+        with transaction.atomic():
+            for policy in select_expiring_policies(expiring_from, expiring_to, agency_id):
+                if not policy.documents.exists():
+                    skipped.append(policy.id)
+                    continue
+                try:
+                    comparison, job = RenewalComparisonJobs.submit(
+                        policy,
+                        ai_provider,
+                        refresh=refresh,
+                        created_by=request.user
+                    )
+                except RenewalComparisonError as e:
+                    failed.append({"policy": policy.id, "detail": str(e)})
+                    continue
+                if job is not None:
+                    queued.append({"policy": policy.id, "job": job.id})
+                else:
+                    up_to_date.append({"policy": policy.id, "comparison": comparison.id})
+
+        return Response({
+            "expiring_from": expiring_from,
+            "expiring_to": expiring_to,
+            "total": len(queued) + len(up_to_date) + len(skipped) + len(failed),
+            "queued": queued,
+            "up_to_date": up_to_date,
+            "skipped": skipped,
+            "failed": failed,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def renewal_comparisons(self, request, pk=None):
+        """
+        List the stored renewal comparisons of a policy, newest first.
+        """
+        policy = self.get_object()
+        comparisons = policy.renewal_comparisons.all()
+        serializer = RenewalComparisonSerializer(comparisons, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path=r'renewal_comparison_jobs/(?P<job_id>\d+)')
+    def renewal_comparison_job(self, request, pk=None, job_id=None):
+        """
+        Return the status of a renewal comparison job, with the comparison once it has succeeded.
+        """
+        policy = self.get_object()
+        try:
+            job = RenewalComparisonJobs.get(job_id, policy)
+        except RenewalComparisonJob.DoesNotExist:
+            return Response({"detail": "Job not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(RenewalComparisonJobSerializer(job).data)
+
     @action(detail=True, methods=['post'])
     def remove_document(self, request, pk=None):
         """
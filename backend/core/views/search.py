@@ -0,0 +1,48 @@
+import time
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from ..models import AgencyUser
+from ..services.document_search import DocumentSearchIndex
+
+MAX_SEARCH_RESULTS = 100
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_documents(request):
+    """
+    Search the text of uploaded documents.
+
+    Query parameters:
+    - q: the search terms; quoted text is matched as a phrase
+    - agency_id: restrict the search to one agency (defaults to all of the user's agencies)
+    - limit: maximum number of page hits to return (default 20)
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({"q": ["This parameter is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    agency_ids = AgencyUser.objects.filter(user=request.user).values_list('agency_id', flat=True)
+    agency_id = request.query_params.get('agency_id')
+    if agency_id:
+        agency_ids = agency_ids.filter(agency_id=agency_id)
+        if not agency_ids.exists():
+            return Response(
+                {"agency_id": ["You do not have access to this agency."]},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return Response({"limit": ["A valid integer is required."]}, status=status.HTTP_400_BAD_REQUEST)
+
+    start_time = time.perf_counter()
+    results = DocumentSearchIndex.search(query, agency_ids, limit=max(limit, 1))
+    return Response({
+        'query': query,
+        'count': len(results),
+        'results': results,
+        'took_ms': round((time.perf_counter() - start_time) * 1000, 2),
+    })
@@ -162,6 +162,128 @@ REST_FRAMEWORK = {
 }
 
 # Vapi Configuration
+# 'live' calls the Vapi API; 'fake' places local calls that post end-of-call reports to VAPI_FAKE_WEBHOOK_URL
+VAPI_BACKEND = os.environ.get('VAPI_BACKEND', 'live')
 VAPI_API_KEY = os.environ.get('VAPI_API_KEY', '')
-if not VAPI_API_KEY:
-    raise ValueError("VAPI_API_KEY environment variable is not set") 
\ No newline at end of file
+if not VAPI_API_KEY and VAPI_BACKEND != 'fake':
+    raise ValueError("VAPI_API_KEY environment variable is not set")
+VAPI_FAKE_WEBHOOK_URL = os.environ.get('VAPI_FAKE_WEBHOOK_URL', 'http://localhost:8000/api/vapi/webhook/')
+VAPI_FAKE_CALL_DURATION = float(os.environ.get('VAPI_FAKE_CALL_DURATION', '1'))
+VAPI_FAKE_ERROR_RATE = float(os.environ.get('VAPI_FAKE_ERROR_RATE', '0'))
+VAPI_FAKE_SEED = int(os.environ.get('VAPI_FAKE_SEED', '0'))
+
+# Document Text Extraction
+TEXT_EXTRACTION_WORKERS = int(os.environ.get('TEXT_EXTRACTION_WORKERS') or os.cpu_count() or 1)
+TEXT_EXTRACTION_PAGES_PER_TASK = int(os.environ.get('TEXT_EXTRACTION_PAGES_PER_TASK', '25'))
+TEXT_EXTRACTION_TIMEOUT = float(os.environ.get('TEXT_EXTRACTION_TIMEOUT', '120'))
+TEXT_EXTRACTION_MAX_PAGES = int(os.environ.get('TEXT_EXTRACTION_MAX_PAGES', '1000'))
+TEXT_EXTRACTION_MAX_BYTES = int(os.environ.get('TEXT_EXTRACTION_MAX_BYTES', str(20 * 1024 * 1024)))
+TEXT_EXTRACTION_CHUNK_SIZE = int(os.environ.get('TEXT_EXTRACTION_CHUNK_SIZE', str(64 * 1024)))
+
+# Extra AcroForm field name -> Field.field_id mappings for fillable ACORD uploads
+ACORD_FORM_FIELD_MAPPING = {}
+
+# Format for tables reconstructed from PDF pages ('tsv' or 'markdown'); empty disables table extraction
+TABLE_EXTRACTION_FORMAT = os.environ.get('TABLE_EXTRACTION_FORMAT', 'tsv')
+
+# OCR fallback for scanned PDF pages (requires the tesseract and pdftoppm command line tools)
+OCR_ENABLED = os.environ.get('OCR_ENABLED', 'True').lower() == 'true'
+OCR_TESSERACT_CMD = os.environ.get('OCR_TESSERACT_CMD', 'tesseract')
+OCR_PDFTOPPM_CMD = os.environ.get('OCR_PDFTOPPM_CMD', 'pdftoppm')
+OCR_LANGUAGE = os.environ.get('OCR_LANGUAGE', 'eng')
+OCR_DPI = int(os.environ.get('OCR_DPI', '300'))
+OCR_PAGE_TIMEOUT = float(os.environ.get('OCR_PAGE_TIMEOUT', '60'))
+
+# Maximum characters of document text and change sets sent in a renewal comparison prompt;
+# larger packets are cut down to the chunks most relevant to limits, deductibles, premiums and dates
+RENEWAL_PROMPT_MAX_CHARS = int(os.environ.get('RENEWAL_PROMPT_MAX_CHARS', '120000'))
+
+# What renewal comparison prompts carry: 'documents' (document text only), 'both' (document
+# text plus clause-level change sets against the expiring policy) or 'changes' (the expiring
+# policy plus change sets, leaving out the text of the other documents)
+RENEWAL_PROMPT_MODE = os.environ.get('RENEWAL_PROMPT_MODE', 'both')
+RENEWAL_CHANGE_SET_MAX_CHARS = int(os.environ.get('RENEWAL_CHANGE_SET_MAX_CHARS', '20000'))
+
+# Constrain comparison responses to the email/attachment JSON schema with tool use
+# (Anthropic) or structured outputs (OpenAI); invalid responses get one repair request
+RENEWAL_STRUCTURED_OUTPUT = os.environ.get('RENEWAL_STRUCTURED_OUTPUT', 'True').lower() == 'true'
+
+# Packets estimated at more than RENEWAL_MAP_REDUCE_TOKEN_BUDGET tokens are compared through
+# per-document coverage summaries, written in parallel and stored per file content hash
+RENEWAL_MAP_REDUCE_ENABLED = os.environ.get('RENEWAL_MAP_REDUCE_ENABLED', 'True').lower() == 'true'
+RENEWAL_MAP_REDUCE_TOKEN_BUDGET = int(os.environ.get('RENEWAL_MAP_REDUCE_TOKEN_BUDGET', '40000'))
+RENEWAL_SUMMARY_MAX_CHARS = int(os.environ.get('RENEWAL_SUMMARY_MAX_CHARS', '100000'))
+RENEWAL_SUMMARY_MAX_TOKENS = int(os.environ.get('RENEWAL_SUMMARY_MAX_TOKENS', '1500'))
+RENEWAL_SUMMARY_WORKERS = int(os.environ.get('RENEWAL_SUMMARY_WORKERS', '4'))
+
+# Renewal comparisons are generated by a thread pool of this size in each server process.
+# The process touches its jobs every few seconds; jobs it has not touched for
+# RENEWAL_JOB_TIMEOUT seconds, e.g. after a restart, are reported as failed
+RENEWAL_JOB_WORKERS = int(os.environ.get('RENEWAL_JOB_WORKERS', '4'))
+RENEWAL_JOB_TIMEOUT = int(os.environ.get('RENEWAL_JOB_TIMEOUT', '120'))
+
+# Concurrent comparisons of the run_bulk_renewals command
+BULK_RENEWAL_WORKERS = int(os.environ.get('BULK_RENEWAL_WORKERS', '4'))
+
+# 'live' calls the provider APIs; 'fake' answers locally with deterministic responses,
+# for tests and load tests (see core/services/fake_llm.py)
+LLM_BACKEND = os.environ.get('LLM_BACKEND', 'live')
+LLM_FAKE_LATENCY = float(os.environ.get('LLM_FAKE_LATENCY', '0'))
+LLM_FAKE_SECONDS_PER_OUTPUT_TOKEN = float(os.environ.get('LLM_FAKE_SECONDS_PER_OUTPUT_TOKEN', '0'))
+LLM_FAKE_INPUT_TOKENS = int(os.environ.get('LLM_FAKE_INPUT_TOKENS', '0'))
+LLM_FAKE_OUTPUT_TOKENS = int(os.environ.get('LLM_FAKE_OUTPUT_TOKENS', '0'))
+LLM_FAKE_ERROR_RATE = float(os.environ.get('LLM_FAKE_ERROR_RATE', '0'))
+LLM_FAKE_ERROR_STATUS = int(os.environ.get('LLM_FAKE_ERROR_STATUS', '529'))
+LLM_FAKE_SEED = int(os.environ.get('LLM_FAKE_SEED', '0'))
+LLM_FAKE_RECORDINGS_DIR = os.environ.get('LLM_FAKE_RECORDINGS_DIR', '')
+
+# LLM provider clients are shared per process and keep their connections alive.
+# Calls failing with connection errors, timeouts, 408, 409, 429 or 5xx responses are
+# retried up to LLM_MAX_RETRIES times, waiting LLM_RETRY_BACKOFF seconds doubled per
+# attempt and then for the rate limits again. A single LLM call therefore blocks for at
+# most (LLM_MAX_RETRIES + 1) * (LLM_CONNECT_TIMEOUT + LLM_READ_TIMEOUT) seconds plus
+# backoff and rate limit waits: 251 seconds with the defaults.
+LLM_CONNECT_TIMEOUT = float(os.environ.get('LLM_CONNECT_TIMEOUT', '5'))
+LLM_READ_TIMEOUT = float(os.environ.get('LLM_READ_TIMEOUT', '120'))
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '1'))
+LLM_RETRY_BACKOFF = float(os.environ.get('LLM_RETRY_BACKOFF', '1'))
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', '20'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get('LLM_KEEPALIVE_EXPIRY', '60'))
+
+# Provider rate limits shared by all worker processes of the host through state files in
+# LLM_STATE_DIR (default: the system temp directory); waiting requests are served
+# round-robin per agency and give up after LLM_RATE_LIMIT_TIMEOUT seconds
+LLM_RATE_LIMIT_ENABLED = os.environ.get('LLM_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+LLM_STATE_DIR = os.environ.get('LLM_STATE_DIR', '')
+LLM_RATE_LIMIT_TIMEOUT = float(os.environ.get('LLM_RATE_LIMIT_TIMEOUT', '300'))
+LLM_MAX_CONCURRENT_REQUESTS = int(os.environ.get('LLM_MAX_CONCURRENT_REQUESTS', '8'))
+ANTHROPIC_REQUESTS_PER_MINUTE = int(os.environ.get('ANTHROPIC_REQUESTS_PER_MINUTE', '50'))
+ANTHROPIC_TOKENS_PER_MINUTE = int(os.environ.get('ANTHROPIC_TOKENS_PER_MINUTE', '100000'))
+OPENAI_REQUESTS_PER_MINUTE = int(os.environ.get('OPENAI_REQUESTS_PER_MINUTE', '500'))
+OPENAI_TOKENS_PER_MINUTE = int(os.environ.get('OPENAI_TOKENS_PER_MINUTE', '200000'))
+
+# A provider failing LLM_CIRCUIT_FAILURE_THRESHOLD calls in a row is skipped for
+# LLM_CIRCUIT_RESET_TIMEOUT seconds and comparisons fail over to the other provider;
+# with LLM_HEDGE_AFTER > 0, the other provider is also asked once a request takes longer
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('LLM_CIRCUIT_FAILURE_THRESHOLD', '5'))
+LLM_CIRCUIT_RESET_TIMEOUT = float(os.environ.get('LLM_CIRCUIT_RESET_TIMEOUT', '60'))
+LLM_FAILOVER_ENABLED = os.environ.get('LLM_FAILOVER_ENABLED', 'True').lower() == 'true'
+LLM_HEDGE_AFTER = float(os.environ.get('LLM_HEDGE_AFTER', '0'))
+
+# Renewal comparisons of at most LLM_SMALL_MODEL_MAX_DOCUMENTS documents estimated at no more
+# than LLM_SMALL_MODEL_MAX_TOKENS tokens go to the provider's small, fast model; larger ones,
+# or all of them with LLM_ROUTING_ENABLED off, to its large model. Agencies can override this.
+LLM_ROUTING_ENABLED = os.environ.get('LLM_ROUTING_ENABLED', 'True').lower() == 'true'
+LLM_SMALL_MODEL_MAX_TOKENS = int(os.environ.get('LLM_SMALL_MODEL_MAX_TOKENS', '12000'))
+LLM_SMALL_MODEL_MAX_DOCUMENTS = int(os.environ.get('LLM_SMALL_MODEL_MAX_DOCUMENTS', '2'))
+
+# Identical renewal comparisons requested at the same time are generated once; the other
+# requests, in any worker process, wait up to SINGLE_FLIGHT_TIMEOUT seconds for the result
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', '600'))
+
+# Leave pages out of renewal prompts when they are at least BOILERPLATE_SIMILARITY similar
+# (estimated Jaccard similarity) to pages seen in BOILERPLATE_MIN_FILES or more distinct files
+BOILERPLATE_FILTER_ENABLED = os.environ.get('BOILERPLATE_FILTER_ENABLED', 'True').lower() == 'true'
+BOILERPLATE_MIN_FILES = int(os.environ.get('BOILERPLATE_MIN_FILES', '5'))
+BOILERPLATE_SIMILARITY = float(os.environ.get('BOILERPLATE_SIMILARITY', '0.8'))
@@ -294,21 +294,29 @@ export async function removePolicyDocument(
 
 // Define the type for renewal comparison response
 export interface RenewalComparison {  
+  id?: number; // The stored comparison
   ai_provider?: 'anthropic' | 'openai'; // The AI provider used for generation
+  model?: string; // The model used for generation
   email?: string; // The email body content from the AI response
   attachment?: string; // The attachment content from the AI response
+  input_tokens?: number | null;
+  output_tokens?: number | null;
+  created_at?: string;
+  cached?: boolean; // Whether a stored comparison for the same documents was returned
+  stale?: boolean; // Whether no AI provider was available and the last comparison was returned instead
 }
 
 export async function generateRenewalComparison(
   policyId: number,
   agencyId: number,
-  aiProvider: 'anthropic' | 'openai' = 'openai'
+  aiProvider: 'anthropic' | 'openai' = 'openai',
+  refresh: boolean = false
 ): Promise<RenewalComparison> {
   if (!agencyId) {
     throw new Error('Please select an agency to generate renewal comparison')
   }
 
-  const response = await apiClient(`/api/policies/${policyId}/generate_renewal_comparison/?agency_id=${agencyId}&ai_provider=${aiProvider}`, {
+  const response = await apiClient(`/api/policies/${policyId}/generate_renewal_comparison/?agency_id=${agencyId}&ai_provider=${aiProvider}${refresh ? '&refresh=true' : ''}`, {
     method: 'POST',
   })
 
@@ -317,8 +325,144 @@ export async function generateRenewalComparison(
       throw new Error('Please login to generate renewal comparison')
     }
     const error = await response.json().catch(() => ({}))
-    throw new Error(error.error || 'Failed to generate renewal comparison')
+    throw new Error(error.detail || error.error || 'Failed to generate renewal comparison')
+  }
+
+  // A stored comparison is returned right away; otherwise the comparison is generated in the background
+  if (response.status === 202) {
+    const job: RenewalComparisonJob = await response.json()
+    return waitForRenewalComparison(policyId, agencyId, job.id)
   }
 
   return response.json()
-} 
\ No newline at end of file
+}
+
+// Define the type for a background renewal comparison job
+export interface RenewalComparisonJob {
+  id: number;
+  status: 'pending' | 'running' | 'succeeded' | 'failed';
+  comparison: RenewalComparison | null;
+  stale: boolean;
+  error: string;
+}
+
+const RENEWAL_JOB_POLL_INTERVAL_MS = 2000
+
+export async function fetchRenewalComparisonJob(
+  policyId: number,
+  agencyId: number,
+  jobId: number
+): Promise<RenewalComparisonJob> {
+  const response = await apiClient(`/api/policies/${policyId}/renewal_comparison_jobs/${jobId}/?agency_id=${agencyId}`)
+
+  if (!response.ok) {
+    if (response.status === 401) {
+      throw new Error('Please login to generate renewal comparison')
+    }
+    const error = await response.json().catch(() => ({}))
+    throw new Error(error.detail || 'Failed to fetch renewal comparison status')
+  }
+
+  return response.json()
+}
+
+export async function waitForRenewalComparison(
+  policyId: number,
+  agencyId: number,
+  jobId: number
+): Promise<RenewalComparison> {
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, RENEWAL_JOB_POLL_INTERVAL_MS))
+    const job = await fetchRenewalComparisonJob(policyId, agencyId, jobId)
+    if (job.status === 'succeeded' && job.comparison) {
+      return { ...job.comparison, cached: false, stale: job.stale }
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Failed to generate renewal comparison')
+    }
+  }
+}
+
+export async function fetchRenewalComparisons(
+  policyId: number,
+  agencyId: number
+): Promise<RenewalComparison[]> {
+  const response = await apiClient(`/api/policies/${policyId}/renewal_comparisons/?agency_id=${agencyId}`)
+
+  if (!response.ok) {
+    if (response.status === 401) {
+      throw new Error('Please login to view renewal comparisons')
+    }
+    throw new Error('Failed to fetch renewal comparisons')
+  }
+
+  return response.json()
+}
+
+// A chunk of the email or attachment received while a renewal comparison is streamed
+export interface RenewalComparisonDelta {
+  field: 'email' | 'attachment';
+  text: string;
+}
+
+export async function streamRenewalComparison(
+  policyId: number,
+  agencyId: number,
+  aiProvider: 'anthropic' | 'openai' = 'openai',
+  onDelta: (delta: RenewalComparisonDelta) => void,
+  refresh: boolean = false
+): Promise<RenewalComparison> {
+  if (!agencyId) {
+    throw new Error('Please select an agency to generate renewal comparison')
+  }
+
+  const response = await apiClient(`/api/policies/${policyId}/stream_renewal_comparison/?agency_id=${agencyId}&ai_provider=${aiProvider}${refresh ? '&refresh=true' : ''}`, {
+    headers: { 'Accept': 'text/event-stream' },
+  })
+
+  // Errors raised before streaming started arrive as an "error" event; others as JSON
+  if (!response.ok && !response.headers.get('Content-Type')?.startsWith('text/event-stream')) {
+    const error = await response.json().catch(() => ({}))
+    throw new Error(error.detail || 'Failed to generate renewal comparison')
+  }
+
+  if (!response.body) {
+    throw new Error('Failed to generate renewal comparison')
+  }
+
+  // Server-sent events are separated by blank lines; a chunk may end in the middle of one
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += value
+
+    let end
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, end)
+      buffer = buffer.slice(end + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of message.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      if (!data) continue
+
+      const payload = JSON.parse(data)
+      if (event === 'delta') {
+        onDelta(payload)
+      } else if (event === 'comparison') {
+        await reader.cancel()
+        return payload
+      } else if (event === 'error') {
+        await reader.cancel()
+        throw new Error(payload.detail || 'Failed to generate renewal comparison')
+      }
+    }
+  }
+
+  throw new Error('The renewal comparison stream ended unexpectedly')
+}
@@ -11,7 +11,7 @@ import { Button } from '@/components/ui/button'
 import { IconArrowLeft, IconFileText, IconDownload, IconFile, IconPlus, IconTrash, IconRefresh, IconArrowUp, IconArrowDown } from '@tabler/icons-react'
 import { Badge } from '@/components/ui/badge'
 import { format, isValid } from 'date-fns'
-import { fetchPolicy, removePolicyDocument, generateRenewalComparison, RenewalComparison } from '@/features/policies/data/api'
+import { fetchPolicy, removePolicyDocument, streamRenewalComparison, RenewalComparison } from '@/features/policies/data/api'
 import { toast } from '@/hooks/use-toast'
 import { useNavigate } from '@tanstack/react-router'
 import { DocumentUpload } from '@/features/policies/components/document-upload'
@@ -129,7 +129,17 @@ function PolicyDetail() {
     
     try {
       setIsGeneratingRenewal(true);
-      const comparison = await generateRenewalComparison(policy.id, selectedAgency.id, aiProvider);
+      setRenewalComparison(null);
+
+      // Show the email and attachment while they are being written
+      const comparison = await streamRenewalComparison(policy.id, selectedAgency.id, aiProvider, (delta) => {
+        setRenewalComparison((current) => ({
+          ai_provider: aiProvider,
+          ...current,
+          [delta.field]: (current?.[delta.field] || '') + delta.text,
+        }));
+        setIsRenewalDialogOpen(true);
+      });
       setRenewalComparison(comparison);
       setIsRenewalDialogOpen(true);
       